@@ -1,85 +1,128 @@
-import base64
 import datetime
+import tempfile
+import threading
+from collections import OrderedDict
 from fpdf import FPDF
-from PIL import Image, ImageDraw, ImageFont
-import qrcode
 import streamlit as st
-import tempfile
-import os
-
-
-def generate_qr_code(data, label_w, label_h, format = "square"):
-    # High DPI for better quality
-    if format == "separator top":
-        dpi = 400  # Increase the DPI for higher resolution
-    else:
-        dpi = 300
-    
-    # Create QR code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_H,
-        box_size=10,
-        border=4,
-    )
-    qr.add_data(data)
-    qr.make(fit=True)
-    img = qr.make_image(fill='black', back_color='white').convert('RGB')
-
-    # Create a new image with white background to accommodate the QR code and text
-
-    if format == "square":
-        # Resize QR code to 0.7" x 0.7" at high DPI (e.g., 300 DPI)
-        qr_w = 0.8*min(label_w, label_h)
-        qr_h = 0.8*min(label_w, label_h)
-        img = img.resize((int(qr_w * dpi), int(qr_h * dpi)), Image.LANCZOS)
-
-        img_with_number = Image.new('RGB', (int(label_w * dpi), int(label_h * dpi)), 'white')
-        img_with_number.paste(img, (int((label_w * dpi - img.width) / 2), 0))
-
-        # Draw text below the QR code
-        draw = ImageDraw.Draw(img_with_number)
-        font = ImageFont.truetype("DejaVuSans.ttf", int(14*(label_h/2) * dpi / 72))  # Scale font size based on DPI
-        text = data
-
-        # Use textbbox (new method) instead of textsize (deprecated) to get the bounding box of the text
-        text_bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_height = text_bbox[3] - text_bbox[1]
-
-        # Draw the text in the center below the QR code
-        draw.text(
-            ((img_with_number.width - text_width) / 2, img.height + 2),
-            text,
-            fill='black',
-            font=font
-        )
-    elif format == "separator top":
-        img = img.resize((int(0.4 * dpi), int(0.4 * dpi)), Image.LANCZOS)
-
-        img_with_number = Image.new('RGB', (int(1 * dpi), int(1 * dpi)), 'white')
-        img_with_number.paste(img, (int(1*dpi-(1.05*img.width)),0))
-
-        # Draw text below the QR code
-        draw = ImageDraw.Draw(img_with_number)
-        font = ImageFont.truetype("DejaVuSans.ttf", int(12*(label_h/2) * dpi / 72))  # Scale font size based on DPI
-        text = data
-
-        # Use textbbox (new method) instead of textsize (deprecated) to get the bounding box of the text
-        text_bbox = draw.textbbox((0, 0), text, font=font)
-        text_width = text_bbox[2] - text_bbox[0]
-        text_height = text_bbox[3] - text_bbox[1]
-
-        # Draw the text in the center below the QR code
-        draw.text(
-            (0.05*dpi, (img.height - text_height)/2),
-            text,
-            fill='black',
-            font=font
-        )
-
-
-    return img_with_number
+import label_layout
+import pdf_stream
+from label_render import can_draw_vector, label_key, render_labels
+
+
+class LabelImageCache:
+    """Bounded LRU cache of rendered labels, shared by every session.
+
+    Keys are label_key plus whether the label was drawn as vector, and values are render_label's
+    entries. Those are compressed (a few KB for a vector label, tens of KB for a raster one), so
+    max_entries covers a whole storage room, and max_bytes caps the total for raster labels.
+    Cached entries are shared, so callers must copy them before changing them. hits and misses
+    show whether a print job rendered each unique label once or once per copy.
+    """
+
+    def __init__(self, max_entries=4096, max_bytes=32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, keys):
+        """Return (found, missing): cached entries by key, and the keys that still need rendering."""
+        found = {}
+        missing = []
+        with self.lock:
+            for key in keys:
+                if key in self.entries:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    found[key] = self.entries[key]
+                else:
+                    self.misses += 1
+                    missing.append(key)
+        return found, missing
+
+    def store(self, key, entry):
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= len(self.entries[key]["data"])
+            self.entries[key] = entry
+            self.bytes += len(entry["data"])
+            while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.bytes > self.max_bytes):
+                self.bytes -= len(self.entries.popitem(last=False)[1]["data"])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries), "bytes": self.bytes}
+
+
+label_cache = LabelImageCache()
+
+SPOOL_MAX_BYTES = 16 * 1024 * 1024 #finished PDFs bigger than this wait for their download on disk
+STREAM_BATCH = 256 #labels rendered ahead of the pages stream_pdf writes
+
+
+def rendered_labels(codes, label_size, format, vector=True, parallel=None):
+    """
+    Rendered label for each unique code, from label_cache or rendered in worker processes.
+
+    Args:
+        codes: Unique label strings, in the order they are printed.
+        parallel: Whether to render in the shared process pool; None uses it when it has more
+            than one worker. See label_render.render_labels.
+
+    Returns:
+        Dictionary of code -> (key, entry) for LabelPDF.place_rendered.
+    """
+    jobs = {}
+    for code in codes:
+        drawn_as_vector = vector and can_draw_vector(code, format)
+        key = label_key(code, label_size[0], label_size[1], format) + (drawn_as_vector,)
+        jobs[key] = (code, label_size[0], label_size[1], format, drawn_as_vector)
+    found, missing = label_cache.lookup(jobs)
+    for key, entry in zip(missing, render_labels([jobs[key] for key in missing], parallel)):
+        label_cache.store(key, entry)
+        found[key] = entry
+    return {job[0]: (key, found[key]) for key, job in jobs.items()}
+
+
+class LabelPDF(FPDF):
+    """FPDF that takes labels from memory instead of temp files.
+
+    fpdf 1.7.2 only reads images from disk and keeps them in self.images by file name.
+    place_rendered registers a render_label entry under its key the way image() would after
+    parsing a file, so the first copy of a label embeds it once and every other copy references
+    the same object. Raster labels are gray images; vector ones are form XObjects that draw the QR
+    modules as rectangles and the ID as text, so they stay sharp at any size.
+    """
+
+    def place_rendered(self, key, entry, x, y, w, h):
+        if key not in self.images:
+            # _putimages drops the data once written, so the cached entry is copied
+            info = dict(entry, i=len(self.images) + 1)
+            if "form" in info:
+                self.set_font("Helvetica")
+                info["font"] = self.current_font
+            self.images[key] = info
+        self.image(key, x=x, y=y, w=w, h=h)
+
+    def _putimage(self, info):
+        if "form" not in info:
+            return super()._putimage(info)
+        # image() scales the unit square to the label, so /Matrix maps the form's points onto it
+        width, height = info["form"]
+        self._newobj()
+        info["n"] = self.n
+        self._out(f"<</Type /XObject /Subtype /Form /BBox [0 0 {width:.3f} {height:.3f}] /Matrix [{1 / width:.6f} 0 0 {1 / height:.6f} 0 0]")
+        self._out(f"/Resources <</Font <</F1 {info['font']['n']} 0 R>> >>")
+        self._out(f"/Filter /FlateDecode /Length {len(info['data'])}>>")
+        self._putstream(info["data"])
+        self._out("endobj")
 
 
 # def create_pdf(items, page_size=(8.5,11), label_size=(2,2), label_format = "square"):
@@ -137,106 +180,180 @@ def generate_qr_code(data, label_w, label_h, format = "square"):
 #     return pdf
 
 
-def create_pdf_new(items, page_size=(8.5,11), label_size=(2,2), page_margins = (0.25,0.4), label_format = "square"):
-    # Constants for layout
-    dpi = 300  # Higher DPI for better quality
-    inch_to_points = 72  # Conversion factor from inches to points
-    page_width = page_size[0] * inch_to_points  # Letter-size width in points
-    page_height = page_size[1] * inch_to_points  # Letter-size height in points
-    label_width = label_size[0] * inch_to_points  # Sticker width in points (2 inches)
-    label_height = label_size[1] * inch_to_points  # Sticker height in points (2 inches)
-    horizontal_margin = page_margins[0] * inch_to_points  # Left/right margins (0.25 inches)
-    vertical_margin = page_margins[1] * inch_to_points  # Top/bottom margins (0.5 inches)
-    horizontal_spacing = (page_width - (4 * label_width) - (2 * horizontal_margin)) / 3  # Space between stickers horizontally
-    vertical_spacing = (page_height - (5 * label_height) - (2 * vertical_margin)) / 4  # Space between stickers vertically
-
-    # Create the PDF
-    pdf = FPDF('P', 'pt', (page_width, page_height))
-    if page_size==(8.5,11):
-        pdf.add_page()
-        
-        current_x = horizontal_margin
-        current_y = vertical_margin
-
-        for quantity, qr_string in items:
-            for _ in range(quantity):
-                # Generate QR code with string
-                img = generate_qr_code(qr_string, label_size[0], label_size[1], format=label_format)
-
-                # Save the QR code image temporarily
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmpfile:
-                    img.save(tmpfile.name, format="png", dpi=(dpi, dpi))
+def create_pdf_new(items, page_size=(8.5,11), label_size=(2,2), page_margins = (0.25,0.4), label_format = "square", vector=True, parallel=None, layout=None):
+    """
+    PDF of labels for items, a list of [quantity, text].
 
-                    # Add QR code image to PDF
-                    pdf.image(tmpfile.name, x=current_x, y=current_y, w=label_width, h=label_height)
-
-                os.remove(tmpfile.name)  # Clean up the temporary file
-                
-                # Move to the next label position
-                current_x += label_width + horizontal_spacing
-                if current_x + label_width / 2 > page_width:  # Move to next row
-                    current_x = horizontal_margin
-                    current_y += label_height + vertical_spacing
-                    if current_y + label_height / 2 > page_height:  # Add a new page
-                        pdf.add_page()
-                        current_x = horizontal_margin
-                        current_y = vertical_margin
-    else:
-        for quantity, qr_string in items:
-            for _ in range(quantity):
-                pdf.add_page()
-                # Generate QR code with string
-                img = generate_qr_code(qr_string, label_size[0], label_size[1], format=label_format)
+    layout is a label_layout.LabelLayout. Without one, letter pages get 4 x 5 labels inside
+    page_margins and any other page size holds one label.
+    """
+    if layout is None:
+        if page_size == label_layout.LETTER:
+            layout = label_layout.spread_layout(page_size, label_size, 4, 5, page_margins)
+        else:
+            layout = label_layout.LabelLayout(page_size, label_size, 1, 1)
+    label_width, label_height = layout.label_points()
 
-                # Save the QR code image temporarily
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as tmpfile:
-                    img.save(tmpfile.name, format="png", dpi=(dpi, dpi))
+    # Render each unique label once, in worker processes for big jobs, before laying out the copies
+    labels = rendered_labels(dict.fromkeys(qr_string for quantity, qr_string in items if quantity > 0), layout.label_size, label_format, vector=vector, parallel=parallel)
 
-                    # Add QR code image to PDF
-                    pdf.image(tmpfile.name, x=0, y=0, w=label_width, h=label_height)
-                os.remove(tmpfile.name)  # Clean up the temporary file                
+    # Create the PDF, filling the layout's slots in order and adding pages as they fill up
+    pdf = LabelPDF('P', 'pt', layout.page_points())
+    copies = (qr_string for quantity, qr_string in items for _ in range(quantity))
+    total = sum(max(0, quantity) for quantity, qr_string in items)
+    for (new_page, x, y), qr_string in zip(layout.place(total), copies):
+        if new_page:
+            pdf.add_page()
+        pdf.place_rendered(*labels[qr_string], x=x, y=y, w=label_width, h=label_height)
 
     return pdf
 
 
-# Main code to generate and download the PDF
-def download_qr_code_pdf(items, paper="sheet", label="1x1"):
-    # Generate the QR code PDF
-    def create_download_link(val, filename):
-        b64 = base64.b64encode(val)  # val looks like b'...'
-        return f'<a href="data:application/octet-stream;base64,{b64.decode()}" download="{filename}.pdf">Download file</a>'
-    name = datetime.datetime.now()
-    name = name.strftime('%Y-%m-%d %H:%M')
-    name = f"Exported_Barcodes_{name}.pdf"
-    name2 = f"Exported_Barcodes_(Mini Labels)_{name}.pdf"
-
-    pdf2 = None
-    if label == "1x1":
-        label_size = (1,1)
-    elif label == "2x2":
-        label_size = (2,2)
+def stream_pdf(items, sink, layout, label_format="square", vector=True, parallel=None):
+    """
+    Write a PDF of labels for items (a list of [quantity, text]) to sink, a page at a time.
+
+    Labels are rendered STREAM_BATCH at a time, whole pages at once, and written as XObjects the
+    first time they're used. Only their object numbers are kept after that, so memory depends on
+    the batch and page size rather than on how many labels the job has, apart from a few dozen
+    bytes per label for the cross-reference table. Returns the number of bytes written.
+    """
+    writer = pdf_stream.PDFStreamWriter(sink, layout.page_points())
+    label_width, label_height = layout.label_points()
+    pages_per_batch = max(1, STREAM_BATCH // layout.per_page)
+
+    def write_pages(pages):
+        # Every label in one PDF has the same size and format, so the writer knows them by their text
+        new_codes = dict.fromkeys(code for page in pages for code, x, y in page if not writer.has_label(code))
+        for code, (key, entry) in rendered_labels(new_codes, layout.label_size, label_format, vector=vector, parallel=parallel).items():
+            writer.add_label(code, entry)
+        for page in pages:
+            writer.add_page([(code, x, y, label_width, label_height) for code, x, y in page])
+
+    copies = (qr_string for quantity, qr_string in items for _ in range(quantity))
+    total = sum(max(0, quantity) for quantity, qr_string in items)
+    pages = []
+    for (new_page, x, y), qr_string in zip(layout.place(total), copies):
+        if new_page:
+            if len(pages) >= pages_per_batch:
+                write_pages(pages)
+                pages = []
+            pages.append([])
+        pages[-1].append((qr_string, x, y))
+    write_pages(pages)
+    return writer.close()
+
+
+class SpooledPDF:
+    """
+    A finished PDF kept in a spooled temporary file until it's downloaded: in memory up to
+    SPOOL_MAX_BYTES, on disk past that. stream_pdf writes into .file. Calling it returns the
+    bytes, which is how st.download_button reads it when the button is clicked, and then calls
+    on_download (from Streamlit's download thread, not the script run).
+    """
+
+    def __init__(self, file_name, on_download=None):
+        self.file_name = file_name
+        self.file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        self.lock = threading.Lock()
+        self.size = 0
+        self.on_download = on_download
+
+    def __call__(self):
+        with self.lock:
+            self.file.seek(0)
+            data = self.file.read()
+        if self.on_download is not None:
+            self.on_download()
+        return data
+
+
+class PrintedLabels:
+    """Labels a print job read from a print_queue.PrintQueue, taken off it when one of the job's PDFs is first downloaded."""
+
+    def __init__(self, queue, items):
+        self.queue = queue
+        self.items = items
+        self.lock = threading.Lock()
+
+    def downloaded(self):
+        with self.lock:
+            if self.items:
+                self.queue.remove(self.items)
+                self.items = []
+
+    def close(self):
+        self.file.close()
+
+
+def clear_label_downloads():
+    for download in st.session_state.get("label_downloads", {}).get("files", []):
+        download.close()
+    st.session_state.label_downloads = {"files": [], "caption": ""}
+
+
+# Main code to generate the PDF; show_label_downloads offers it for download
+def download_qr_code_pdf(items, paper="sheet", label="1x1", template=None, on_download=None):
+    """
+    Build the label PDFs for items and keep them in st.session_state.label_downloads, replacing the
+    previous print job's. Safe to call from a widget callback, as it draws no widgets itself.
+
+    Args:
+        paper: "sheet" for letter pages or "thermal" for one label per page.
+        label: "2x2", "1x1" or "separator" (a 2x2 PDF and a 1x1 separator-label PDF).
+        template: Name of a label_layout.TEMPLATES layout to use instead of paper and label.
+        on_download: Called each time one of the PDFs is downloaded.
+    """
+    stamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M')
+    name = f"Exported_Barcodes_{stamp}.pdf"
+    name2 = f"Exported_Barcodes_(Mini Labels)_{stamp}.pdf"
+
+    cache_before = label_cache.stats()
+    kind = "letter" if paper == "sheet" else "thermal"
+    if template is not None:
+        jobs = [(name, label_layout.TEMPLATES[template], "square")]
     elif label == "separator":
-        label_size = None
-
-    if paper == "sheet":
-        page_size = (8.5, 11)
-    else:
-        page_size = label_size
-        
-        
-    if label == "separator":
-        if not paper == "sheet":
-            pdf = create_pdf_new(items, page_size=(2,2), label_size=(2,2), page_margins=(0.25, 0.4), label_format = "square")
-            pdf2 = create_pdf_new(items, page_size=(1,1), label_size=(1,1), page_margins=(0.25, 0.4), label_format = "separator top")
-        else:
-            pdf = create_pdf_new(items, page_size=(8.5,11), label_size=(2,2), page_margins=(0.25, 0.4), label_format = "square")
-            pdf2 = create_pdf_new(items, page_size=(8.5,11), label_size=(1,1), page_margins=(0.25, 0.4), label_format = "separator top")
+        # A 2x2 label for the bin and a 1x1 label for its separator, in two PDFs
+        jobs = [(name, label_layout.TEMPLATES[f"{kind} 2x2"], "square"), (name2, label_layout.TEMPLATES[f"{kind} 1x1"], "separator top")]
     else:
-        pdf = create_pdf_new(items, page_size=page_size, label_size=label_size, page_margins=(0.25, 0.4), label_format = "square")
-
-
-    if pdf2 is not None:
-            html2 = create_download_link(pdf2.output(dest="S").encode("latin-1"), name2)
-    html = create_download_link(pdf.output(dest="S").encode("latin-1"), name)
-    st.markdown(html, unsafe_allow_html=True)
-    st.markdown(html2, unsafe_allow_html=True)
\ No newline at end of file
+        jobs = [(name, label_layout.TEMPLATES[f"{kind} {label}"], "square")]
+
+    # One document at a time, each written page by page into its spooled file
+    clear_label_downloads()
+    files = []
+    for file_name, layout, label_format in jobs:
+        download = SpooledPDF(file_name, on_download)
+        download.size = stream_pdf(items, download.file, layout, label_format=label_format)
+        files.append(download)
+
+    # Each unique label is rendered once and then reused from the cache, across copies and print jobs
+    cache_after = label_cache.stats()
+    rendered = cache_after["misses"] - cache_before["misses"]
+    reused = cache_after["hits"] - cache_before["hits"]
+    st.session_state.label_downloads = {"files": files, "caption": f"Labels rendered: {rendered}, reused from cache: {reused}"}
+
+
+def download_print_queue(queue, paper="sheet", label="1x1", template=None):
+    """
+    download_qr_code_pdf for everything in a print_queue.PrintQueue. The labels stay queued until
+    one of the PDFs is downloaded, so a job that is never downloaded doesn't lose them.
+    """
+    items = queue.items()
+    download_qr_code_pdf(items, paper=paper, label=label, template=template, on_download=PrintedLabels(queue, items).downloaded)
+
+
+def show_label_downloads():
+    """Download buttons for the last print job's PDFs. The PDF is only read when its button is clicked."""
+    downloads = st.session_state.get("label_downloads")
+    if not downloads or not downloads["files"]:
+        return
+    for i, download in enumerate(downloads["files"]):
+        st.download_button(
+            f"Download {download.file_name} ({download.size / 1e6:.1f} MB)",
+            data=download,
+            file_name=download.file_name,
+            mime="application/pdf",
+            key=f"label_download_{i}",
+            on_click="ignore",
+        )
+    st.caption(downloads["caption"])
@@ -0,0 +1,298 @@
+"""
+Benchmarks for label printing, run with `python benchmarks.py [labels] [max workers]`.
+
+bench_render_labels renders the same set of unique labels with 1, 2, 4, ... worker processes and
+prints the time and speedup over one worker for vector and raster labels. Each count gets its own
+pool, started and warmed up before the timing, as the shared pool is kept for the life of the server.
+
+bench_pdf_memory builds PDFs of growing label counts with FPDF (create_pdf_new) and with the
+streaming writer (stream_pdf) and prints the peak memory traced while building and writing each.
+Both fill the shared label cache, which has its own bounds (max_entries and max_bytes), so the
+streaming writer is also measured with the cache held to one entry: that figure should stay flat
+however many labels there are.
+
+`python benchmarks.py inventory [rows ...] [--save-baseline]` times the Containers hot paths on
+made-up sheets from synthetic_inventory (1k, 10k and 100k rows unless sizes are given; 1000000
+works but takes a few minutes and a few GB). It calls the same card_inventory functions as the
+app's handlers, minus their Streamlit calls, against the SharedTable, indexes and ContainerGraph
+the app uses, loaded from a SQLite database like [storage] backend = "sqlite".
+Each time is the best of a few runs and is compared with the baseline saved by the last
+--save-baseline run on this machine; anything REGRESSION_RATIO times slower is flagged.
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import barcode_generator
+import card_inventory
+import container_graph
+import label_layout
+import label_render
+import print_queue
+import shared_store
+import storage_backend
+import synthetic_inventory
+
+# Baselines are per machine, so they're kept out of the repo with the other local caches
+BASELINE_PATH = os.environ.get(
+    "INVENTORY_BENCH_BASELINE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "benchmark_baseline.json"),
+)
+REGRESSION_RATIO = 1.25
+INVENTORY_SIZES = (1000, 10000, 100000)
+PDF_LABELS = 200 #labels per timed PDF, the same whatever the inventory size
+
+
+def time_render(jobs, workers):
+    pool = label_render.start_pool(workers) if workers > 1 else None
+    try:
+        if pool is not None:
+            # Other labels than the timed ones, so the workers' QR caches don't help
+            warmup = [(f"warmup{i}",) + job[1:] for i, job in enumerate(jobs[:label_render.PARALLEL_MIN_LABELS])]
+            label_render.render_labels(warmup, workers > 1, pool, workers)
+        start = time.perf_counter()
+        results = label_render.render_labels(jobs, workers > 1, pool, workers)
+        elapsed = time.perf_counter() - start
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return elapsed, results
+
+
+def worker_steps(max_workers):
+    workers = 1
+    while workers < max_workers:
+        yield workers
+        workers *= 2
+    yield max_workers
+
+
+def bench_render_labels(count=2000, max_workers=None):
+    max_workers = label_render.worker_count(max_workers)
+    rows = []
+    for vector in (True, False):
+        jobs = [(f"P{i:06d}", 2, 2, "square", vector) for i in range(count)]
+        base = None
+        expected = None
+        for workers in worker_steps(max_workers):
+            # Cached QR matrices would make later runs faster for the wrong reason
+            label_render.qr_matrix_image.cache_clear()
+            label_render.qr_modules.cache_clear()
+            elapsed, results = time_render(jobs, workers)
+            if expected is None:
+                base, expected = elapsed, [result["data"] for result in results]
+            elif [result["data"] for result in results] != expected:
+                raise AssertionError(f"{workers} workers returned labels out of order")
+            rows.append(("vector" if vector else "raster", count, workers, elapsed, base / elapsed))
+    return rows
+
+
+class DiscardSink:
+    """Output file that only counts bytes, so the PDF itself doesn't count towards peak memory."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+def traced_peak(build):
+    """Peak memory traced while build runs, starting from an empty label cache."""
+    barcode_generator.label_cache.clear()
+    tracemalloc.start()
+    try:
+        build()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_pdf_memory(counts=(500, 2000, 6000), template="letter 2x2"):
+    layout = label_layout.TEMPLATES[template]
+    cache = barcode_generator.label_cache
+    rows = []
+    for count in counts:
+        # Unique labels, one copy each, as when relabeling a room
+        items = [[1, f"P{i:06d}"] for i in range(count)]
+        fpdf_peak = traced_peak(lambda: DiscardSink().write(barcode_generator.create_pdf_new(items, layout=layout).output(dest="S").encode("latin-1")))
+        stream_peak = traced_peak(lambda: barcode_generator.stream_pdf(items, DiscardSink(), layout, parallel=False))
+        max_entries, cache.max_entries = cache.max_entries, 1
+        try:
+            writer_peak = traced_peak(lambda: barcode_generator.stream_pdf(items, DiscardSink(), layout, parallel=False))
+        finally:
+            cache.max_entries = max_entries
+        rows.append((count, fpdf_peak, stream_peak, writer_peak))
+    return rows
+
+
+def best_of(run, setup=None, repeat=5):
+    """Fastest of repeat runs, in seconds. setup runs untimed before each one."""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def clear_label_caches():
+    barcode_generator.label_cache.clear()
+    label_render.qr_matrix_image.cache_clear()
+    label_render.qr_modules.cache_clear()
+
+
+def load_inventory(path, rows, seed=0):
+    """Load the generated sheet in the SQLite file at path the way the Containers app does, writing it first if needed."""
+    if os.path.exists(path):
+        backend = storage_backend.SQLiteBackend(path)
+    else:
+        backend = synthetic_inventory.seed_sqlite(path, rows, seed)
+    store = shared_store.SharedTable(backend, "Containers", category_column="type", casefold_categories=True)
+    df, _ = store.view()
+    return store, df, container_graph.ContainerGraph(df)
+
+
+def bench_inventory_size(directory, rows, seed=0, repeat=5):
+    """Time each hot path on a generated sheet of rows rows. Returns {name: seconds}."""
+    timings = {}
+    path = os.path.join(directory, f"containers_{rows}.sqlite")
+    start = time.perf_counter()
+    store, df, graph = load_inventory(path, rows, seed)
+    timings["generate and load"] = time.perf_counter() - start
+    rng = random.Random(seed)
+    types = df["type"].astype(str)
+    separators = [int(i) for i in df.index[types == "separator"]]
+    boxes = [int(i) for i in df.index[types == "storage box"]]
+    picked = rng.sample(range(len(df)), min(200, len(df)))
+
+    # filter_rows is what the app's filter_data runs when its FilterCache misses
+    def filter_data(query, categories=()):
+        return card_inventory.filter_rows(store, df, query, categories, "OR", "Viewing")
+    timings["filter_data scan"] = best_of(lambda: filter_data(df.loc[picked[0], "barcode"]), repeat=repeat)
+    timings["filter_data search"] = best_of(lambda: filter_data("SEP-A"), repeat=repeat)
+    timings["filter_data type"] = best_of(lambda: filter_data("", ("bin", "plate")), repeat=repeat)
+    timings["filter_data all"] = best_of(lambda: filter_data(""), repeat=repeat)
+
+    def locate_picked():
+        return [card_inventory.locate_path(df, store.id_index, graph, i) for i in picked]
+
+    def drop_paths():
+        graph.paths = {}
+        graph.path_dependents = {}
+    timings["locate x200 cold"] = best_of(locate_picked, drop_paths, repeat)
+    timings["locate x200 warm"] = best_of(locate_picked, repeat=repeat)
+
+    moved = [df.loc[i, "id"] for i in rng.sample(separators, min(100, len(separators)))]
+    holders = {sep_id: list(graph.holders.get(sep_id, ())) for sep_id in moved}
+
+    def relink():
+        for sep_id, holder_ids in holders.items():
+            for holder_id in holder_ids:
+                graph.add_children(holder_id, [sep_id])
+    timings["remove_children x100"] = best_of(lambda: card_inventory.detach_children(graph, moved), relink, repeat)
+    relink()
+
+    sep_idx = rng.sample(separators, min(8, len(separators)))
+    box_idx = boxes[-1]
+
+    def separators_to_box():
+        changes = {}
+        card_inventory.place_separators(df, store.id_index, graph, changes, sep_idx, box_idx)
+        card_inventory.write_back_changes(df, store.id_index, graph, changes)
+        return changes
+    timings["handle_separator_to_box"] = best_of(separators_to_box, repeat=repeat)
+
+    # Every run appends to a fresh copy of the sheet and an empty print queue, from the same seed
+    fresh = {}
+
+    def reload():
+        queue_path = os.path.join(directory, f"queue_{rows}.sqlite")
+        if os.path.exists(queue_path):
+            os.remove(queue_path)
+        fresh["store"], fresh["df"], fresh["graph"] = load_inventory(path, rows, seed)
+        fresh["queue"] = print_queue.PrintQueue(queue_path)
+        fresh["rng"] = random.Random(seed)
+
+    def save_new_items():
+        return card_inventory.add_new_items(
+            fresh["df"], fresh["store"].id_index, fresh["graph"], fresh["queue"],
+            "storage box", 10, "", 4, set(), fresh["rng"]
+        )
+    timings["save_new_items 10+40"] = best_of(save_new_items, reload, repeat)
+
+    layout = label_layout.TEMPLATES["letter 2x2"]
+    items = [[1, node_id] for node_id in df["id"].astype(str)[:PDF_LABELS]]
+    timings[f"create_pdf_new {len(items)}"] = best_of(
+        lambda: barcode_generator.create_pdf_new(items, layout=layout, parallel=False).output(dest="S"),
+        clear_label_caches, min(repeat, 3)
+    )
+    timings[f"stream_pdf {len(items)}"] = best_of(
+        lambda: barcode_generator.stream_pdf(items, DiscardSink(), layout, parallel=False),
+        clear_label_caches, min(repeat, 3)
+    )
+    return timings
+
+
+def bench_inventory(sizes=INVENTORY_SIZES, seed=0, repeat=5):
+    """Time each hot path on a generated sheet of every size. Returns {rows: {name: seconds}}."""
+    with tempfile.TemporaryDirectory() as directory:
+        return {rows: bench_inventory_size(directory, rows, seed, repeat) for rows in sizes}
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    """Merge results into the baseline file, so sizes not run this time keep their numbers."""
+    baseline = load_baseline(path)
+    for rows, timings in results.items():
+        baseline.setdefault(str(rows), {}).update(timings)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+
+
+def print_inventory_results(results, baseline):
+    print(f"{'rows':>8}  {'hot path':<26}{'seconds':>10}{'baseline':>10}{'ratio':>8}")
+    for rows, timings in results.items():
+        for name, elapsed in timings.items():
+            before = baseline.get(str(rows), {}).get(name)
+            if before:
+                ratio = elapsed / before
+                flag = "  slower" if ratio > REGRESSION_RATIO else ""
+                print(f"{rows:>8}  {name:<26}{elapsed:>10.4f}{before:>10.4f}{ratio:>7.2f}x{flag}")
+            else:
+                print(f"{rows:>8}  {name:<26}{elapsed:>10.4f}{'-':>10}{'-':>8}")
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["inventory"]:
+    sizes = tuple(int(arg) for arg in sys.argv[2:] if arg != "--save-baseline") or INVENTORY_SIZES
+    results = bench_inventory(sizes)
+    print_inventory_results(results, load_baseline())
+    if "--save-baseline" in sys.argv:
+        save_baseline(results)
+        print(f"Saved baseline to {BASELINE_PATH}")
+
+elif __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    print(f"{'labels':<8}{'count':>7}{'workers':>9}{'seconds':>10}{'speedup':>9}")
+    for kind, n, workers, elapsed, speedup in bench_render_labels(count, max_workers):
+        print(f"{kind:<8}{n:>7}{workers:>9}{elapsed:>10.2f}{speedup:>8.2f}x")
+
+    print()
+    print(f"{'labels':>7}{'fpdf MB':>10}{'stream MB':>11}{'no cache MB':>13}")
+    for n, fpdf_peak, stream_peak, writer_peak in bench_pdf_memory():
+        print(f"{n:>7}{fpdf_peak / 1e6:>10.1f}{stream_peak / 1e6:>11.1f}{writer_peak / 1e6:>13.1f}")
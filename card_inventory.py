@@ -5,7 +5,241 @@ from googleapiclient.discovery import build
 import json
 import random
 import string
+import uuid
 import barcode_generator
+import filter_cache
+import results_view
+import shared_store
+import table_schema
+import container_graph
+import print_queue
+import storage_backend
+
+# The Containers steps that don't need Streamlit, used by the handlers in run_top_to_bottom and by benchmarks.py
+
+def filter_rows(store, df, query, categories, and_or, mode):
+    """Rows of df to list for the search query and selected categories, with their row index in 'original_index'."""
+    # A scanned ID or barcode goes straight to its row, skipping the search and category filters
+    scanned_index = store.id_index.find(query, df)
+    if mode in ("Viewing", "Using") and scanned_index is not None:
+        filtered_df = df.loc[[scanned_index]].copy()
+        filtered_df["original_index"] = filtered_df.index
+        return filtered_df
+    if mode == "Using":
+        filtered_df = df.iloc[0:0].copy()  # Return empty DataFrame unless the query is an exact ID or barcode
+        filtered_df["original_index"] = filtered_df.index
+        return filtered_df
+
+    rows = None #row positions left after filtering, None for all of them
+    if mode == "Viewing":
+        # Search query filter, any cell containing the query
+        if query:
+            rows = store.search(query)
+
+        # Categories filter, item must be in all (AND) or any (OR) of the selected types
+        if categories:
+            rows = store.filter_categories(range(len(df)) if rows is None else rows, list(categories), and_or)
+
+    filtered_df = df.copy() if rows is None else df.iloc[rows].copy()
+    filtered_df["original_index"] = filtered_df.index
+    return filtered_df
+
+
+def locate_path(df, id_index, graph, index):
+    """One line per container from the top-level one down to the row at index. Raises container_graph.ParentCycleError."""
+    path_details = []
+
+    # Get the cached chain of IDs from the top-level container down to this one
+    chain = graph.path(df.loc[index, "id"])
+    for depth, item_id in enumerate(chain):
+        # Get the current row (the last ID in the chain is the selected row itself)
+        row_idx = index if depth == len(chain) - 1 else id_index.get(item_id)
+
+        # Extract Type and Location, reading just those cells rather than building the whole row
+        try:
+            item_type = df.at[row_idx, "type"].upper()
+        except:
+            item_type = None
+        item_id = item_id.upper() #the graph's IDs are the 'id' cells
+        item_name = df.at[row_idx, "name"]
+        location = df.at[row_idx, "location"]
+
+        if location == "" or location is None:
+            if item_name == "" or item_name is None:
+                path_details.append(f"{item_type}: {item_id} in slot: None \n")
+            else:
+                path_details.append(f"{item_type}, {item_name}: {item_id} in slot: None. \n")
+        else:
+            if item_name == "" or item_name is None:
+                path_details.append(f"{item_type}: {item_id} in slot {location} \n")
+            else:
+                path_details.append(f"{item_type}, {item_name}: {item_id} in slot {location} \n")
+
+    return path_details
+
+
+def detach_children(graph, child_ids):
+    """Take each child out of every container that lists it."""
+    for child_id in child_ids:
+        graph.detach(child_id) #only touches the rows that list this child
+
+
+def write_back_changes(df, id_index, graph, changes):
+    """Serialize the parent/child cells of rows the graph changed into df and add those rows to changes."""
+    for idx in graph.write_back(df, id_index):
+        changes[idx] = df.iloc[idx].copy()
+
+
+def location_of(df, id_index, idx, slot=0):
+    """(row index, ID, type) of the location tag for slot of the container at idx; the index and type are None if there is none."""
+    associate_id = f"{df.loc[idx, 'id']}-{slot}"
+    associate_idx = id_index.get(associate_id) #get index of location
+    associate_type = df.loc[associate_idx, "type"] if associate_idx is not None else None
+    return associate_idx, associate_id, associate_type
+
+
+def place_separators(df, id_index, graph, changes, sep_idx, box_idx, location_idx=None):
+    """
+    Put the separators at rows sep_idx in the storage box or bin at box_idx.
+
+    In a storage box they go in the slot of the location tag at location_idx (the box's first slot
+    by default). In a bin only the last separator is placed, and it takes over the bin's cards.
+    Edited rows are added to changes; the graph still has to be written back.
+
+    Returns:
+        List of (level, message) to show, level being "success" or "warning".
+
+    Raises:
+        ValueError: The storage box has no location tags.
+    """
+    box_id = df.loc[box_idx, "id"]
+    messages = []
+
+    if location_idx is None:
+        location_idx, location_id, location_type = location_of(df, id_index, box_idx)
+
+    if df.loc[box_idx, "type"] == "storage box":
+        if location_idx is None:
+            raise ValueError(f"No locations associated with {box_id}")
+        sep_ids = [] #list of separator batch IDS to assign to location
+        for idx in sep_idx:
+            sep_ids.append(df.loc[idx, "id"])
+            graph.set_parent(df.loc[idx, "id"], box_id)
+            df.at[idx, "location"] = df.loc[location_idx, "location"]
+            changes[idx] = df.iloc[idx].copy()
+
+        detach_children(graph, sep_ids)
+
+        graph.add_children(df.loc[location_idx, "id"], sep_ids)
+        graph.add_children(box_id, sep_ids) #add the set of separators to children
+        messages.append(("success", f"Placed {sep_ids} in {box_id}."))
+
+    elif df.loc[box_idx, "type"] == "bin":
+        if len(sep_idx) > 1:
+            messages.append(("warning", f"Completed action but only with the last scanned item."))
+        sep_idx = sep_idx[-1]
+        sep_id = df.loc[sep_idx, "id"]
+
+        graph.set_parent(sep_id, box_id)
+        detach_children(graph, [sep_id])
+
+        # Get the list of child IDs based on click_history
+        passed_child_ids = []
+        for child_id in graph.child_ids(box_id):
+            child_idx = id_index.get(child_id)
+            if child_idx is not None:
+                graph.set_parent(child_id, "") #remove the existing child's parent in column
+                df.at[child_idx, "location"] = "" #remove the existing child's location in column
+                changes[child_idx] = df.iloc[child_idx].copy()
+            else:
+                #leave alone since it is a card
+                passed_child_ids.append(child_id)
+
+        if len(passed_child_ids) > 0:
+            pass
+            #cdf = st.session_state.card_data
+            # for card_id in passed_child_ids:
+            #     card_idx = cdf.index[cdf['id'] == card_id][0] if any(cdf['id'] == card_id) else None
+            #     if card_idx is not None:
+            #         cdf.loc[card_idx, "parent"] = df.loc[sep_idx, "id"]
+            #         st.session_state.card_changes[card_idx] = cdf.iloc[card_idx].copy()
+
+        df.at[sep_idx, "location"] = str(len(passed_child_ids))
+        changes[sep_idx] = df.iloc[sep_idx].copy()
+
+        graph.set_children(sep_id, passed_child_ids) #add cards to separator
+        graph.set_children(box_id, [sep_id]) #add the set of separators to children
+
+        messages.append(("success", f"Placed {sep_id} in {box_id}."))
+        if len(passed_child_ids) > 0:
+            messages.append(("success", f"{sep_id} assumed all of {box_id} cards."))
+
+    return messages
+
+
+def add_new_items(df, id_index, graph, labels_queue, node_type, quantity, name, lsq, new_ids, rng=random):
+    """
+    Append quantity new containers, each with lsq location tags, register them in the graph and queue their labels.
+
+    Args:
+        new_ids: IDs already handed out in this batch but not in id_index yet; the new IDs are added to it.
+        rng: Source of the random IDs.
+
+    Returns:
+        (df, changes): df with the rows appended, and {row index: row} for the appended rows.
+    """
+    def get_new_id(node_type):
+        """Generate a unique ID based on the type."""
+        while True:
+            random_id = ''.join(rng.choices(string.ascii_uppercase, k=6))
+            node_id = f"{node_type.upper()[:3]}-{random_id}"
+            # Ensure ID is unique by checking against existing DataFrame
+            if node_id not in id_index and node_id not in new_ids:
+                return node_id
+
+    new_rows = []
+    queued_labels = []
+    for _ in range(quantity):
+        node_id = get_new_id(node_type)
+        new_ids.add(node_id)
+        barcode = f"*{node_id}*"
+
+        # Generate a new row for the DataFrame
+        new_rows.append({
+            "id": node_id,
+            "name": name,
+            "type": node_type,
+            "parent": "",
+            "child": "",
+            "barcode": barcode,
+            "location": ""
+        })
+        queued_labels.append([1, node_id])
+
+        for i in range(lsq):
+            ls_id = f"{node_id}-{i}"
+            new_rows.append({
+                "id": ls_id,
+                "name": "",
+                "type": "location",
+                "parent": "", #no parent to avoid inclusion in tree structure. Should only be assigning locations
+                "child": "",
+                "barcode": f"*{ls_id}*",
+                "location": f"{i}"
+            })
+            queued_labels.append([1, ls_id])
+
+    # Append the whole batch at once and register each new row in the graph
+    start = len(df)
+    new_df = pd.DataFrame(new_rows).reindex(columns=df.columns, fill_value="")
+    df = table_schema.append_rows(df, new_df)
+    changes = {}
+    for offset, new_row in enumerate(new_rows):
+        graph.add_node(new_row["id"])
+        changes[start + offset] = new_df.iloc[offset].copy()
+    labels_queue.add_many(queued_labels) #one write for the batch
+    return df, changes
+
 
 def run_top_to_bottom():
     #session states
@@ -33,6 +267,17 @@ def run_top_to_bottom():
     if "changes" not in st.session_state:
         st.session_state.changes = {} #changes to push when we send batch data
 
+    if "filter_cache" not in st.session_state:
+        st.session_state.filter_cache = filter_cache.FilterCache() #filter_data results for the current store_version
+
+    if "results_page" not in st.session_state:
+        st.session_state.results_page = 1 #page of filtered results shown, back to 1 when the filters change
+        st.session_state.results_for = None #filters and page size the page number belongs to
+        st.session_state.results_table_id = 0 #part of the results table key, bumped to clear its selection
+
+    if "store_version" not in st.session_state:
+        st.session_state.store_version = 0 #version of the shared table st.session_state.data was taken from
+
     if "card_changes" not in st.session_state:
         st.session_state.card_changes = {} #changes to push when we send batch data
 
@@ -42,9 +287,6 @@ def run_top_to_bottom():
     if "new_item_entry" not in st.session_state:
         st.session_state.new_item_entry = False
 
-    if "barcode_print_list" not in st.session_state:
-        st.session_state.barcode_print_list = [] #stored as list of [int: quantity to print, str: barcode text]
-
     if "print_barcodes_in_viewing" not in st.session_state:
         st.session_state.print_barcodes_in_viewing = False
 
@@ -55,17 +297,7 @@ def run_top_to_bottom():
         st.session_state.first_item_using = True
 
     if "valid_parents" not in st.session_state:
-        st.session_state.valid_parents = {
-            "machine": [], #1
-            "shelf": [], #1
-            "cart": [], #1
-            "plate": ["cart", "shelf", "machine"], #2
-            "storage box": ["shelf"], #idk
-            "bin": ["plate"], #3
-            "separator":["bin", "storage box"], #4
-            "location": [],
-            "card": ["bin", "separator"]
-        }
+        st.session_state.valid_parents = {node_type: list(parents) for node_type, parents in container_graph.VALID_PARENTS.items()}
 
     if "previous_type" not in st.session_state:
         st.session_state.previous_type = None
@@ -88,47 +320,94 @@ def run_top_to_bottom():
         service = build("sheets", "v4", credentials=credentials)
         return service
 
-    # Function to fetch data from Google Sheets (do not cache the 'service' argument)
-    def fetch_sheet_data(_service, spreadsheet_id, sheet_name):
-        """Fetches data from the Google Sheet and returns it as a Pandas DataFrame."""
-        sheet = _service.spreadsheets()
-        result = sheet.values().get(spreadsheetId=spreadsheet_id, range=sheet_name).execute()
-        values = result.get("values", [])
-        
-        if values:
-            columns = []
-            for value in values[0]:
-                columns.append(str(value).lower())
-            df = pd.DataFrame(values[1:], columns=columns)  # First row as column names
-        else:
-            df = pd.DataFrame()  # Empty DataFrame if no data
-        return df
-
-    def update_rows(_service, spreadsheet_id, sheet_name, rows_dict):
-        # Prepare the batch update data
-        data = []
-        for index, row in rows_dict.items():
-            # Convert the row to a list
-            updated_row = row.tolist()
-            # Calculate the range for this row (1-based indexing in Sheets, +2 for header)
-            range_to_update = f"{sheet_name}!A{index + 2}"
-            # Append this update to the batch data
-            data.append({
-                "range": range_to_update,
-                "values": [updated_row]
-            })
-
-        # Perform batch update to Google Sheets
-        if data:
-            body = {
-                "valueInputOption": "RAW",
-                "data": data
-            }
-            _service.spreadsheets().values().batchUpdate(
-                spreadsheetId=spreadsheet_id,
-                body=body
-            ).execute()
+    # Drive API client, only used to read the spreadsheet's version so we know when the sheet changed
+    @st.cache_data
+    def authenticate_drive_with_service_account(credentials_dict):
+        """Authenticate with Google Drive API using service account credentials."""
+        credentials = service_account.Credentials.from_service_account_info(
+            credentials_dict, scopes=["https://www.googleapis.com/auth/drive.metadata.readonly"]
+        )
+        drive_service = build("drive", "v3", credentials=credentials)
+        return drive_service
+
+    # Only the SQLite backend is worth caching; Sheets clients come from the cached authenticate_* above
+    @st.cache_resource
+    def open_sqlite_backend(path):
+        return storage_backend.SQLiteBackend(path)
+
+    # One SharedInventory per storage backend, shared by every session on this server
+    @st.cache_resource
+    def open_inventory(storage_key, _backend, _make_writer_backend):
+        return shared_store.SharedInventory(_backend, _make_writer_backend())
+
+    # Labels queued for printing are kept on disk, so they outlive sessions and restarts
+    @st.cache_resource
+    def open_print_queue(path, name):
+        return print_queue.PrintQueue(path, name)
+
+    def update_rows(sheet_name, rows_dict):
+        """
+        Commits rows to the shared table, so every session sees them on its next rerun, and queues them
+        to be written to the storage backend, where keys are row indices and values are rows from a
+        Pandas DataFrame. The write-behind queue sends them from a background thread, so the scan
+        doesn't wait on the network round trip.
+        """
+        if sheet_name != SHEET_NAME:
+            inventory.write_queue.enqueue(sheet_name, rows_dict)
+            st.session_state.changes = {}
+            return
+        old_version = st.session_state.store_version
+        with store.lock: #so moving appended rows (see send_rows) can't fall between the commit and the enqueue
+            rows_dict, moved = store.commit(rows_dict, st.session_state.base_rows, old_version)
+            inventory.write_queue.enqueue(sheet_name, rows_dict)
         st.session_state.changes = {}
+        # Rebase right away, so the session's next write goes to where its rows are in the shared table
+        read_store(lambda index: moved[index] if index in moved else store.rebase_index(index, old_version))
+
+    def move_positions(new_index):
+        """Point the row positions the session holds at where new_index says those rows are now."""
+        st.session_state.selected_index = new_index(st.session_state.selected_index)
+        st.session_state.previous_index = new_index(st.session_state.previous_index)
+        st.session_state.click_history = [new_index(index) for index in st.session_state.click_history]
+
+    def read_store(new_index=None):
+        """
+        Point the session at the latest version of the shared Containers table. Only rows that
+        changed since the session's last view are re-read into its container graph. new_index maps
+        the session's row positions to the new view's; by default it follows rows moved since the
+        last view (see SharedTable.rebase_index).
+        """
+        if "view_sheet" not in st.session_state:
+            store.check_in_background() #a new session shouldn't miss edits made outside this server
+        store.poll(protected=inventory.write_queue.pending_rows(SHEET_NAME))
+        # data is None after reset_all_states (the database pill changed), so it has to be read again
+        same_sheet = st.session_state.get("view_sheet") == SHEET_NAME and "container_graph" in st.session_state and st.session_state.get("data") is not None
+        if same_sheet and st.session_state.store_version == store.version:
+            return
+
+        changed = store.changed_since(st.session_state.store_version) if same_sheet else None
+        if same_sheet:
+            old_version = st.session_state.store_version
+            move_positions(new_index or (lambda index: store.rebase_index(index, old_version)))
+        st.session_state.data, st.session_state.store_version = store.view()
+        st.session_state.base_rows = len(st.session_state.data)
+        st.session_state.view_sheet = SHEET_NAME
+        data = st.session_state.data
+        if changed is None:
+            st.session_state.container_graph = container_graph.ContainerGraph(data)
+            return
+        for idx in changed:
+            row = data.loc[idx]
+            st.session_state.container_graph.load_row(row["id"], row["parent"], container_graph.split_ids(row["child"]))
+
+    def sync_data():
+        """Pull only the rows that changed in the sheet into the shared table, then catch the session up with it."""
+        store.refresh(protected=inventory.write_queue.pending_rows(SHEET_NAME))
+        read_store()
+
+    def write_graph_changes():
+        """Serialize the parent/child cells of rows the graph changed and queue them for the next update_rows."""
+        write_back_changes(st.session_state.data, store.id_index, st.session_state.container_graph, st.session_state.changes)
 
 
     st.markdown("""
@@ -152,6 +431,34 @@ def run_top_to_bottom():
         </style>
     """, unsafe_allow_html=True)
 
+    # Shows how many sheet writes are still queued; reruns on its own so it updates while the queue drains
+    @st.fragment(run_every=2)
+    def show_write_status():
+        status = inventory.write_queue.status()
+        if status["dropped"]:
+            st.error(f"Sheet writes: {status['dropped']} rows could not be saved ({status['last_dropped']})")
+        if status["last_error"]:
+            st.warning(f"Sheet writes: {status['pending']} pending, retrying after error: {status['last_error']}")
+        elif status["pending"]:
+            st.caption(f"Sheet writes: {status['pending']} pending, {status['flushed']} saved")
+        else:
+            st.caption(f"Sheet writes: all {status['flushed']} saved")
+
+    def show_load_time():
+        source, row_count, seconds = store.load_time
+        note = " (checking Google Sheets for changes)" if store.sync.background_pending() else ""
+        st.caption(f"Loaded {row_count} rows from {source} in {seconds:.2f} s{note}")
+        if store.memory is not None:
+            before, after = store.memory.iloc[-1][["before", "after"]]
+            with st.expander(f"Memory: {after / 1e6:.1f} MB typed, {before / 1e6:.1f} MB as text"):
+                st.dataframe(store.memory, hide_index=True)
+
+    # Polls the background check started from a snapshot load and reruns the app once it has finished
+    @st.fragment(run_every=1)
+    def wait_for_background_sync():
+        if not store.sync.background_pending():
+            st.rerun()
+
     # Function to format row data into a button label
     def format_row(row):
         def format_field(field, length):
@@ -171,6 +478,11 @@ def run_top_to_bottom():
         # Combine fields into a single string for button text
         return f"`{id_field}{name_field}{type_field}{parent_field}{child_field}{loc_field}`"
 
+    # Columns of the results table, as (heading, column)
+    RESULT_COLUMNS = [
+        ("ID", "id"), ("NAME", "name"), ("TYPE", "type"), ("PARENT", "parent"), ("CHILD", "child"), ("LOC", "location")
+    ]
+
     # Function to display a row as a button with Streamlit's st.button
     def display_row(row, index):
         # Format the button label with the custom function
@@ -183,52 +495,12 @@ def run_top_to_bottom():
             st.rerun()
 
     def locate(index):
-        # Extract the DataFrame from session state
         df = st.session_state.data
-
-        # Initialize variables to store type and location details
-        path_details = []
-        
-        # Start from the given index
-        current_index = index
-        
-        while current_index is not None:
-            # Get the current row
-            row = df.loc[current_index]
-            
-            # Extract Type and Location
-            try:
-                item_type = row["type"].upper()
-            except:
-                item_type = None
-            item_id = row["id"].upper()
-            item_name = row["name"]
-            location = row["location"]
-                
-
-            if location == "" or location is None:          
-                if item_name == "" or item_name is None:  
-                    path_details.append(f"{item_type}: {item_id} in slot: None \n")
-                else:
-                    path_details.append(f"{item_type}, {item_name}: {item_id} in slot: None. \n")
-            else:          
-                if item_name == "" or item_name is None:  
-                    path_details.append(f"{item_type}: {item_id} in slot {location} \n")
-                else:
-                    path_details.append(f"{item_type}, {item_name}: {item_id} in slot {location} \n")
-            
-            # Find the parent ID and locate the parent index
-            parent_id = row["parent"]
-            if pd.notna(parent_id) and parent_id.strip():
-                parent_index = df.index[df["id"] == parent_id].tolist()
-                current_index = parent_index[0] if parent_index else None
-            else:
-                # No parent exists, terminate the loop
-                current_index = None
-        
-        # Construct the final string by joining path details in reverse order
-        path_list = reversed(path_details)
-        return path_list
+        try:
+            return locate_path(df, store.id_index, st.session_state.container_graph, index)
+        except container_graph.ParentCycleError as e:
+            st.error(f"Could not locate {df.loc[index, 'id']}: the sheet has a {e}. Please fix the parent column in google sheets.")
+            return []
 
 
     # Function to handle row selection
@@ -245,12 +517,15 @@ def run_top_to_bottom():
                 return
             # Convert the CSV string of child IDs into a list
             child_ids = child_ids_csv.split(",")
-            # Filter rows with IDs matching the child IDs
-            filtered_rows = data[data["id"].astype(str).isin(child_ids)]
-            for index, row in filtered_rows.iterrows():
-                display_row(row, index)
+            # Look up rows with IDs matching the child IDs
+            missing_ids = []
+            for child_id in child_ids:
+                child_index = store.id_index.get(child_id)
+                if child_index is None:
+                    missing_ids.append(child_id)
+                else:
+                    display_row(data.loc[child_index], child_index)
 
-            missing_ids = [child_id for child_id in child_ids if child_id not in data["id"].astype(str).values]
             for missing_id in missing_ids:
                 # Format the button label with the custom function
                 button_label = f"`CARD ID: {missing_id}`"
@@ -267,10 +542,9 @@ def run_top_to_bottom():
             if not parent_id:  # If no children, display a message and return
                 st.info("No parent found.")
                 return
-            # Filter rows with IDs matching the child IDs
-            filtered_rows = data[data["id"].astype(str).isin([parent_id])]
-            for index, row in filtered_rows.iterrows():
-                display_row(row, index)
+            parent_index = store.id_index.get(parent_id)
+            if parent_index is not None:
+                display_row(data.loc[parent_index], parent_index)
 
         if mode == "Viewing":
             # Show the dataframe for editing using st.data_editor
@@ -298,9 +572,9 @@ def run_top_to_bottom():
             if st.session_state.print_barcodes_in_viewing:
                 def save_to_print_queue():
                     st.session_state.print_barcodes_in_viewing = False
-                    st.session_state.barcode_print_list.append([quantity_to_print, f"{st.session_state.current_copy.loc['id']}"])
+                    labels_queue.add(f"{st.session_state.current_copy.loc['id']}", quantity_to_print)
                     # for j in filtered_data['id'].tolist():
-                    #     st.session_state.barcode_print_list.append([1, j])
+                    #     labels_queue.add(j)
 
                 def cancel_print():
                     st.session_state.print_barcodes_in_viewing = False
@@ -337,7 +611,7 @@ def run_top_to_bottom():
             def verify_proper_action(batch_type, end_type):
                 valid_parents = st.session_state.valid_parents
                 if end_type in valid_parents[batch_type]: #check if we are placing an item of status exactly 1 less into parent. Otherwise fail.
-                    st.session_state.data = fetch_sheet_data(service, SPREADSHEET_ID, SHEET_NAME)
+                    sync_data()
                     return True                            
                 else:
                     st.error(f"Did not complete action. Cannot place type {batch_type} in {end_type}.") 
@@ -346,145 +620,49 @@ def run_top_to_bottom():
                     return False
                 
             def remove_children_from_other_parents(child_ids):
-                for idx, row in st.session_state.data.iterrows():
-                    existing_child_ids = row["child"]
-                    if pd.notna(existing_child_ids) and existing_child_ids.strip():
-                        child_list = existing_child_ids.split(",")
-                        # Filter out any IDs in the child_ids list
-                        updated_child_list = [id_ for id_ in child_list if id_ not in child_ids]
-                        if len(updated_child_list) != len(child_list):  # Only update if there was a change
-                            # Update the dataframe
-                            st.session_state.data.loc[idx, "child"] = ",".join(updated_child_list)
-                            st.session_state.changes[idx] = st.session_state.data.iloc[idx].copy()
+                detach_children(st.session_state.container_graph, child_ids)
 
 
             def get_location_associate(idx):
                 df = st.session_state.data
                 loc_id = df.loc[idx,"id"]
                 associate_id = '-'.join(loc_id.split('-')[:-1]) if loc_id.count('-') > 1 else loc_id
-                associate_idx = df.index[df['id'] == associate_id].tolist()[0] if any(df['id'] == associate_id) else None
-                associate_type = st.session_state.data.loc[associate_idx, "type"]
+                associate_idx = store.id_index.get(associate_id)
+                associate_type = df.loc[associate_idx, "type"] if associate_idx is not None else None
                 return associate_idx, associate_id, associate_type
             
             def get_location_from_object(idx, slot=0):
-                df = st.session_state.data
-                parent_id = st.session_state.data.loc[idx, "id"]
-                associate_id = f"{parent_id}-{slot}"
-                associate_idx = df.index[df['id'] == associate_id][0] #get index of location
-                associate_type = df.loc[associate_idx, "type"]
-                return associate_idx, associate_id, associate_type
+                return location_of(st.session_state.data, store.id_index, idx, slot)
 
             
             def remove_existing_relationship_at(idx):
                 df = st.session_state.data
-                existing_child_id = df.loc[idx, "child"].strip()
-                existing_child_idx = df.index[df['id'] == existing_child_id].tolist()[0] if any(df['id'] == existing_child_id) else None
-                if existing_child_idx is not None:
-                    df.loc[existing_child_idx, "parent"] = "" #remove the existing child's parent in column
-                    df.loc[existing_child_idx, "location"] = "" #remove the existing child's location in column
-                    st.session_state.changes[existing_child_idx] = st.session_state.data.iloc[existing_child_idx].copy()
-                    remove_children_from_other_parents([existing_child_id]) #remove the child from all parents
+                graph = st.session_state.container_graph
+                for existing_child_id in graph.child_ids(df.loc[idx, "id"]):
+                    existing_child_idx = store.id_index.get(existing_child_id)
+                    if existing_child_idx is not None:
+                        graph.set_parent(existing_child_id, "") #remove the existing child's parent in column
+                        df.at[existing_child_idx, "location"] = "" #remove the existing child's location in column
+                        st.session_state.changes[existing_child_idx] = st.session_state.data.iloc[existing_child_idx].copy()
+                        remove_children_from_other_parents([existing_child_id]) #remove the child from all parents
 
             def handle_separator_to_box(sep_idx: list, box_idx: int, location_idx=None):
-                df = st.session_state.data
-
-                if location_idx is None:
-                    location_idx, location_id, location_type = get_location_from_object(box_idx)
-
-                if df.loc[box_idx, "type"] == "storage box":
-                    if location_idx is None:
-                        st.error(f"Did not complete action. No locations associated with {df.loc[box_idx, 'id']}")
-                        return
-                    sep_ids = [] #list of separator batch IDS to assign to location
-                    for idx in sep_idx:
-                        sep_ids.append(df.loc[idx, "id"])
-                        df.loc[idx, "parent"] = df.loc[box_idx, "id"]
-                        df.loc[idx, "location"] = df.loc[location_idx, "location"]
-                        st.session_state.changes[idx] = df.iloc[idx].copy()
-
-                    remove_children_from_other_parents(sep_ids)
-
-                    existing_sep_ids = df.loc[location_idx, "child"]
-                    if pd.notna(existing_sep_ids) and existing_sep_ids.strip():
-                        current_sep_ids = existing_sep_ids.split(",")
-                    else:
-                        current_sep_ids = []
-
-                    updated_sep_ids = list(set(current_sep_ids + list(map(str, sep_ids))))
-
-                    df.loc[location_idx, "child"] = ",".join(updated_sep_ids)
-                    st.session_state.changes[location_idx] = df.iloc[location_idx].copy()
-
-
-
-                    # Get the list of child IDs based on click_history
-                    existing_child_ids = df.loc[box_idx, "child"]
-                    if pd.notna(existing_child_ids) and existing_child_ids.strip():
-                        current_child_ids = existing_child_ids.split(",")
-                    else:
-                        current_child_ids = []
-
-                    updated_child_ids = list(set(current_child_ids + list(map(str, sep_ids))))
-                    df.loc[box_idx, "child"] = ",".join(updated_child_ids) #add the set of separators to children
-                    st.session_state.changes[box_idx] = df.iloc[box_idx].copy()
-                    st.success(f"Placed {df.loc[sep_idx, 'id']} in {df.loc[box_idx, 'id']}.") 
-
-                elif df.loc[box_idx, "type"] == "bin":
-                    if len(sep_idx) > 1:
-                        st.warning(f"Completed action but only with the last scanned item.") 
-                    sep_idx = sep_idx[-1]
-
-                    sep_ids = [] #list of separator batch IDS to assign to location
-                    sep_ids.append(df.loc[sep_idx, "id"])
-                    df.loc[sep_idx, "parent"] = df.loc[box_idx, "id"]
-
-                    remove_children_from_other_parents(sep_idx)
-                    
-
-                    # Get the list of child IDs based on click_history
-                    existing_child_ids = df.loc[box_idx, "child"]
-                    passed_child_ids = []
-
-                    if pd.notna(existing_child_ids) and existing_child_ids.strip():
-                        current_child_ids = existing_child_ids.split(",")
-                        for child_id in current_child_ids:
-                            child_idx = df.index[df['id'] == child_id][0] if any(df['id'] == child_id) else None
-                            if child_idx is not None:
-                                df.loc[child_idx, "parent"] = "" #remove the existing child's parent in column
-                                df.loc[child_idx, "location"] = "" #remove the existing child's location in column
-                                st.session_state.changes[child_idx] = st.session_state.data.iloc[child_idx].copy()
-                            else:
-                                #leave alone since it is a card
-                                passed_child_ids.append(child_id)
-                    else:
-                        current_child_ids = []
-
-                    if len(passed_child_ids) > 0:
-                        pass
-                        #cdf = st.session_state.card_data
-                        # for card_id in passed_child_ids:
-                        #     card_idx = cdf.index[cdf['id'] == card_id][0] if any(cdf['id'] == card_id) else None
-                        #     if card_idx is not None:
-                        #         cdf.loc[card_idx, "parent"] = df.loc[sep_idx, "id"]
-                        #         st.session_state.card_changes[card_idx] = cdf.iloc[card_idx].copy()
-
-                    df.loc[sep_idx, "location"] = len(passed_child_ids)
-                    st.session_state.changes[sep_idx] = df.iloc[sep_idx].copy()
-
-                    str_passed = ",".join(passed_child_ids)
-                    df.loc[sep_idx, "child"] = str_passed #add cards to separator
-                    df.loc[box_idx, "child"] = df.loc[sep_idx, "id"] #add the set of separators to children
-                    st.session_state.changes[box_idx] = df.iloc[box_idx].copy()
-                    st.session_state.changes[sep_idx] = df.iloc[sep_idx].copy()
-
-                    st.success(f"Placed {df.loc[sep_idx, 'id']} in {df.loc[box_idx, 'id']}.") 
-                    if len(passed_child_ids) > 0:
-                        st.success(f"{df.loc[sep_idx, 'id']} assumed all of {df.loc[box_idx, 'id']} cards.") 
+                try:
+                    messages = place_separators(
+                        st.session_state.data, store.id_index, st.session_state.container_graph,
+                        st.session_state.changes, sep_idx, box_idx, location_idx
+                    )
+                except ValueError as e:
+                    st.error(f"Did not complete action. {e}")
+                    return
+                for level, message in messages:
+                    getattr(st, level)(message)
 
                 st.session_state.click_history = []
                 st.session_state.first_item_using = True
-                update_rows(service, SPREADSHEET_ID, SHEET_NAME, st.session_state.changes)
-                update_rows(service, SPREADSHEET_ID, CARD_SHEET_NAME, st.session_state.card_changes)
+                write_graph_changes()
+                update_rows(SHEET_NAME, st.session_state.changes)
+                update_rows(CARD_SHEET_NAME, st.session_state.card_changes)
 
                         
 
@@ -530,11 +708,12 @@ def run_top_to_bottom():
                             updated_click_history = []
                             associates_to_update = []
                             df = st.session_state.data
+                            graph = st.session_state.container_graph
 
                             # Update the "parent" column for each index in click_history
                             for i, child_index in enumerate(st.session_state.click_history):
                                 associate_id = f"{parent_id}-{i}"
-                                associate_idx = df.index[df['id'] == associate_id][0] if any(df['id'] == associate_id) else None #get index of location
+                                associate_idx = store.id_index.get(associate_id) #get index of location
                                 if associate_idx is None:
                                     child_ids = st.session_state.data.loc[updated_click_history, "id"].tolist()
                                     st.warning(f"Unable to assign the whole batch to this item. Only assigned {child_ids}.")
@@ -544,34 +723,23 @@ def run_top_to_bottom():
                                     associates_to_update.append(associate_idx)
                                     updated_click_history.append(child_index)
 
-                                st.session_state.data.loc[child_index, "parent"] = parent_id
-                                st.session_state.changes[child_index] = df.iloc[child_index].copy()
+                                graph.set_parent(df.loc[child_index, "id"], parent_id)
                             
                             child_ids = st.session_state.data.loc[updated_click_history, "id"].tolist()
                             remove_children_from_other_parents(child_ids)
 
                             for associate_idx, child_idx in zip(associates_to_update, updated_click_history):
-                                st.session_state.data.loc[associate_idx, "child"] = df.loc[child_idx, "id"] #set location's child
-                                st.session_state.data.loc[child_idx, "location"] = df.loc[associate_idx, "location"] #set location's child
+                                graph.set_children(df.loc[associate_idx, "id"], [df.loc[child_idx, "id"]]) #set location's child
+                                st.session_state.data.at[child_idx, "location"] = df.loc[associate_idx, "location"] #set location's child
                                 st.session_state.changes[child_idx] = df.iloc[child_idx].copy()
-                                st.session_state.changes[associate_idx] = df.iloc[associate_idx].copy()
 
-                            # Get the list of child IDs based on click_history
-                            existing_child_ids = st.session_state.data.loc[index, "child"]
-                            if pd.notna(existing_child_ids) and existing_child_ids.strip():
-                                current_child_ids = existing_child_ids.split(",")
-                            else:
-                                current_child_ids = []
-
-                            updated_child_ids = list(set(current_child_ids + list(map(str, child_ids))))
-
-                            # Update the "child" column for the parent index with a CSV list of updated child IDs
-                            st.session_state.data.loc[index, "child"] = ",".join(updated_child_ids)
-                            st.session_state.changes[index] = st.session_state.data.iloc[index].copy()
+                            # Add the batch to the parent's "child" column
+                            graph.add_children(parent_id, child_ids)
 
                             st.session_state.click_history = []
                             st.session_state.first_item_using = True
-                            update_rows(service, SPREADSHEET_ID, SHEET_NAME, st.session_state.changes)
+                            write_graph_changes()
+                            update_rows(SHEET_NAME, st.session_state.changes)
                             st.success(f"Assigned {child_ids} to {parent_id}")
 
                 elif st.session_state.previous_type == "location" and not this_type == "location":
@@ -580,31 +748,23 @@ def run_top_to_bottom():
                         handle_separator_to_box([index], associate_idx, location_idx=st.session_state.previous_index)
                     else:
                         if verify_proper_action(this_type, associate_type):
+                            graph = st.session_state.container_graph
+                            new_child_id = str(st.session_state.current_copy.loc["id"])
                             remove_existing_relationship_at(st.session_state.previous_index)
                             #assign the current scan to the location and reset (add this_type's ID to location's child and the location's associated item's Child)
-                            remove_children_from_other_parents([st.session_state.current_copy.loc["id"]])
-                            st.session_state.data.loc[st.session_state.previous_index, "child"] = st.session_state.current_copy.loc["id"] #set location's child
-                            st.session_state.changes[st.session_state.previous_index] = st.session_state.data.iloc[st.session_state.previous_index].copy()
-                            existing_child_ids = st.session_state.data.loc[associate_idx, "child"]
-                            if pd.notna(existing_child_ids) and existing_child_ids.strip():
-                                current_child_ids = existing_child_ids.split(",")
-                            else:
-                                current_child_ids = []
-
-                            new_child_id = str(st.session_state.current_copy.loc["id"])
-                            updated_child_ids = list(set(current_child_ids + [new_child_id]))
-
-                            st.session_state.data.loc[associate_idx, "child"] = ",".join(updated_child_ids)
-                            st.session_state.data.loc[index, "parent"] = associate_id   #set scanned
-                            st.session_state.data.loc[index, "location"] = st.session_state.data.loc[st.session_state.previous_index, "location"] #set child location column
+                            remove_children_from_other_parents([new_child_id])
+                            graph.set_children(st.session_state.data.loc[st.session_state.previous_index, "id"], [new_child_id]) #set location's child
+                            graph.add_children(associate_id, [new_child_id])
+                            graph.set_parent(new_child_id, associate_id)   #set scanned
+                            st.session_state.data.at[index, "location"] = st.session_state.data.loc[st.session_state.previous_index, "location"] #set child location column
                             st.session_state.changes[index] = st.session_state.data.iloc[index].copy()
-                            st.session_state.changes[associate_idx] = st.session_state.data.iloc[associate_idx].copy()
 
 
                             st.session_state.click_history = []
                             st.session_state.first_item_using = True
-                            st.success(f"Assigned {st.session_state.current_copy.loc['id']} to {associate_id}")
-                            update_rows(service, SPREADSHEET_ID, SHEET_NAME, st.session_state.changes)
+                            st.success(f"Assigned {new_child_id} to {associate_id}")
+                            write_graph_changes()
+                            update_rows(SHEET_NAME, st.session_state.changes)
                         
                 elif not st.session_state.previous_type == "location" and this_type == "location":
                     associate_idx, associate_id, associate_type = get_location_associate(index)
@@ -613,30 +773,22 @@ def run_top_to_bottom():
                     else:
                         prev_idx = st.session_state.previous_index
                         if verify_proper_action(st.session_state.previous_type, associate_type):
+                            graph = st.session_state.container_graph
+                            new_child_id = str(st.session_state.data.loc[prev_idx, "id"])
                             remove_existing_relationship_at(index)
-                            remove_children_from_other_parents([st.session_state.data.loc[prev_idx, "id"]])
+                            remove_children_from_other_parents([new_child_id])
                             #assign the current scan to the location and reset (add this_type's ID to location's child and the location's associated item's Child)
-                            st.session_state.data.loc[index, "child"] = st.session_state.data.loc[prev_idx, "id"] #set location's child
-                            st.session_state.changes[index] = st.session_state.data.iloc[index].copy()
-
-                            existing_child_ids = st.session_state.data.loc[associate_idx, "child"]
-                            if pd.notna(existing_child_ids) and existing_child_ids.strip():
-                                current_child_ids = existing_child_ids.split(",")
-                            else:
-                                current_child_ids = []
-                            new_child_id = str(st.session_state.data.loc[prev_idx, "id"])
-                            updated_child_ids = list(set(current_child_ids + [new_child_id]))
-
-                            st.session_state.data.loc[associate_idx, "child"] = ",".join(updated_child_ids)
-                            st.session_state.data.loc[prev_idx, "parent"] = associate_id   #set scanned
-                            st.session_state.data.loc[prev_idx, "location"] = st.session_state.data.loc[index, "location"] #set child location column
+                            graph.set_children(st.session_state.data.loc[index, "id"], [new_child_id]) #set location's child
+                            graph.add_children(associate_id, [new_child_id])
+                            graph.set_parent(new_child_id, associate_id)   #set scanned
+                            st.session_state.data.at[prev_idx, "location"] = st.session_state.data.loc[index, "location"] #set child location column
                             st.session_state.changes[prev_idx] = st.session_state.data.iloc[prev_idx].copy()
-                            st.session_state.changes[associate_idx] = st.session_state.data.iloc[associate_idx].copy()
 
                             st.session_state.click_history = []
                             st.session_state.first_item_using = True
-                            st.success(f"Assigned {st.session_state.data.loc[prev_idx, 'id']} to {associate_id}")
-                            update_rows(service, SPREADSHEET_ID, SHEET_NAME, st.session_state.changes)
+                            st.success(f"Assigned {new_child_id} to {associate_id}")
+                            write_graph_changes()
+                            update_rows(SHEET_NAME, st.session_state.changes)
 
                 else:
                     st.warning("Did not complete action. Cannot assign location to location.")
@@ -649,30 +801,61 @@ def run_top_to_bottom():
         st.session_state.previous_index = index     
         st.session_state.previous_type = st.session_state.current_copy.loc["type"]
 
-    # Load credentials and authenticate
-    try:
-        credentials_dict = load_credentials_from_toml()
-        service = authenticate_with_service_account(credentials_dict)
-    except Exception as e:
-        st.error(f"Failed to load credentials or authenticate: {e}")
-        st.stop()
+    SPREADSHEET_ID = storage_backend.SPREADSHEET_ID
+
+    # Google Sheets by default; a site can run on a local file instead with
+    # [storage] backend = "sqlite" (and optionally path = "...") in secrets.toml
+    storage_config = st.secrets.get("storage", {})
+    if storage_config.get("backend", "sheets") == "sqlite":
+        backend = open_sqlite_backend(storage_config.get("path", storage_backend.SQLITE_PATH))
+        if not backend.has_table("Containers"):
+            st.error(f"{backend.path} has no Containers table yet. Copy the Google Sheet into it with `python storage_backend.py {backend.path}`.")
+            st.stop()
+    else:
+        # Load credentials and authenticate
+        try:
+            credentials_dict = load_credentials_from_toml()
+            service = authenticate_with_service_account(credentials_dict)
+        except Exception as e:
+            st.error(f"Failed to load credentials or authenticate: {e}")
+            st.stop()
+
+        try:
+            drive_service = authenticate_drive_with_service_account(credentials_dict)
+        except Exception:
+            drive_service = None #sync falls back to comparing rows on every refresh
+        backend = storage_backend.GoogleSheetsBackend(service, SPREADSHEET_ID, drive_service)
+
+    def make_writer_backend():
+        if not backend.is_remote:
+            return backend #SQLite connections are per thread already
+        # The worker thread gets its own API client instead of sharing the one used by script runs
+        return storage_backend.GoogleSheetsBackend(authenticate_with_service_account(credentials_dict), SPREADSHEET_ID, drive_service)
+
+    storage_key = ("sqlite", backend.path) if not backend.is_remote else ("sheets", SPREADSHEET_ID)
+    inventory = open_inventory(storage_key, backend, make_writer_backend)
 
     # Proceed to the rest of the app
-    SPREADSHEET_ID = "1x5QrksNozxbZhf9GlJkWY2FtLG6-H0x7Lr6wKvGODSk"
     SHEET_NAME = "Containers"
     CARD_SHEET_NAME = "Cards"
 
-    # Load data from Google Sheets
-    #try:
-    if "data" not in st.session_state:
-        st.session_state.data = fetch_sheet_data(service, SPREADSHEET_ID, SHEET_NAME)
-    elif st.session_state.data is None:
-        st.session_state.data = fetch_sheet_data(service, SPREADSHEET_ID, SHEET_NAME)
+    # Each station queues labels under the sheet name and the station= key in its URL, so a download
+    # only takes labels queued at that station. [print_queue] name = "..." in secrets.toml makes every
+    # station share one queue instead, and path = "..." moves the queue file.
+    if "station" not in st.query_params:
+        st.query_params["station"] = uuid.uuid4().hex[:8] #kept in the URL, so a reload or bookmark finds its queue again
+    print_queue_config = st.secrets.get("print_queue", {})
+    queue_name = print_queue_config.get("name", f"{SHEET_NAME}:{st.query_params['station']}")
+    labels_queue = open_print_queue(print_queue_config.get("path", print_queue.PRINT_QUEUE_PATH), queue_name)
+
+    # Load data from the shared table, loading it from Google Sheets if this is the first session
+    store = inventory.table(SHEET_NAME, category_column="type", casefold_categories=True)
+    read_store()
 
     # if "card_data" not in st.session_state:
-    #     st.session_state.card_data = fetch_sheet_data(service, SPREADSHEET_ID, CARD_SHEET_NAME)
+    #     st.session_state.card_data = backend.read_table(CARD_SHEET_NAME)
     # elif st.session_state.card_data is None:
-    #     st.session_state.card_data = fetch_sheet_data(service, SPREADSHEET_ID, CARD_SHEET_NAME)
+    #     st.session_state.card_data = backend.read_table(CARD_SHEET_NAME)
 
     # Ensure required columns exist
     #or not {"id", "parent", "json_front","json_back"}.issubset(st.session_state.card_data.columns)
@@ -692,28 +875,28 @@ def run_top_to_bottom():
                 st.session_state.selected = False
                 st.session_state.rerun_action = True
                 if st.session_state.pills_query == "**Page: 8.5x11, Label: 2x2**":
-                    barcode_generator.download_qr_code_pdf(st.session_state.barcode_print_list, paper="sheet", label = "2x2")
-                    st.session_state.barcode_print_list = [] #clear data
+                    barcode_generator.download_print_queue(labels_queue, paper="sheet", label = "2x2")
 
                 elif st.session_state.pills_query == "**Page: 8.5x11, Label: 1x1**":
-                    barcode_generator.download_qr_code_pdf(st.session_state.barcode_print_list, paper="sheet", label = "1x1")
-                    st.session_state.barcode_print_list = [] #clear data
+                    barcode_generator.download_print_queue(labels_queue, paper="sheet", label = "1x1")
                 
                 elif st.session_state.pills_query == "**Page and Label: 2x2 (Thermal Printer)**":
-                    barcode_generator.download_qr_code_pdf(st.session_state.barcode_print_list, paper="thermal", label = "2x2")
-                    st.session_state.barcode_print_list = [] #clear data
+                    barcode_generator.download_print_queue(labels_queue, paper="thermal", label = "2x2")
 
                 elif st.session_state.pills_query == "**Page and Label: 1x1 (Thermal Printer)**":
-                    barcode_generator.download_qr_code_pdf(st.session_state.barcode_print_list, paper="thermal", label = "1x1")
-                    st.session_state.barcode_print_list = [] #clear data
+                    barcode_generator.download_print_queue(labels_queue, paper="thermal", label = "1x1")
 
                 elif st.session_state.pills_query == "**Page: 8.5x11, Separator Style(2 pdfs)**":
-                    barcode_generator.download_qr_code_pdf(st.session_state.barcode_print_list, paper="sheet", label = "separator")
-                    st.session_state.barcode_print_list = [] #clear data
+                    barcode_generator.download_print_queue(labels_queue, paper="sheet", label = "separator")
 
                 elif st.session_state.pills_query == "**Page: Thermal Printer, Separator Style (2 pdfs)**":
-                    barcode_generator.download_qr_code_pdf(st.session_state.barcode_print_list, paper="thermal", label = "separator")
-                    st.session_state.barcode_print_list = [] #clear data
+                    barcode_generator.download_print_queue(labels_queue, paper="thermal", label = "separator")
+
+                elif st.session_state.pills_query == "**Page: 8.5x11, Label: 1x1 (63 per page)**":
+                    barcode_generator.download_print_queue(labels_queue, template="letter 1x1 dense")
+
+                elif st.session_state.pills_query == "**Avery 22806 Sheet, Label: 2x2 (12 per page)**":
+                    barcode_generator.download_print_queue(labels_queue, template="avery 22806")
 
 
         pills_header = [
@@ -722,10 +905,19 @@ def run_top_to_bottom():
             "**Page and Label: 2x2 (Thermal Printer)**",
             "**Page and Label: 1x1 (Thermal Printer)**",
             "**Page: 8.5x11, Separator Style(2 pdfs)**",
-            "**Page: Thermal Printer, Separator Style (2 pdfs)**"
+            "**Page: Thermal Printer, Separator Style (2 pdfs)**",
+            "**Page: 8.5x11, Label: 1x1 (63 per page)**",
+            "**Avery 22806 Sheet, Label: 2x2 (12 per page)**"
         ]
         st.pills("Download Barcode Labels, Choose Size:", pills_header, key="pills_widget", selection_mode="single", default=None, on_change=pills_submit)
         pills_query = st.session_state.pills_query
+        barcode_generator.show_label_downloads()
+        labels, copies = labels_queue.summary()
+        st.caption(f"Print queue: {copies} labels ({labels} unique)")
+        show_write_status()
+        show_load_time()
+        if store.sync.background_pending():
+            wait_for_background_sync()
 
         st.divider()
         st.subheader("Filter and Search")
@@ -787,48 +979,22 @@ def run_top_to_bottom():
         st.button("Input a New Item", on_click=make_new_item)
 
         # Filtering function
+        def cached(key, build):
+            # Reruns from unrelated widgets reuse the last result for the same inputs and data
+            result = st.session_state.filter_cache.get(st.session_state.store_version, key)
+            if result is None:
+                result = build()
+                st.session_state.filter_cache.put(st.session_state.store_version, key, result)
+            return result
+
+        def filter_key():
+            return (st.session_state.search_query, tuple(st.session_state.selected_categories), and_or, mode)
+
         def filter_data(df):
-            filtered_df = df.copy()
-            filtered_df["original_index"] = filtered_df.index
+            return cached(filter_key(), lambda: apply_filters(df))
 
-            if mode == "Viewing":
-                if st.session_state.search_query.strip().lower() in filtered_df["id"].astype(str).str.lower().tolist():
-                    filtered_df = filtered_df[filtered_df["id"].astype(str).str.lower() == st.session_state.search_query.strip().lower()]
-                else:
-                    # Search query filter
-                    if st.session_state.search_query:
-                        filtered_df = filtered_df[
-                            filtered_df.apply(
-                                lambda row: st.session_state.search_query.lower() in row.drop("original_index").to_string().lower(), axis=1
-                            )
-                        ]
-
-                    # Categories filter (AND/OR logic)
-                    if st.session_state.selected_categories:
-                        if and_or == "AND":
-                            # Item must be in all selected categories
-                            filtered_df = filtered_df[
-                                filtered_df["type"].apply(
-                                    lambda x: all(cat.lower() in map(str.strip, x.lower().split(",")) for cat in st.session_state.selected_categories)
-                                )
-                            ]
-                        elif and_or == "OR":
-                            # Item must be in any of the selected categories
-                            filtered_df = filtered_df[
-                                filtered_df["type"].apply(
-                                    lambda x: any(cat.lower() in map(str.strip, x.lower().split(",")) for cat in st.session_state.selected_categories)
-                                )
-                            ]
-
-            elif mode == "Using":
-                if st.session_state.search_query:
-                    # Filter by exact match on the "id" column, case-insensitive
-                    filtered_df = filtered_df[
-                        filtered_df["id"].astype(str).str.lower() == st.session_state.search_query.strip().lower()
-                    ]
-                else:
-                    filtered_df = filtered_df.iloc[0:0]  # Return empty DataFrame if no search query is provided.
-            return filtered_df
+        def apply_filters(df):
+            return filter_rows(store, df, st.session_state.search_query, st.session_state.selected_categories, and_or, mode)
 
         
         st.divider()
@@ -856,17 +1022,27 @@ def run_top_to_bottom():
             
             #actions
             if not st.session_state.selected and not len(filtered_data) == 0: #list of potential choices
-                st.subheader(f"Filtered Results: Showing of {min(result_limit, len(filtered_data))} of {len(filtered_data)}")
+                if st.session_state.results_for != (filter_key(), result_limit):
+                    st.session_state.results_for = (filter_key(), result_limit)
+                    st.session_state.results_page = 1
+                page, page_count, start, stop = results_view.page_bounds(
+                    len(filtered_data), st.session_state.results_page, result_limit
+                )
+                st.subheader(f"Filtered Results: Showing of {stop - start} of {len(filtered_data)}")
                 search_info_bar()
 
-                # Display rows up to the result limit
-                head_filter = filtered_data.head(result_limit)
-                for index, row in head_filter.iterrows():
-                    original_index = row["original_index"]
-                    #try:
-                    display_row(row, original_index)
-                    #except Exception as e:
-                        #st.error(f"Duplicate ID found at row {original_index+1}. Please modify in google sheets.")
+                # One page of rows in a single table; the labels are cached with the filter result
+                labels = cached(
+                    filter_key() + ("labels", start, stop),
+                    lambda: results_view.result_labels(filtered_data.iloc[start:stop], RESULT_COLUMNS)
+                )
+                results_view.pager("results_page", page, page_count, len(filtered_data), start, stop)
+                picked = results_view.results_table(labels, key=f"results_table_{st.session_state.results_table_id}")
+                if picked is not None:
+                    st.session_state.results_table_id += 1
+                    st.session_state.selected = True
+                    st.session_state.selected_index = picked
+                    st.rerun()
 
             elif st.session_state.selected: #select the choice
                 st.subheader(f"Selected Item: {st.session_state.data.iloc[st.session_state.selected_index]['id']}")
@@ -875,15 +1051,6 @@ def run_top_to_bottom():
             st.subheader("Inputting New Item:")
             st.info("Please input data with the data editor, then click cancel or save. It will add a new row to the spreadsheet.")
 
-            def get_new_id(node_type):
-                """Generate a unique ID based on the type."""
-                while True:
-                    random_id = ''.join(random.choices(string.ascii_uppercase, k=6))
-                    node_id = f"{node_type.upper()[:3]}-{random_id}"
-                    # Ensure ID is unique by checking against existing DataFrame
-                    if not any(st.session_state.data['id'] == node_id):
-                        return node_id
-                    
             def get_new_card_id():
                 """Generate a unique ID based on the type."""
                 while True:
@@ -893,55 +1060,17 @@ def run_top_to_bottom():
                     #if not any(st.session_state.card_data['id'] == node_id):
                     return node_id
                     
-            def get_location_ids(node_id, quantity):
-                outputs = []
-                for i in range(quantity):
-                    outputs.append(f"{node_id}-{i}")
-                return outputs
+            new_ids = set() #IDs generated in this batch that are not in the index yet
 
-                    
             def save_new_items(node_type, quantity, name, lsq):
                 """Save new items to the session DataFrame and update the barcode list."""
-                for _ in range(quantity):
-                    node_id = get_new_id(node_type)
-                    barcode = f"*{node_id}*"
-                    ls_ids = None
-                    if not lsq == 0:
-                        ls_ids = get_location_ids(node_id, lsq)
-                    
-                    # Generate a new row for the DataFrame
-                    new_row = pd.DataFrame([{
-                        "id": node_id,
-                        "name": name,
-                        "type": node_type,
-                        "parent": "",
-                        "child": "",
-                        "barcode": barcode,
-                        "location": ""
-                    }])
-                    st.session_state.data = pd.concat([st.session_state.data, new_row], ignore_index=True)
-                    st.session_state.barcode_print_list.append([1, node_id])
-                    st.session_state.changes[len(st.session_state.data) - 1] = new_row.iloc[0].copy()
-
-                    if not lsq == 0:
-                        for i, ls_id in enumerate(ls_ids):
-                            barcode = f"*{ls_id}*"
-                            new_row = pd.DataFrame([{
-                                "id": ls_id,
-                                "name": "",
-                                "type": "location",
-                                "parent": "", #no parent to avoid inclusion in tree structure. Should only be assigning locations
-                                "child": "",
-                                "barcode": barcode,
-                                "location": f"{i}"
-                            }])
-                            st.session_state.data = pd.concat([st.session_state.data, new_row], ignore_index=True)
-                            st.session_state.barcode_print_list.append([1, ls_id])
-                            st.session_state.changes[len(st.session_state.data) - 1] = new_row.iloc[0].copy()
-
-
+                st.session_state.data, changes = add_new_items(
+                    st.session_state.data, store.id_index, st.session_state.container_graph, labels_queue,
+                    node_type, quantity, name, lsq, new_ids
+                )
+                st.session_state.changes.update(changes)
                 st.session_state.new_item_entry = False  # Reset the new item session key
-                update_rows(service, SPREADSHEET_ID, SHEET_NAME, st.session_state.changes)
+                update_rows(SHEET_NAME, st.session_state.changes)
                 st.rerun()
 
 
@@ -962,7 +1091,7 @@ def run_top_to_bottom():
 
 
                 st.session_state.new_item_entry = False  # Reset the new item session key
-                update_rows(service, SPREADSHEET_ID, CARD_SHEET_NAME, st.session_state.card_changes)
+                update_rows(CARD_SHEET_NAME, st.session_state.card_changes)
                 st.rerun()
 
             def cancel_new_item():
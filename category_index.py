@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+
+def split_categories(value, casefold=False):
+    """Split a comma-separated categories cell into stripped, non-blank names."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return []
+    names = [name.strip() for name in str(value).split(",")]
+    return [name.lower() if casefold else name for name in names if name]
+
+
+class CategoryIndex:
+    """One boolean array per category of a comma-separated column ('categories' or 'type').
+
+    Array positions are row positions in the DataFrame, so AND/OR filters are bitwise
+    operations over whole arrays instead of splitting every cell on each rerun. With casefold,
+    categories are matched ignoring case, the way the Containers 'type' filter always has.
+    """
+
+    def __init__(self, df=None, column="categories", casefold=False):
+        self.column = column
+        self.casefold = casefold
+        self.bitmaps = {} #category -> np.ndarray of bool, one entry per row
+        self.row_categories = []
+        self.version = 0
+        if df is not None:
+            self.rebuild(df)
+
+    def rebuild(self, df):
+        values = df[self.column] if self.column in df.columns else pd.Series([""] * len(df))
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Split each distinct cell once rather than once per row
+            names = [split_categories(value, self.casefold) for value in values.cat.categories]
+            self.row_categories = [names[code] if code >= 0 else [] for code in values.cat.codes]
+        else:
+            self.row_categories = [split_categories(value, self.casefold) for value in values]
+        positions = {}
+        for position, names in enumerate(self.row_categories):
+            for name in names:
+                positions.setdefault(name, []).append(position)
+        self.bitmaps = {}
+        for name, rows in positions.items():
+            bitmap = np.zeros(len(self.row_categories), dtype=bool)
+            bitmap[rows] = True
+            self.bitmaps[name] = bitmap
+        self.version += 1
+
+    def update_rows(self, df, indexes):
+        """Re-read the categories of rows that were edited or appended."""
+        if self.column not in df.columns:
+            return
+        changed = False
+        if len(df) > len(self.row_categories):
+            grow = len(df) - len(self.row_categories)
+            self.row_categories.extend([] for _ in range(grow))
+            for name in self.bitmaps:
+                self.bitmaps[name] = np.concatenate([self.bitmaps[name], np.zeros(grow, dtype=bool)])
+            changed = True
+
+        for index in indexes:
+            if index not in df.index:
+                continue
+            position = df.index.get_loc(index)
+            names = split_categories(df.iloc[position][self.column], self.casefold)
+            if names == self.row_categories[position]:
+                continue
+            for name in self.row_categories[position]:
+                self.bitmaps[name][position] = False
+            for name in names:
+                if name not in self.bitmaps:
+                    self.bitmaps[name] = np.zeros(len(self.row_categories), dtype=bool)
+                self.bitmaps[name][position] = True
+            self.row_categories[position] = names
+            changed = True
+
+        if changed:
+            self.version += 1
+
+    def categories(self):
+        """Category names in the order they first appear, leaving out ones no row has anymore."""
+        return [name for name, bitmap in self.bitmaps.items() if bitmap.any()]
+
+    def mask(self, selected, and_or="AND"):
+        """Boolean array of rows in all (AND) or any (OR) of the selected categories."""
+        bitmaps = [self.bitmaps.get(name.lower() if self.casefold else name) for name in selected]
+        empty = np.zeros(len(self.row_categories), dtype=bool)
+        if and_or == "AND":
+            if any(bitmap is None for bitmap in bitmaps):
+                return empty
+            return np.logical_and.reduce(bitmaps) if bitmaps else ~empty
+        return np.logical_or.reduce([bitmap for bitmap in bitmaps if bitmap is not None] or [empty])
+
+    def matches(self, names, selected, and_or="AND"):
+        """Check one row's category names (from split_categories) the way mask() checks whole columns."""
+        selected = [name.lower() if self.casefold else name for name in selected]
+        if and_or == "AND":
+            return all(name in names for name in selected)
+        return any(name in names for name in selected)
+
+    def filter(self, positions, selected, and_or="AND"):
+        """Keep the row positions (e.g. search results) that pass mask(selected, and_or)."""
+        positions = np.asarray(positions, dtype=np.intp)
+        return positions[self.mask(selected, and_or)[positions]].tolist()
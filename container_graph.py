@@ -0,0 +1,199 @@
+import pandas as pd
+
+# Which types each container type can be placed in
+VALID_PARENTS = {
+    "machine": [], #1
+    "shelf": [], #1
+    "cart": [], #1
+    "plate": ["cart", "shelf", "machine"], #2
+    "storage box": ["shelf"], #idk
+    "bin": ["plate"], #3
+    "separator":["bin", "storage box"], #4
+    "location": [],
+    "card": ["bin", "separator"]
+}
+
+
+def split_ids(csv_ids):
+    """Split a CSV cell from the 'child' column into a list of IDs, ignoring blanks."""
+    if csv_ids is None or (not isinstance(csv_ids, str) and pd.isna(csv_ids)):
+        return []
+    return [node_id for node_id in str(csv_ids).split(",") if node_id.strip()]
+
+
+class ParentCycleError(Exception):
+    """Raised when following the 'parent' column leads back to an ID already on the path."""
+
+    def __init__(self, cycle):
+        self.cycle = cycle
+        super().__init__("parent cycle " + " -> ".join(cycle))
+
+
+class ContainerGraph:
+    """In-memory copy of the 'parent' and 'child' columns of the Containers sheet.
+
+    children maps an ID to the IDs listed in its 'child' cell (a dict used as an ordered set),
+    and holders is the reverse map, so detaching a child only touches the rows that list it.
+    Edits mark IDs dirty; write_back re-serializes just those rows into the DataFrame.
+
+    path() memoizes each ID's chain of ancestors. path_dependents maps an ID to the cached IDs
+    whose chain goes through it, so re-parenting a node only drops the paths of its subtree.
+    waiting_on maps a parent ID that isn't in the graph yet to the IDs whose cached chain stops
+    short of it, so adding that row later drops those paths too.
+    """
+
+    def __init__(self, df=None):
+        self.parents = {}
+        self.children = {}
+        self.holders = {}
+        self.dirty = set()
+        self.paths = {}
+        self.path_dependents = {}
+        self.waiting_on = {}
+        if df is not None:
+            self.rebuild(df)
+
+    def rebuild(self, df):
+        """Build the graph from the 'id', 'parent' and 'child' columns."""
+        self.parents = {}
+        self.children = {}
+        self.holders = {}
+        self.dirty = set()
+        self.paths = {}
+        self.path_dependents = {}
+        self.waiting_on = {}
+        if not {"id", "parent", "child"}.issubset(df.columns):
+            return
+        for node_id, parent_id, child_ids in zip(df["id"], df["parent"], df["child"]):
+            if pd.isna(node_id) or str(node_id) in self.parents:
+                continue
+            self.add_node(node_id, parent_id, split_ids(child_ids))
+
+    def add_node(self, node_id, parent_id="", child_ids=()):
+        """Register a row that was just appended to the sheet."""
+        node_id = str(node_id)
+        self.parents[node_id] = "" if parent_id is None or pd.isna(parent_id) else str(parent_id)
+        self.children[node_id] = {}
+        for waiting_id in self.waiting_on.pop(node_id, ()):
+            self._invalidate_paths(waiting_id) #their chains can now go on up through node_id
+        for child_id in child_ids:
+            self._link(node_id, child_id)
+
+    def load_row(self, node_id, parent_id, child_ids):
+        """Replace a node's links with values pulled from the sheet, without marking it dirty."""
+        node_id = str(node_id)
+        if node_id not in self.parents:
+            self.add_node(node_id, parent_id, child_ids)
+            return
+        was_dirty = node_id in self.dirty
+        self.set_parent(node_id, "" if parent_id is None or pd.isna(parent_id) else parent_id)
+        self.set_children(node_id, child_ids)
+        if not was_dirty:
+            self.dirty.discard(node_id)
+
+    def parent_of(self, node_id):
+        return self.parents.get(str(node_id), "")
+
+    def child_ids(self, node_id):
+        return list(self.children.get(str(node_id), {}))
+
+    def set_parent(self, node_id, parent_id):
+        node_id = str(node_id)
+        parent_id = str(parent_id)
+        if self.parents.get(node_id) != parent_id:
+            self.parents[node_id] = parent_id
+            self.dirty.add(node_id)
+            self._invalidate_paths(node_id)
+
+    def path(self, node_id):
+        """Return the IDs from the top-level container down to node_id, e.g. (shelf, plate, bin, separator).
+
+        Walks up the 'parent' column until it reaches a root, an unknown parent ID or an ancestor
+        whose path is already cached. Raises ParentCycleError instead of looping forever.
+        """
+        node_id = str(node_id)
+        if node_id in self.paths:
+            return self.paths[node_id]
+
+        walk = []
+        seen = set()
+        current = node_id
+        while True:
+            if current in seen:
+                raise ParentCycleError(walk[walk.index(current):] + [current])
+            seen.add(current)
+            walk.append(current)
+            parent_id = self.parents.get(current, "")
+            if not parent_id.strip() or parent_id not in self.parents:
+                if parent_id.strip():
+                    self.waiting_on.setdefault(parent_id, set()).add(current)
+                chain = ()
+                break
+            if parent_id in self.paths:
+                chain = self.paths[parent_id]
+                break
+            current = parent_id
+
+        for walked_id in reversed(walk):
+            chain = chain + (walked_id,)
+            self.paths[walked_id] = chain
+            for ancestor_id in chain:
+                self.path_dependents.setdefault(ancestor_id, set()).add(walked_id)
+        return chain
+
+    def detach(self, child_id):
+        """Remove child_id from the 'child' cell of every row that lists it."""
+        child_id = str(child_id)
+        for holder_id in self.holders.pop(child_id, set()):
+            del self.children[holder_id][child_id]
+            self.dirty.add(holder_id)
+
+    def add_children(self, holder_id, child_ids):
+        """Append child_ids to holder_id's 'child' cell, skipping ones already there."""
+        holder_id = str(holder_id)
+        self.children.setdefault(holder_id, {})
+        for child_id in child_ids:
+            if str(child_id) not in self.children[holder_id]:
+                self._link(holder_id, child_id)
+                self.dirty.add(holder_id)
+
+    def set_children(self, holder_id, child_ids):
+        """Replace holder_id's 'child' cell with child_ids."""
+        holder_id = str(holder_id)
+        child_ids = [str(child_id) for child_id in child_ids]
+        current = self.children.setdefault(holder_id, {})
+        if list(current) == child_ids:
+            return
+        for child_id in current:
+            self.holders[child_id].discard(holder_id)
+            if not self.holders[child_id]:
+                del self.holders[child_id]
+        self.children[holder_id] = {}
+        for child_id in child_ids:
+            self._link(holder_id, child_id)
+        self.dirty.add(holder_id)
+
+    def write_back(self, df, id_index):
+        """Write the parent/child cells of dirty IDs into df and return the row indexes that changed."""
+        changed = []
+        for node_id in self.dirty:
+            index = id_index.get(node_id)
+            if index is None:
+                continue
+            df.at[index, "parent"] = self.parents.get(node_id, "")
+            df.at[index, "child"] = ",".join(self.children.get(node_id, {}))
+            changed.append(index)
+        self.dirty = set()
+        return changed
+
+    def _invalidate_paths(self, node_id):
+        """Drop the cached paths of node_id and everything cached below it."""
+        for dependent_id in self.path_dependents.pop(node_id, set()):
+            for ancestor_id in self.paths.pop(dependent_id, ()):
+                if ancestor_id != node_id and ancestor_id in self.path_dependents:
+                    self.path_dependents[ancestor_id].discard(dependent_id)
+
+    def _link(self, holder_id, child_id):
+        child_id = str(child_id)
+        self.children[holder_id][child_id] = None
+        self.holders.setdefault(child_id, set()).add(holder_id)
@@ -0,0 +1,123 @@
+import re
+from storage_backend import column_letter
+
+
+class FakeSheetsService:
+    """Local stand-in for the Sheets v4 and Drive v3 clients built by googleapiclient.
+
+    Supports the calls this app makes (values().get, values().batchUpdate, values().append and
+    files().get for the version number), so syncing and writes can be exercised without a network.
+    sheets maps a sheet name to its rows, header row first. version goes up on every write.
+    """
+
+    def __init__(self, sheets=None):
+        self.sheets = {name: [list(row) for row in rows] for name, rows in (sheets or {}).items()}
+        self.version = 1
+        self.calls = []
+
+    def spreadsheets(self):
+        return _FakeSpreadsheets(self)
+
+    def files(self):
+        return _FakeFiles(self)
+
+    def edit(self, sheet_name, row, column, value):
+        """Change one cell as another user would. row and column are 0-based, row 0 is the header."""
+        rows = self.sheets.setdefault(sheet_name, [])
+        while len(rows) <= row:
+            rows.append([])
+        while len(rows[row]) <= column:
+            rows[row].append("")
+        rows[row][column] = value
+        self.version += 1
+
+    def write(self, sheet_name, start_row, values):
+        """Write a block of rows starting at a 1-based sheet row, like a range starting at column A."""
+        rows = self.sheets.setdefault(sheet_name, [])
+        for offset, values_row in enumerate(values):
+            position = start_row - 1 + offset
+            while len(rows) <= position:
+                rows.append([])
+            rows[position] = ["" if value is None else value for value in values_row]
+        self.version += 1
+
+
+class _FakeRequest:
+    def __init__(self, run):
+        self.run = run
+
+    def execute(self):
+        return self.run()
+
+
+class _FakeSpreadsheets:
+    def __init__(self, service):
+        self.service = service
+
+    def values(self):
+        return _FakeValues(self.service)
+
+
+class _FakeValues:
+    def __init__(self, service):
+        self.service = service
+
+    def get(self, spreadsheetId, range):
+        def run():
+            self.service.calls.append(("get", range))
+            rows = self.service.sheets.get(range.split("!")[0], [])
+            # The real API leaves out trailing empty cells and rows
+            values = [_strip_trailing(list(map(str, row))) for row in rows]
+            while values and not values[-1]:
+                values.pop()
+            return {"range": range, "values": values}
+        return _FakeRequest(run)
+
+    def batchUpdate(self, spreadsheetId, body):
+        def run():
+            self.service.calls.append(("batchUpdate", [data["range"] for data in body["data"]]))
+            for data in body["data"]:
+                sheet_name, start_row = _parse_range(data["range"])
+                self.service.write(sheet_name, start_row, data["values"])
+            return {"totalUpdatedRows": sum(len(data["values"]) for data in body["data"])}
+        return _FakeRequest(run)
+
+    def append(self, spreadsheetId, range, valueInputOption, body, insertDataOption=None):
+        def run():
+            self.service.calls.append(("append", range, len(body["values"])))
+            sheet_name = range.split("!")[0]
+            rows = self.service.sheets.setdefault(sheet_name, [])
+            while rows and not any(str(value) for value in rows[-1]):
+                rows.pop()
+            start = len(rows) + 1
+            self.service.write(sheet_name, start, body["values"])
+            end = start + len(body["values"]) - 1
+            width = max((len(row) for row in body["values"]), default=1) or 1
+            return {"updates": {
+                "updatedRange": f"{sheet_name}!A{start}:{column_letter(width)}{end}",
+                "updatedRows": len(body["values"]),
+            }}
+        return _FakeRequest(run)
+
+
+class _FakeFiles:
+    def __init__(self, service):
+        self.service = service
+
+    def get(self, fileId, fields=None):
+        def run():
+            self.service.calls.append(("files.get", fields))
+            return {"id": fileId, "version": str(self.service.version)}
+        return _FakeRequest(run)
+
+
+def _parse_range(sheet_range):
+    """Split 'Sheet!A12' or 'Sheet!A12:G20' into ('Sheet', 12)."""
+    sheet_name, cells = sheet_range.split("!")
+    return sheet_name, int(re.match(r"[A-Z]+(\d+)", cells).group(1))
+
+
+def _strip_trailing(row):
+    while row and row[-1] == "":
+        row.pop()
+    return row
@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+
+class FilterCache:
+    """Bounded LRU cache of filter_data results for one session.
+
+    Keys are the filter inputs (search query, categories, AND/OR, mode) and every entry belongs
+    to a data version; asking with a newer version drops everything cached for older data.
+    At most max_entries results are kept, and fewer if together they would hold more than
+    max_rows rows, so a few unfiltered copies of a large sheet can't pile up.
+    Cached DataFrames are shared between reruns, so callers must treat them as read-only.
+    """
+
+    def __init__(self, max_entries=16, max_rows=200000):
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.entries = OrderedDict()
+        self.version = None
+        self.rows = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version, key):
+        """Return the cached result for key at this data version, or None."""
+        if version != self.version or key not in self.entries:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return self.entries[key]
+
+    def put(self, version, key, result):
+        if version != self.version:
+            self.clear()
+            self.version = version
+        if key in self.entries:
+            self.rows -= len(self.entries.pop(key))
+        self.entries[key] = result
+        self.rows += len(result)
+        while len(self.entries) > 1 and (len(self.entries) > self.max_entries or self.rows > self.max_rows):
+            _, evicted = self.entries.popitem(last=False)
+            self.rows -= len(evicted)
+
+    def clear(self):
+        self.entries = OrderedDict()
+        self.rows = 0
@@ -0,0 +1,73 @@
+import pandas as pd
+
+
+def scan_key(value):
+    """Case-fold a scanned or typed value for find(), dropping the '*' start/stop characters of Code 39 barcodes."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    return str(value).strip().strip("*").strip().casefold()
+
+
+class IdIndex:
+    """Maps each ID in the 'id' column to its row index so lookups don't scan the whole sheet.
+
+    scan_keys also maps the case-folded ID and 'barcode' of every row to its index, so a
+    scan resolves to its row with find() instead of comparing against every ID.
+    """
+
+    def __init__(self, df=None):
+        self.rows = {}
+        self.scan_keys = {}
+        if df is not None:
+            self.rebuild(df)
+
+    def rebuild(self, df):
+        """Rebuild the index from scratch. The first row wins on duplicate IDs, same as df.index[df['id'] == x][0]."""
+        self.rows = {}
+        self.scan_keys = {}
+        if "id" not in df.columns:
+            return
+        for index, node_id in zip(df.index, df["id"]):
+            if pd.isna(node_id):
+                continue
+            self.rows.setdefault(str(node_id), index)
+            self.scan_keys.setdefault(scan_key(node_id), index)
+        if "barcode" in df.columns:
+            # IDs win over barcodes when the two collide
+            for index, barcode in zip(df.index, df["barcode"]):
+                if scan_key(barcode):
+                    self.scan_keys.setdefault(scan_key(barcode), index)
+        self.scan_keys.pop("", None)
+
+    def add(self, node_id, index, barcode=None):
+        """Register a newly appended row."""
+        self.rows.setdefault(str(node_id), index)
+        for key in (scan_key(node_id), scan_key(barcode)):
+            if key:
+                self.scan_keys.setdefault(key, index)
+
+    def find(self, query, df):
+        """
+        Return the row index whose ID or barcode equals query ignoring case, or None.
+        The row in df is checked too, so an entry left behind by an edited cell is never returned.
+        """
+        key = scan_key(query)
+        index = self.scan_keys.get(key) if key else None
+        if index is None or index not in df.index:
+            return None
+        row = df.loc[index]
+        if key == scan_key(row.get("id")) or key == scan_key(row.get("barcode")):
+            return index
+        return None
+
+    def get(self, node_id, default=None):
+        """Return the row index of node_id, or default if it isn't in the sheet."""
+        if node_id is None:
+            return default
+        return self.rows.get(str(node_id), default)
+
+    def __contains__(self, node_id):
+        return node_id is not None and str(node_id) in self.rows
+
+    def __len__(self):
+        return len(self.rows)
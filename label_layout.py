@@ -0,0 +1,99 @@
+"""
+Where labels go on a page, worked out once per print job instead of once per label.
+
+A LabelLayout is a grid of slots (top-left corners in points) for one page. Labels fill the slots
+in order and a page is only added when the next label needs one, so a job never ends on a blank
+page. TEMPLATES has the layouts the download buttons offer, including Avery sheets.
+"""
+import math
+
+POINTS_PER_INCH = 72
+
+
+class LabelLayout:
+    """
+    A page of label slots, in inches.
+
+    Args:
+        page_size: (width, height) of the page.
+        label_size: (width, height) of one label.
+        columns, rows: Labels across and down the page.
+        origin: (left, top) of the first label.
+        pitch: (horizontal, vertical) distance from one label's corner to the next.
+    """
+
+    def __init__(self, page_size, label_size, columns, rows, origin=(0, 0), pitch=None, name=""):
+        self.name = name
+        self.page_size = page_size
+        self.label_size = label_size
+        self.columns = columns
+        self.rows = rows
+        self.origin = origin
+        self.pitch = pitch or label_size
+        left, top = (value * POINTS_PER_INCH for value in origin)
+        step_x, step_y = (value * POINTS_PER_INCH for value in self.pitch)
+        # Filled left to right, then top to bottom
+        self.slots = [(left + column * step_x, top + row * step_y) for row in range(rows) for column in range(columns)]
+
+    @property
+    def per_page(self):
+        return len(self.slots)
+
+    def page_points(self):
+        return tuple(value * POINTS_PER_INCH for value in self.page_size)
+
+    def label_points(self):
+        return tuple(value * POINTS_PER_INCH for value in self.label_size)
+
+    def page_count(self, labels):
+        return math.ceil(labels / self.per_page) if labels else 0
+
+    def place(self, count):
+        """Yield (new_page, x, y) for count labels: new_page is True for the first label on each page."""
+        slots = self.slots
+        per_page = len(slots)
+        for n in range(count):
+            slot = n % per_page
+            yield slot == 0, slots[slot][0], slots[slot][1]
+
+
+def spread_layout(page_size, label_size, columns, rows, margins=(0, 0), name=""):
+    """
+    columns x rows labels with margins (left/right, top/bottom) around the grid and the space
+    left over shared evenly between labels, the way the sheet layout has always been worked out.
+    """
+    gap_x = (page_size[0] - columns * label_size[0] - 2 * margins[0]) / (columns - 1) if columns > 1 else 0
+    gap_y = (page_size[1] - rows * label_size[1] - 2 * margins[1]) / (rows - 1) if rows > 1 else 0
+    return LabelLayout(page_size, label_size, columns, rows, origin=margins,
+                       pitch=(label_size[0] + gap_x, label_size[1] + gap_y), name=name)
+
+
+def fill_layout(page_size, label_size, margins=(0.25, 0.4), min_gap=(0.125, 0.125), name=""):
+    """As many labels as fit inside margins with at least min_gap between them, spread like spread_layout."""
+    def fit(page, label, margin, gap):
+        return max(1, math.floor((page - 2 * margin + gap) / (label + gap)))
+
+    columns = fit(page_size[0], label_size[0], margins[0], min_gap[0])
+    rows = fit(page_size[1], label_size[1], margins[1], min_gap[1])
+    return spread_layout(page_size, label_size, columns, rows, margins, name=name)
+
+
+def single_layout(label_size, name=""):
+    """One label per page the size of the label, for thermal printers."""
+    return LabelLayout(label_size, label_size, 1, 1, name=name)
+
+
+LETTER = (8.5, 11)
+
+TEMPLATES = {
+    # 4 across and 5 down whatever the label size, as sheets have always been printed
+    "letter 2x2": spread_layout(LETTER, (2, 2), 4, 5, margins=(0.25, 0.4), name="letter 2x2"),
+    "letter 1x1": spread_layout(LETTER, (1, 1), 4, 5, margins=(0.25, 0.4), name="letter 1x1"),
+    "letter 1x1 dense": fill_layout(LETTER, (1, 1), name="letter 1x1 dense"),
+    "thermal 2x2": single_layout((2, 2), name="thermal 2x2"),
+    "thermal 1x1": single_layout((1, 1), name="thermal 1x1"),
+    # Avery sheets, from the template specifications (label size, first label corner and pitch)
+    "avery 22806": LabelLayout(LETTER, (2, 2), 3, 4, origin=(0.625, 0.625), pitch=(2.625, 2.5833), name="avery 22806"),
+    "avery 5160": LabelLayout(LETTER, (2.625, 1), 3, 10, origin=(0.1875, 0.5), pitch=(2.75, 1), name="avery 5160"),
+    "avery 5163": LabelLayout(LETTER, (4, 2), 2, 5, origin=(0.15625, 0.5), pitch=(4.1875, 2), name="avery 5163"),
+}
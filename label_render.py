@@ -0,0 +1,324 @@
+"""
+Label rendering that doesn't need Streamlit, so it can run in worker processes.
+
+render_label turns one unique label into the entry LabelPDF embeds, already compressed, and
+render_labels spreads a print job's labels over a process pool when there are enough of them
+to be worth it, returning the results in the order they were asked for.
+"""
+import functools
+import multiprocessing
+import os
+import threading
+import zlib
+from fpdf.fonts import fpdf_charwidths
+from PIL import Image, ImageDraw, ImageFont
+import qrcode
+
+# Font for the ID on raster labels: a file path, or a file name Pillow looks for in the system font folders
+LABEL_FONT_NAME = os.environ.get("INVENTORY_LABEL_FONT", "DejaVuSans.ttf")
+# Worker processes in the shared label pool; 0 uses every core and 1 renders on the calling thread
+LABEL_WORKERS = int(os.environ.get("INVENTORY_LABEL_WORKERS", "0"))
+# Fewer unique labels than this are rendered inline, as starting the pool would take longer
+PARALLEL_MIN_LABELS = 64
+
+
+def resolve_font_path(name):
+    """Full path of a font, looked up once instead of searching the font folders for every label."""
+    try:
+        return ImageFont.truetype(name, 12).path
+    except OSError:
+        return name #not found; rendering a label raises the error, as it did before
+
+
+LABEL_FONT = resolve_font_path(LABEL_FONT_NAME)
+
+
+@functools.lru_cache(maxsize=32)
+def label_font(path, size):
+    """Loaded font per (face, pixel size). Shared, so callers must not change it."""
+    return ImageFont.truetype(path, size)
+
+
+@functools.lru_cache(maxsize=4096)
+def text_box(text, path, size):
+    """Bounding box of text drawn at (0, 0) in label_font(path, size)."""
+    return label_font(path, size).getbbox(text)
+
+
+def label_dpi(format):
+    # High DPI for better quality
+    if format == "separator top":
+        return 400  # Increase the DPI for higher resolution
+    return 300
+
+
+@functools.lru_cache(maxsize=256)
+def qr_matrix_image(data):
+    """QR code for data at box size 10, before resizing. Shared by every label format of the same data."""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.make_image(fill='black', back_color='white').convert('RGB')
+
+
+def label_key(data, label_w, label_h, format="square"):
+    return (data, label_w, label_h, format, label_dpi(format))
+
+
+@functools.lru_cache(maxsize=256)
+def qr_modules(data):
+    """QR modules of data, quiet zone included, as rows of booleans (True is black). Same code as qr_matrix_image."""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_H,
+        box_size=10,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return tuple(tuple(row) for row in qr.get_matrix())
+
+
+def module_rects(modules):
+    """Merge black modules into rectangles (column, row, width, height).
+
+    Each run of black modules along a row is one rectangle, and it grows downwards for as
+    long as the next rows have the same run, so a QR code takes a few hundred rectangles.
+    """
+    rects = []
+    open_runs = {} #(start, end) of a run on the previous row -> its index in rects
+    for r, row in enumerate(modules):
+        runs = []
+        c = 0
+        while c < len(row):
+            if row[c]:
+                start = c
+                while c < len(row) and row[c]:
+                    c += 1
+                runs.append((start, c))
+            else:
+                c += 1
+        still_open = {}
+        for run in runs:
+            if run in open_runs:
+                i = open_runs[run]
+                col, top, width, height = rects[i]
+                rects[i] = (col, top, width, height + 1)
+            else:
+                i = len(rects)
+                rects.append((run[0], r, run[1] - run[0], 1))
+            still_open[run] = i
+        open_runs = still_open
+    return rects
+
+
+# Pillow places text by the top of the font's ascender; these are fractions of the font size
+TEXT_ASCENDER = 0.928 #DejaVu Sans, so the vector baseline lands where the raster text did
+TEXT_CAP_HEIGHT = 0.73
+
+
+def can_draw_vector(data, format):
+    """Vector labels use the PDF core font Helvetica, which only has Latin-1 characters."""
+    if format not in ("square", "separator top"):
+        return False
+    try:
+        str(data).encode("latin-1")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+def helvetica_width(text, size):
+    """Width in points of text in Helvetica, as FPDF.get_string_width measures it."""
+    widths = fpdf_charwidths["helvetica"]
+    return sum(widths.get(char, 0) for char in text) * size / 1000
+
+
+def escape_text(text):
+    """Backslash the characters that would end or break a PDF string literal."""
+    return text.replace("\\", "\\\\").replace(")", "\\)").replace("(", "\\(").replace("\r", "\\r")
+
+
+def vector_label_stream(data, label_w, label_h, format="square"):
+    """
+    PDF drawing operators for one label laid out like generate_qr_code, in points from the
+    bottom left of the label. Returns (width, height, operators). The text is set in the font
+    named /F1, which LabelPDF maps to Helvetica in each form's resources.
+    """
+    modules = qr_modules(data)
+    if format == "separator top":
+        width, height = 72, 72 #the raster separator label is always 1x1 inch
+        qr_size = 0.4 * 72
+        qr_x = width - 1.05 * qr_size
+        font_size = 12 * (label_h / 2)
+        text_top = (qr_size - TEXT_CAP_HEIGHT * font_size) / 2
+    else:
+        width, height = label_w * 72, label_h * 72
+        qr_size = 0.8 * min(label_w, label_h) * 72
+        qr_x = (width - qr_size) / 2
+        font_size = 14 * (label_h / 2)
+        text_top = qr_size + 2 * 72 / label_dpi(format) #2 pixels below the QR code, as in the raster label
+
+    module = qr_size / len(modules)
+    ops = ["0 g"]
+    for col, row, w, h in module_rects(modules):
+        ops.append(f"{qr_x + col * module:.3f} {height - (row + h) * module:.3f} {w * module:.3f} {h * module:.3f} re")
+    ops.append("f")
+
+    text = str(data)
+    text_x = 0.05 * 72 if format == "separator top" else (width - helvetica_width(text, font_size)) / 2
+    baseline = height - (text_top + TEXT_ASCENDER * font_size)
+    ops.append(f"BT /F1 {font_size:.2f} Tf {text_x:.3f} {baseline:.3f} Td ({escape_text(text)}) Tj ET")
+    return width, height, "\n".join(ops)
+
+
+def generate_qr_code(data, label_w, label_h, format = "square"):
+    dpi = label_dpi(format)
+
+    # Create QR code (resize below returns a new image, so the shared one isn't changed)
+    img = qr_matrix_image(data)
+
+    # Create a new image with white background to accommodate the QR code and text
+
+    if format == "square":
+        # Resize QR code to 0.7" x 0.7" at high DPI (e.g., 300 DPI)
+        qr_w = 0.8*min(label_w, label_h)
+        qr_h = 0.8*min(label_w, label_h)
+        img = img.resize((int(qr_w * dpi), int(qr_h * dpi)), Image.LANCZOS)
+
+        img_with_number = Image.new('RGB', (int(label_w * dpi), int(label_h * dpi)), 'white')
+        img_with_number.paste(img, (int((label_w * dpi - img.width) / 2), 0))
+
+        # Draw text below the QR code
+        draw = ImageDraw.Draw(img_with_number)
+        font_size = int(14*(label_h/2) * dpi / 72)  # Scale font size based on DPI
+        font = label_font(LABEL_FONT, font_size)
+        text = data
+
+        # Same box as draw.textbbox((0, 0), ...), measured once per text and size
+        text_bbox = text_box(text, LABEL_FONT, font_size)
+        text_width = text_bbox[2] - text_bbox[0]
+        text_height = text_bbox[3] - text_bbox[1]
+
+        # Draw the text in the center below the QR code
+        draw.text(
+            ((img_with_number.width - text_width) / 2, img.height + 2),
+            text,
+            fill='black',
+            font=font
+        )
+    elif format == "separator top":
+        img = img.resize((int(0.4 * dpi), int(0.4 * dpi)), Image.LANCZOS)
+
+        img_with_number = Image.new('RGB', (int(1 * dpi), int(1 * dpi)), 'white')
+        img_with_number.paste(img, (int(1*dpi-(1.05*img.width)),0))
+
+        # Draw text below the QR code
+        draw = ImageDraw.Draw(img_with_number)
+        font_size = int(12*(label_h/2) * dpi / 72)  # Scale font size based on DPI
+        font = label_font(LABEL_FONT, font_size)
+        text = data
+
+        # Same box as draw.textbbox((0, 0), ...), measured once per text and size
+        text_bbox = text_box(text, LABEL_FONT, font_size)
+        text_width = text_bbox[2] - text_bbox[0]
+        text_height = text_bbox[3] - text_bbox[1]
+
+        # Draw the text in the center below the QR code
+        draw.text(
+            (0.05*dpi, (img.height - text_height)/2),
+            text,
+            fill='black',
+            font=font
+        )
+
+
+    return img_with_number
+
+
+def render_label(job):
+    """
+    Render one label for LabelPDF.place_rendered.
+
+    Args:
+        job: (data, label width, label height, format, vector) with sizes in inches.
+
+    Returns:
+        {"form": (width, height), "data": ...} for a vector label when vector is set and the label
+        can be drawn that way, otherwise a gray image {"w", "h", "cs", "bpc", "f", "data"}.
+        data is zlib-compressed either way.
+    """
+    data, label_w, label_h, format, vector = job
+    if vector and can_draw_vector(data, format):
+        width, height, stream = vector_label_stream(data, label_w, label_h, format)
+        return {"form": (width, height), "data": zlib.compress(stream.encode("latin-1"))}
+    # Labels are black and white, so one gray channel holds all of it
+    gray = generate_qr_code(data, label_w, label_h, format=format).convert("L")
+    return {
+        "w": gray.width,
+        "h": gray.height,
+        "cs": "DeviceGray",
+        "bpc": 8,
+        "f": "FlateDecode",
+        "data": zlib.compress(gray.tobytes()),
+    }
+
+
+def worker_count(workers=None):
+    """Number of processes to render with: workers, or LABEL_WORKERS if None, with 0 meaning every core."""
+    workers = LABEL_WORKERS if workers is None else workers
+    return max(1, workers or os.cpu_count() or 1)
+
+
+POOL_WORKERS = worker_count() #size of the shared pool, fixed for the life of the server
+
+
+def start_pool(workers):
+    """
+    Start a process pool of workers label renderers. Spawned rather than forked, as forking copies
+    the Streamlit server's threads and locks mid-use. Spawned children re-import the main module,
+    which under `streamlit run` is Streamlit's own entry point rather than the app script.
+    """
+    return multiprocessing.get_context("spawn").Pool(workers)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def label_pool():
+    """The POOL_WORKERS process pool shared by every session, started on first use and kept running."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = start_pool(POOL_WORKERS)
+        return _pool
+
+
+def render_labels(jobs, parallel=None, pool=None, pool_workers=POOL_WORKERS):
+    """
+    render_label for each job, returned in the same order. When parallel is set and there are at
+    least PARALLEL_MIN_LABELS jobs, they are spread over pool (the shared label_pool by default),
+    and otherwise or if the pool fails they are rendered inline. A failed pool is left running, as
+    other sessions may have jobs in it.
+
+    Args:
+        parallel: Whether to use the pool. None uses it when the shared pool has more than one worker.
+        pool_workers: Number of processes in pool, to split the jobs into chunks.
+    """
+    jobs = list(jobs)
+    if parallel is None:
+        parallel = POOL_WORKERS > 1
+    if parallel and len(jobs) >= PARALLEL_MIN_LABELS:
+        # A few chunks per worker keeps them all busy without a round trip per label
+        chunksize = max(1, len(jobs) // (pool_workers * 4))
+        try:
+            return (pool or label_pool()).map(render_label, jobs, chunksize=chunksize)
+        except (OSError, multiprocessing.ProcessError):
+            pass
+    return [render_label(job) for job in jobs]
@@ -0,0 +1,117 @@
+"""
+A PDF writer that sends each page to a file as soon as it's finished.
+
+FPDF keeps the whole document in memory until output(), so a print job's peak memory grows with
+its label count. PDFStreamWriter writes every object the moment it's complete and only keeps the
+byte offsets and object numbers needed for the cross-reference table at the end, in arrays of
+8-byte ints. Labels are the entries label_render.render_label returns: each is written once as
+an XObject and later pages refer to it by name.
+"""
+import zlib
+from array import array
+
+
+class PDFStreamWriter:
+    """
+    Write a PDF of equally sized pages to sink, a binary file opened for writing.
+
+    Args:
+        sink: Anything with write(bytes); it doesn't have to be seekable.
+        page_size: (width, height) of every page in points.
+    """
+
+    PAGES = 1 #object numbers fixed up front, so pages can point at them before they're written
+    FONT = 2
+
+    def __init__(self, sink, page_size):
+        self.sink = sink
+        self.page_width, self.page_height = page_size
+        self.position = 0
+        self.offsets = array("q", [0, 0, 0]) #byte offset of each object by number, for the xref table
+        self.pages = array("q") #object numbers of the pages written so far
+        self.xobjects = {} #label key -> object number; the XObject is named /L<number>
+        self.closed = False
+        self.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        # Vector labels set their text in /F1, which every form maps to this core font
+        self.put_object(self.FONT, b"<</Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding>>")
+
+    def write(self, data):
+        self.sink.write(data)
+        self.position += len(data)
+
+    def new_number(self):
+        self.offsets.append(0)
+        return len(self.offsets) - 1
+
+    def put_object(self, number, body, stream=None):
+        self.offsets[number] = self.position
+        self.write(b"%d 0 obj\n" % number + body)
+        if stream is not None:
+            self.write(b"\nstream\n" + stream + b"\nendstream")
+        self.write(b"\nendobj\n")
+
+    def has_label(self, key):
+        return key in self.xobjects
+
+    def add_label(self, key, entry):
+        """Write a rendered label as an XObject now. Its data isn't kept, so the caller can let it go."""
+        if key in self.xobjects:
+            return
+        number = self.new_number()
+        data = entry["data"]
+        if "form" in entry:
+            # Drawn at the unit square like an image, so /Matrix scales the form's points down to it
+            width, height = entry["form"]
+            header = (f"<</Type /XObject /Subtype /Form /BBox [0 0 {width:.3f} {height:.3f}] "
+                      f"/Matrix [{1 / width:.6f} 0 0 {1 / height:.6f} 0 0] "
+                      f"/Resources <</Font <</F1 {self.FONT} 0 R>> >> /Filter /FlateDecode /Length {len(data)}>>")
+        else:
+            header = (f"<</Type /XObject /Subtype /Image /Width {entry['w']} /Height {entry['h']} "
+                      f"/ColorSpace /{entry['cs']} /BitsPerComponent {entry['bpc']} /Filter /{entry['f']} /Length {len(data)}>>")
+        self.put_object(number, header.encode("latin-1"), data)
+        self.xobjects[key] = number
+
+    def add_page(self, placements):
+        """
+        Write one page and its content stream.
+
+        Args:
+            placements: (label key, x, y, width, height) for each label on the page, in points from
+                the top left like FPDF. Every key must have been added with add_label.
+        """
+        ops = []
+        used = {}
+        for key, x, y, w, h in placements:
+            number = self.xobjects[key]
+            used[number] = True
+            ops.append(f"q {w:.2f} 0 0 {h:.2f} {x:.2f} {self.page_height - y - h:.2f} cm /L{number} Do Q")
+        content = zlib.compress("\n".join(ops).encode("latin-1"))
+        content_number = self.new_number()
+        self.put_object(content_number, b"<</Filter /FlateDecode /Length %d>>" % len(content), content)
+
+        xobjects = " ".join(f"/L{number} {number} 0 R" for number in used)
+        page_number = self.new_number()
+        self.put_object(page_number, (
+            f"<</Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {self.page_width:.2f} {self.page_height:.2f}] "
+            f"/Resources <</ProcSet [/PDF /Text /ImageB] /XObject <<{xobjects}>> >> /Contents {content_number} 0 R>>"
+        ).encode("latin-1"))
+        self.pages.append(page_number)
+
+    def close(self):
+        """Write the page tree, catalog and cross-reference table. Returns the number of bytes written."""
+        if self.closed:
+            return self.position
+        if not self.pages:
+            self.add_page([]) #a PDF needs at least one page, as FPDF does
+        kids = " ".join(f"{number} 0 R" for number in self.pages)
+        self.put_object(self.PAGES, f"<</Type /Pages /Kids [{kids}] /Count {len(self.pages)}>>".encode("latin-1"))
+        catalog = self.new_number()
+        self.put_object(catalog, b"<</Type /Catalog /Pages %d 0 R>>" % self.PAGES)
+
+        xref = self.position
+        self.write(b"xref\n0 %d\n0000000000 65535 f \n" % len(self.offsets))
+        for start in range(1, len(self.offsets), 1024):
+            self.write(b"".join(b"%010d 00000 n \n" % offset for offset in self.offsets[start:start + 1024]))
+        self.write(b"trailer\n<</Size %d /Root %d 0 R>>\nstartxref\n%d\n%%%%EOF\n" % (len(self.offsets), catalog, xref))
+        self.closed = True
+        return self.position
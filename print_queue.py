@@ -0,0 +1,77 @@
+import os
+import sqlite3
+import threading
+import time
+
+# Where queued labels are kept; override with INVENTORY_PRINT_QUEUE_PATH or [print_queue] path in secrets
+PRINT_QUEUE_PATH = os.environ.get(
+    "INVENTORY_PRINT_QUEUE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "print_queue.sqlite"),
+)
+
+
+class PrintQueue:
+    """Labels waiting to be printed, kept in SQLite so they survive restarts and can be shared.
+
+    Each label text is one row with a copy count, so queuing the same label again adds copies
+    instead of another entry. Every station pointing at the same file and queue name shares the
+    queue. items() returns the [copies, text] pairs download_qr_code_pdf takes, oldest first.
+    """
+
+    def __init__(self, path=PRINT_QUEUE_PATH, name="default"):
+        self.path = path
+        self.name = name
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self.connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS print_queue ("
+                "queue TEXT, text TEXT, copies INTEGER, queued_at REAL, PRIMARY KEY (queue, text))"
+            )
+
+    def connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def add(self, text, copies=1):
+        self.add_many([[copies, text]])
+
+    def add_many(self, items):
+        """Queue [copies, text] pairs, merging each with any copies of the same text already queued."""
+        rows = [(self.name, str(text), int(copies), time.time()) for copies, text in items if int(copies) > 0]
+        if not rows:
+            return
+        with self.lock, self.connect() as conn:
+            conn.executemany(
+                "INSERT INTO print_queue VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (queue, text) DO UPDATE SET copies = copies + excluded.copies",
+                rows,
+            )
+
+    def items(self):
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT copies, text FROM print_queue WHERE queue = ? ORDER BY queued_at, rowid", (self.name,)
+            ).fetchall()
+        return [[copies, text] for copies, text in rows]
+
+    def remove(self, items):
+        """
+        Take printed [copies, text] pairs off the queue. Copies queued since items() was read,
+        e.g. by another station while the PDF was being made, stay queued.
+        """
+        rows = [(int(copies), self.name, str(text)) for copies, text in items]
+        with self.lock, self.connect() as conn:
+            conn.executemany("UPDATE print_queue SET copies = copies - ? WHERE queue = ? AND text = ?", rows)
+            conn.execute("DELETE FROM print_queue WHERE queue = ? AND copies <= 0", (self.name,))
+
+    def clear(self):
+        with self.lock, self.connect() as conn:
+            conn.execute("DELETE FROM print_queue WHERE queue = ?", (self.name,))
+
+    def summary(self):
+        """(labels, copies) queued."""
+        with self.connect() as conn:
+            labels, copies = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(copies), 0) FROM print_queue WHERE queue = ?", (self.name,)
+            ).fetchone()
+        return labels, copies
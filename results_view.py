@@ -0,0 +1,61 @@
+import math
+import pandas as pd
+import streamlit as st
+
+
+def page_bounds(total, page, page_size):
+    """Clamp a 1-based page number and return (page, page_count, start, stop) for iloc[start:stop]."""
+    page_size = max(1, int(page_size))
+    page_count = max(1, math.ceil(total / page_size))
+    page = min(max(1, int(page)), page_count)
+    start = (page - 1) * page_size
+    return page, page_count, start, min(start + page_size, total)
+
+
+def result_labels(rows, columns):
+    """
+    Build the strings shown in the results table for some filtered rows, keeping their row index.
+
+    Args:
+        rows: Slice of filter_data's result, one page long.
+        columns: (heading, column) pairs to show, e.g. [("ID", "id"), ("NAME", "name")].
+    """
+    labels = {}
+    for heading, column in columns:
+        values = rows[column] if column in rows.columns else pd.Series("", index=rows.index)
+        labels[heading] = values.astype(object).where(values.notna(), "").astype(str)
+    return pd.DataFrame(labels, index=rows.index)
+
+
+def pager(page_key, page, page_count, total, start, stop):
+    """Previous/Next buttons that move st.session_state[page_key], with the rows shown so far."""
+    def move(step):
+        st.session_state[page_key] = min(max(1, page + step), page_count)
+
+    col1, col2, col3 = st.columns([1, 1, 6])
+    with col1:
+        st.button("Previous", key=f"{page_key}_previous", disabled=page <= 1, on_click=move, args=(-1,))
+    with col2:
+        st.button("Next", key=f"{page_key}_next", disabled=page >= page_count, on_click=move, args=(1,))
+    with col3:
+        st.caption(f"Page {page} of {page_count}: rows {start + 1}-{stop} of {total}")
+
+
+def results_table(labels, key):
+    """
+    Show labels in one scrolling table with single-row selection and return the row index that was
+    picked, or None. Streamlit only sends the rows in view to the browser, so this costs the same
+    for 10 or 10,000 rows.
+    """
+    event = st.dataframe(
+        labels,
+        key=key,
+        on_select="rerun",
+        selection_mode="single-row",
+        hide_index=True,
+        width="stretch",
+    )
+    picked = event.selection.rows if event is not None else []
+    if not picked:
+        return None
+    return labels.index[picked[0]]
@@ -0,0 +1,127 @@
+import re
+import pandas as pd
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+CELL_SEPARATOR = "\n" #can't be typed into the search box, so a match never spans two cells
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def column_text(values):
+    """Lower-cased text of each cell in a column, with blank cells (None/NaN/pd.NA) as ""."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        # Lower-case each distinct value once and look rows up by category code
+        texts = [str(value).lower() for value in values.cat.categories] + [""]
+        return [texts[code] for code in values.cat.codes]
+    return values.astype(object).where(values.notna(), "").astype(str).str.lower()
+
+
+class SearchIndex:
+    """Case-insensitive substring search over every cell of a DataFrame.
+
+    Each row's cells are kept as one lower-cased string, and postings maps every word
+    (run of letters/digits) to the rows it appears in. A search takes the longest word of the
+    query, finds the words in the vocabulary that contain it through a trigram index over the
+    vocabulary, and only checks the rows those words point to. Queries with no letters or
+    digits fall back to checking every row.
+
+    version goes up whenever the indexed data changes, so results can be cached against it.
+    """
+
+    def __init__(self, df=None):
+        self.texts = []
+        self.row_tokens = []
+        self.postings = {} #word -> set of row indexes
+        self.vocabulary = {} #trigram -> set of words
+        self.version = 0
+        if df is not None:
+            self.rebuild(df)
+
+    def rebuild(self, df):
+        self.texts = []
+        self.row_tokens = []
+        self.postings = {}
+        self.vocabulary = {}
+        columns = [column_text(df.iloc[:, i]) for i in range(len(df.columns))]
+        for index, cells in enumerate(zip(*columns)):
+            self._set_row(index, CELL_SEPARATOR.join(cells))
+        self.version += 1
+
+    def update_rows(self, df, indexes):
+        """Re-index rows of df that were edited or appended. Rows whose text didn't change are skipped."""
+        changed = False
+        for index in sorted(int(index) for index in indexes):
+            if index not in df.index:
+                continue
+            text = self.row_text(df.loc[index])
+            if index < len(self.texts) and self.texts[index] == text:
+                continue
+            while len(self.texts) < index:
+                self._set_row(len(self.texts), "")
+            self._set_row(index, text)
+            changed = True
+        if changed:
+            self.version += 1
+
+    @staticmethod
+    def row_text(row):
+        return CELL_SEPARATOR.join(
+            "" if not isinstance(value, str) and pd.isna(value) else str(value).lower() for value in row
+        )
+
+    def search(self, query):
+        """Return the sorted row indexes with a cell containing query, ignoring case."""
+        query = str(query).lower()
+        if not query:
+            return list(range(len(self.texts)))
+
+        words = TOKEN_PATTERN.findall(query)
+        if words:
+            # Any cell containing the query contains its longest word inside one of its own words
+            candidates = set()
+            for word in self._words_containing(max(words, key=len)):
+                candidates |= self.postings[word]
+        else:
+            candidates = range(len(self.texts))
+        return sorted(index for index in candidates if query in self.texts[index])
+
+    def _words_containing(self, part):
+        if len(part) < 3:
+            return [word for word in self.postings if part in word]
+        grams = sorted((self.vocabulary.get(gram, set()) for gram in trigrams(part)), key=len)
+        words = set(grams[0]).intersection(*grams[1:])
+        return [word for word in words if part in word]
+
+    def _set_row(self, index, text):
+        tokens = set(TOKEN_PATTERN.findall(text))
+        if index < len(self.texts):
+            old_tokens = self.row_tokens[index]
+            for word in old_tokens - tokens:
+                self._unlink(word, index)
+            new_tokens = tokens - old_tokens
+            self.texts[index] = text
+            self.row_tokens[index] = tokens
+        else:
+            new_tokens = tokens
+            self.texts.append(text)
+            self.row_tokens.append(tokens)
+
+        for word in new_tokens:
+            rows = self.postings.get(word)
+            if rows is None:
+                rows = self.postings[word] = set()
+                for gram in trigrams(word):
+                    self.vocabulary.setdefault(gram, set()).add(word)
+            rows.add(index)
+
+    def _unlink(self, word, index):
+        rows = self.postings[word]
+        rows.discard(index)
+        if not rows:
+            del self.postings[word]
+            for gram in trigrams(word):
+                self.vocabulary[gram].discard(word)
+                if not self.vocabulary[gram]:
+                    del self.vocabulary[gram]
@@ -0,0 +1,312 @@
+import threading
+import time
+import pandas as pd
+import category_index
+import inventory_index
+import search_index
+import sheet_sync
+import snapshot_cache
+import storage_backend
+import table_schema
+import write_queue
+
+MAX_LOG = 256 #committed versions remembered for changed_since before a session has to re-read everything
+
+
+class SharedTable:
+    """One sheet loaded once per server process and shared by every browser session.
+
+    Sessions take their own copy of df with view(), so their edits never write through to it. The
+    copy is cheap: Arrow string columns are immutable and share their buffers, and object columns
+    only copy their pointers to the same strings. commit() applies rows a session wrote,
+    patches the shared ID, search and category indexes and bumps version, so the next rerun of
+    every session sees them without a refetch. changed_since() lists the rows to re-read when
+    a session rebases onto a newer version. Everything that changes state holds self.lock.
+    """
+
+    def __init__(self, backend, sheet_name, category_column, casefold_categories=False):
+        self.backend = backend
+        self.sheet_name = sheet_name
+        self.lock = threading.RLock()
+        self.sync = sheet_sync.SheetSync(backend, sheet_name)
+        self.df = pd.DataFrame()
+        self.id_index = inventory_index.IdIndex()
+        self.search_index = search_index.SearchIndex()
+        self.category_index = category_index.CategoryIndex(column=category_column, casefold=casefold_categories)
+        self.version = 0
+        self.log = [] #(version, set of changed rows, or None if the whole table was replaced)
+        self.moves = [] #(version, start, count): rows from start on moved down by count at that version
+        self.load_time = None
+        self.memory = None #table_schema.memory_report of the last full load
+        self.load()
+
+    def load(self):
+        """
+        Load the sheet and build the indexes. If a local snapshot exists it is used right away
+        and the sheet is checked for changes in the background; otherwise the sheet is downloaded
+        and saved as the new snapshot. Columns are converted to the sheet's table_schema dtypes.
+        """
+        started = time.perf_counter()
+        with self.lock:
+            remote = self.backend.is_remote
+            snapshot, revision = snapshot_cache.load_snapshot(self.sheet_name) if remote else (None, None)
+            if snapshot is not None:
+                self.sync.adopt(snapshot, revision)
+                self.sync.start_background_fetch()
+                self._set_table(snapshot)
+                source = "local snapshot"
+            elif remote:
+                self._set_table(self.sync.load())
+                snapshot_cache.save_snapshot_in_background(self.sheet_name, self.df, self.sync.revision)
+                source = "Google Sheets"
+            else:
+                self._set_table(self.sync.load())
+                source = "local database"
+            self._reindex(None)
+            self.load_time = (source, len(self.df), time.perf_counter() - started)
+
+    def _set_table(self, df):
+        """Replace df with a typed copy of a table of strings and record how much memory that saved."""
+        self.df = table_schema.apply_schema(df, self.sheet_name)
+        self.memory = table_schema.memory_report(df, self.df)
+
+    def view(self):
+        """Return (copy of df, version) for a session to read and edit."""
+        with self.lock:
+            return self.df.copy(), self.version
+
+    def changed_since(self, version):
+        """Rows changed after version, or None if the table was replaced or the log doesn't reach back that far."""
+        with self.lock:
+            if version == self.version:
+                return set()
+            if not self.log or self.log[0][0] > version + 1:
+                return None
+            rows = set()
+            for logged_version, logged_rows in self.log:
+                if logged_version > version:
+                    if logged_rows is None:
+                        return None
+                    rows |= logged_rows
+            return rows
+
+    def commit(self, rows_dict, base_rows, base_version=None):
+        """
+        Apply rows a session just wrote.
+
+        Args:
+            rows_dict: Dictionary where keys are row indices and values are rows (pd.Series or lists).
+            base_rows: Length of the table when the session last rebased. Rows at or past it are new
+                and get appended after anything other sessions added in the meantime.
+            base_version: Version the session last rebased onto, so rows insert_remote_rows moved
+                since then are written where they are now.
+
+        Returns:
+            (committed, moved): the rows keyed by their position in the shared table, and
+            {session index: shared index} for rows that aren't where the session had them. The
+            session should rebase onto the table before it writes again.
+        """
+        with self.lock:
+            width = len(self.df.columns)
+            committed = {}
+            moved = {}
+            appended = []
+            for index in sorted(rows_dict):
+                row = rows_dict[index]
+                values = table_schema.normalize_row(row.tolist() if hasattr(row, "tolist") else list(row), width)
+                position = int(index) if base_version is None else self.rebase_index(int(index), base_version)
+                if index < base_rows and position < len(self.df):
+                    committed[position] = values
+                    if position != index:
+                        moved[int(index)] = position
+                else:
+                    appended.append((int(index), values))
+            table_schema.set_rows(self.df, committed)
+            if appended:
+                start = len(self.df)
+                self.df = table_schema.append_rows(self.df, [values for _, values in appended])
+                for offset, (index, values) in enumerate(appended):
+                    committed[start + offset] = values
+                    if start + offset != index:
+                        moved[index] = start + offset
+            if committed:
+                self._reindex(committed)
+            return committed, moved
+
+    def insert_remote_rows(self, start, count):
+        """
+        Merge in count rows another station appended at start before our own append landed, moving
+        our rows from start on down by count so they sit where the storage backend put them.
+        """
+        with self.lock:
+            values = self.sync.fetch_values()
+            width = len(self.df.columns)
+            rows = [table_schema.normalize_row(row, width) for row in values[1 + start:1 + start + count]]
+            rows += [[""] * width for _ in range(count - len(rows))]
+            df = table_schema.append_rows(self.df.iloc[:start], rows)
+            self.df = table_schema.append_rows(df, self.df.iloc[start:])
+            self.sync.insert_rows(start, rows)
+            self._reindex(None)
+            self.moves.append((self.version, start, count))
+            del self.moves[:-MAX_LOG]
+
+    def rebase_index(self, index, version):
+        """Where the row a session saw at index in version is now, after insert_remote_rows moved rows down."""
+        with self.lock:
+            for moved_version, start, count in self.moves:
+                if moved_version > version and index >= start:
+                    index += count
+            return index
+
+    def reload(self, protected=()):
+        """Re-read the whole table, keeping the local values of protected rows (unpushed edits)."""
+        with self.lock:
+            old = self.df
+            self._set_table(self.sync.load())
+            table_schema.set_rows(self.df, {
+                index: old.loc[index].reindex(self.df.columns)
+                for index in protected if index < len(self.df) and index in old.index
+            })
+            self._reindex(None)
+
+    def refresh(self, protected=(), fetched=None):
+        """Merge rows that changed in the sheet (see SheetSync.refresh). Returns the changed rows, or None after a reload."""
+        with self.lock:
+            df, changed = self.sync.refresh(self.df, protected=protected, fetched=fetched)
+            if changed == []:
+                return changed
+            if changed is None:
+                self._set_table(df) #reloaded as plain strings
+            else:
+                self.df = df
+            self._reindex(changed)
+            if not protected and self.backend.is_remote:
+                # Only snapshot what matches the sheet, not rows still waiting to be written
+                snapshot_cache.save_snapshot_in_background(self.sheet_name, df, self.sync.revision)
+            return changed
+
+    def check_in_background(self):
+        """Start checking the sheet for changes made elsewhere, unless a check is already running."""
+        with self.lock:
+            if self.backend.is_remote and not self.sync.background_pending():
+                self.sync.start_background_fetch()
+
+    def poll(self, protected=()):
+        """Apply the background check started by load() or check_in_background() once it has finished."""
+        with self.lock:
+            fetched = self.sync.take_background_result()
+            if fetched is not None:
+                self.refresh(protected, fetched)
+
+    def find(self, query, df, pending=None):
+        """Row index whose ID or barcode equals query ignoring case (see IdIndex.find), checking pending rows first."""
+        key = inventory_index.scan_key(query)
+        for index, row in (pending or {}).items():
+            if key and key in (inventory_index.scan_key(row.get("id")), inventory_index.scan_key(row.get("barcode"))):
+                return index
+        with self.lock:
+            return self.id_index.find(query, df)
+
+    def search(self, query, pending=None):
+        """Row positions with a cell containing query. pending maps row index -> a session's unsaved row, which is checked instead."""
+        with self.lock:
+            rows = self.search_index.search(query)
+        if not pending:
+            return rows
+        query = str(query).lower()
+        matched = {index for index, row in pending.items() if query in search_index.SearchIndex.row_text(row)}
+        return sorted(matched.union(index for index in rows if index not in pending))
+
+    def filter_categories(self, rows, selected, and_or, pending=None):
+        """Keep the row positions in all (AND) or any (OR) of the selected categories, checking pending rows directly."""
+        pending = pending or {}
+        with self.lock:
+            kept = set(self.category_index.filter(
+                [index for index in rows if index not in pending and index < len(self.category_index.row_categories)],
+                selected, and_or
+            ))
+        index = self.category_index
+        for position, row in pending.items():
+            names = category_index.split_categories(row.get(index.column), index.casefold)
+            if position in rows and index.matches(names, selected, and_or):
+                kept.add(position)
+        return sorted(kept)
+
+    def categories(self):
+        with self.lock:
+            return self.category_index.categories()
+
+    def _reindex(self, rows):
+        """Rebuild (rows None) or patch the indexes, then record a new version."""
+        if rows is None:
+            self.id_index.rebuild(self.df)
+            self.search_index.rebuild(self.df)
+            self.category_index.rebuild(self.df)
+        else:
+            for index in rows:
+                if self.id_index.get(self.df.loc[index, "id"]) not in (None, index):
+                    # An ID was edited in place, so other rows may now point at the wrong index
+                    self.id_index.rebuild(self.df)
+                    break
+                self.id_index.add(self.df.loc[index, "id"], index, self.df.loc[index].get("barcode"))
+            self.search_index.update_rows(self.df, rows)
+            self.category_index.update_rows(self.df, rows)
+        self.version += 1
+        self.log.append((self.version, None if rows is None else set(rows)))
+        del self.log[:-MAX_LOG]
+
+
+class SharedInventory:
+    """Everything the sessions of one server process share: the tables and one write-behind queue.
+
+    Writes from every session go through the same queue, so pending rows protect a table from
+    being overwritten by a sync no matter which session made them.
+    """
+
+    def __init__(self, backend, writer_backend=None):
+        self.backend = backend
+        self.writer_backend = writer_backend or backend
+        self.tables = {}
+        self.lock = threading.Lock()
+        self.write_queue = write_queue.WriteBehindQueue(
+            self.send_rows, permanent_errors=(storage_backend.MissingTableError,)
+        )
+
+    def table(self, sheet_name, category_column, casefold_categories=False):
+        """Return the shared table for sheet_name, loading it on first use."""
+        with self.lock:
+            if sheet_name not in self.tables:
+                self.tables[sheet_name] = SharedTable(self.backend, sheet_name, category_column, casefold_categories)
+            return self.tables[sheet_name]
+
+    def send_rows(self, sheet_name, rows):
+        """
+        Writes rows to the storage backend. Runs on the write-behind worker thread. New rows at
+        the end of the table go out as a single append. If another station appended first, ours
+        land further down: their rows are merged into the shared table above ours and our rows,
+        queued ones included, move down to where the backend put them, so later writes to them
+        don't overwrite someone else's rows.
+
+        Args:
+            sheet_name: Name of the sheet to update.
+            rows: Dictionary where keys are row indices (0-based) and values are lists of cell values.
+        """
+        table = self.tables.get(sheet_name)
+        sync = table.sync if table is not None else None
+        updates, appended = sheet_sync.split_appended(rows, sync.row_count() if sync is not None else None)
+        if updates:
+            self.writer_backend.write_rows(sheet_name, updates)
+        if appended:
+            start = min(index for index in rows if index not in updates)
+            landed = self.writer_backend.append_rows(sheet_name, appended)
+            if landed is not None and landed > start:
+                with table.lock:
+                    table.insert_remote_rows(start, landed - start)
+                    self.write_queue.shift_rows(sheet_name, start, landed - start)
+                rows = {**updates, **{landed + offset: row for offset, row in enumerate(appended)}}
+            elif landed is not None and landed < start:
+                # Rows were removed since we last looked, so none of our positions can be trusted
+                table.reload(protected=self.write_queue.pending_rows(sheet_name) - set(rows))
+                rows = updates
+        if sync is not None:
+            sync.mark_written(rows)
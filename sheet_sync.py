@@ -0,0 +1,213 @@
+import threading
+import pandas as pd
+import table_schema
+from table_schema import normalize_row
+
+
+def split_appended(rows, row_count=None):
+    """
+    Split changed rows into ones to overwrite and ones to append.
+
+    If the highest rows continue the table without a gap (start at row_count, the number of
+    data rows in the table), they are returned as a list to append in one call.
+
+    Args:
+        rows: Dictionary where keys are row indices (0-based) and values are lists of cell values.
+        row_count: Number of data rows currently in the table, or None if unknown (never append).
+
+    Returns:
+        (updates, appended): a dict like rows without the appended rows, and the list of rows to append.
+    """
+    indexes = sorted(rows)
+    if row_count is not None:
+        tail = [index for index in indexes if index >= row_count]
+        if tail and tail == list(range(row_count, row_count + len(tail))):
+            return {index: rows[index] for index in indexes[:len(indexes) - len(tail)]}, [rows[index] for index in tail]
+    return dict(rows), []
+
+
+class SheetSync:
+    """Keeps a DataFrame loaded from one table of a storage backend in step with it without refetching it every time.
+
+    The backend's revision (the Drive file version for Google Sheets) tells us whether anything
+    changed at all. When it did, each row is compared against a hash of what we last saw and only
+    the rows that differ are merged in. Without a revision every refresh downloads the values,
+    but still only patches changed rows.
+    mark_written may be called from the write-behind worker thread, so state changes hold self.lock.
+
+    adopt() starts from a DataFrame we already have (a local snapshot) instead of downloading the
+    sheet, and start_background_fetch() then checks the sheet on another thread so the UI isn't held up.
+    """
+
+    def __init__(self, backend, sheet_name):
+        self.backend = backend
+        self.sheet_name = sheet_name
+        self.header = []
+        self.row_hashes = []
+        self.revision = None
+        self.lock = threading.RLock()
+        self.generation = 0 #bumped whenever our view of the sheet changes, to spot stale background fetches
+        self.background = None
+
+    def row_count(self):
+        """Number of data rows the sheet has, as far as we know from the last load, refresh or write."""
+        with self.lock:
+            return len(self.row_hashes)
+
+    def remote_revision(self):
+        """Return the backend's revision, or None if it can't be read."""
+        try:
+            return self.backend.revision()
+        except Exception:
+            return None
+
+    def fetch_values(self):
+        return self.backend.fetch_values(self.sheet_name)
+
+    def fetch_changes(self):
+        """Return (revision, values) from the sheet, with values None if the version hasn't moved.
+
+        Only reads from the API, so it's safe to call from a background thread.
+        """
+        revision = self.remote_revision()
+        if revision is not None and revision == self.revision:
+            return revision, None
+        return revision, self.fetch_values()
+
+    def adopt(self, df, revision):
+        """Treat df as what the sheet held at `revision`, e.g. a snapshot saved by an earlier session."""
+        with self.lock:
+            self.header = [str(column) for column in df.columns]
+            self.row_hashes = [hash(tuple(normalize_row(row, len(self.header)))) for row in df.itertuples(index=False, name=None)]
+            self.revision = revision
+            self.generation += 1
+
+    def start_background_fetch(self):
+        """Run fetch_changes on a daemon thread; pick up the result with take_background_result."""
+        background = {"generation": self.generation, "result": None, "done": threading.Event()}
+
+        def run():
+            try:
+                background["result"] = self.fetch_changes()
+            except Exception:
+                background["result"] = None
+            background["done"].set()
+
+        self.background = background
+        threading.Thread(target=run, name="sheets-background-fetch", daemon=True).start()
+
+    def background_pending(self):
+        return self.background is not None and not self.background["done"].is_set()
+
+    def take_background_result(self):
+        """Return the finished background fetch for refresh(fetched=...), or None.
+
+        A result is dropped if we loaded, refreshed or wrote since it started, as it may be older
+        than what we have now.
+        """
+        background = self.background
+        if background is None or not background["done"].is_set():
+            return None
+        self.background = None
+        with self.lock:
+            if background["generation"] != self.generation:
+                return None
+        return background["result"]
+
+    def load(self):
+        """Fetch the whole sheet as a DataFrame (same shape as fetch_sheet_data) and remember each row's hash."""
+        with self.lock:
+            self.revision = self.remote_revision()
+            values = self.fetch_values()
+            if not values:
+                self.header = []
+                self.row_hashes = []
+                self.generation += 1
+                return pd.DataFrame()
+
+            self.header = [str(value).lower() for value in values[0]]
+            rows = [normalize_row(row, len(self.header)) for row in values[1:]]
+            self.row_hashes = [hash(tuple(row)) for row in rows]
+            self.generation += 1
+            return pd.DataFrame(rows, columns=self.header)
+
+    def refresh(self, df, protected=(), fetched=None):
+        """Merge rows that changed in the sheet into df.
+
+        Rows whose index is in `protected` (unpushed local edits) keep their local values.
+        fetched is a (revision, values) pair from fetch_changes to use instead of calling the API.
+        Returns (df, changed) where changed lists the row indexes that were updated or appended.
+        df is modified in place unless rows were appended or the sheet had to be reloaded;
+        a reload (header changed or rows deleted) returns changed=None.
+        """
+        with self.lock:
+            revision, values = fetched if fetched is not None else self.fetch_changes()
+            if values is None:
+                return df, []
+
+            protected = set(protected)
+            header = [str(value).lower() for value in values[0]] if values else []
+            if header != self.header or len(values) - 1 < len(self.row_hashes):
+                # Columns changed or rows were removed, so row positions can't be trusted anymore
+                new_df = self.load()
+                table_schema.set_rows(new_df, {
+                    index: df.loc[index].reindex(new_df.columns)
+                    for index in protected if index < len(new_df) and index in df.index
+                })
+                return new_df, None
+
+            changed = []
+            updates = {}
+            new_rows = []
+            for position, values_row in enumerate(values[1:]):
+                row = normalize_row(values_row, len(header))
+                row_hash = hash(tuple(row))
+                if position < len(self.row_hashes):
+                    if self.row_hashes[position] == row_hash:
+                        continue
+                    self.row_hashes[position] = row_hash
+                else:
+                    self.row_hashes.append(row_hash)
+
+                if position in protected:
+                    continue
+                if position < len(df):
+                    updates[position] = row
+                    changed.append(position)
+                else:
+                    new_rows.append(row)
+
+            # Merged through table_schema so typed columns keep their dtypes
+            table_schema.set_rows(df, updates)
+            if new_rows:
+                start = len(df)
+                df = table_schema.append_rows(df, new_rows)
+                changed.extend(range(start, len(df)))
+
+            self.revision = revision
+            self.generation += 1
+            return df, changed
+
+    def insert_rows(self, position, rows):
+        """Record rows someone else appended that we've just merged in at position, moving ours down."""
+        with self.lock:
+            hashes = [hash(tuple(normalize_row(list(row), len(self.header)))) for row in rows]
+            self.row_hashes[position:position] = hashes
+            self.generation += 1
+
+    def mark_written(self, rows_dict):
+        """Record rows we just wrote to the sheet so the next refresh doesn't treat them as remote edits.
+
+        The version is re-read right after our write, so an edit someone else makes in that
+        window is only picked up once the version changes again.
+        """
+        with self.lock:
+            for index, row in rows_dict.items():
+                row_hash = hash(tuple(normalize_row(list(row), len(self.header))))
+                if index < len(self.row_hashes):
+                    self.row_hashes[index] = row_hash
+                else:
+                    self.row_hashes.extend([None] * (index - len(self.row_hashes)))
+                    self.row_hashes.append(row_hash)
+            self.revision = self.remote_revision()
+            self.generation += 1
@@ -0,0 +1,56 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import pandas as pd
+
+# Where snapshots of the sheets are kept between sessions; override with INVENTORY_SNAPSHOT_PATH
+SNAPSHOT_PATH = os.environ.get(
+    "INVENTORY_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "inventory_snapshot.sqlite"),
+)
+
+
+def _table_name(sheet_name):
+    return "sheet_" + "".join(c if c.isalnum() else "_" for c in sheet_name)
+
+
+def load_snapshot(sheet_name, path=SNAPSHOT_PATH):
+    """Return (df, revision) from the local snapshot of a sheet, or (None, None) if there isn't a usable one."""
+    if not os.path.exists(path):
+        return None, None
+    try:
+        with sqlite3.connect(path) as conn:
+            meta = conn.execute("SELECT revision, columns FROM snapshots WHERE sheet_name = ?", (sheet_name,)).fetchone()
+            if meta is None:
+                return None, None
+            df = pd.read_sql(f'SELECT * FROM "{_table_name(sheet_name)}"', conn)
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        return None, None
+
+    # Columns are stored positionally since sheet headers can repeat or be blank
+    df.columns = json.loads(meta[1])
+    return df.fillna(""), meta[0]
+
+
+def save_snapshot(sheet_name, df, revision, path=SNAPSHOT_PATH):
+    """Replace the local snapshot of a sheet with df, tagged with the Drive version it matches."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Blank cells of typed columns are pd.NA, which fillna("") can't put in a categorical
+    stored = df.astype(object).where(df.notna(), "").astype(str)
+    stored.columns = [f"c{i}" for i in range(len(df.columns))]
+    with sqlite3.connect(path, timeout=30) as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS snapshots (sheet_name TEXT PRIMARY KEY, revision TEXT, columns TEXT, saved_at REAL)")
+        stored.to_sql(_table_name(sheet_name), conn, if_exists="replace", index=False)
+        conn.execute(
+            "INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?)",
+            (sheet_name, revision, json.dumps(list(df.columns)), time.time()),
+        )
+
+
+def save_snapshot_in_background(sheet_name, df, revision, path=SNAPSHOT_PATH):
+    """Write the snapshot from a copy of df on another thread so the script run doesn't wait on disk."""
+    thread = threading.Thread(target=save_snapshot, args=(sheet_name, df.copy(), revision, path), daemon=True)
+    thread.start()
+    return thread
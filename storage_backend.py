@@ -0,0 +1,259 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import pandas as pd
+from table_schema import normalize_row
+
+# Default database for the SQLite backend; set [storage] path in secrets to put it elsewhere
+SQLITE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inventory.sqlite")
+SPREADSHEET_ID = "1x5QrksNozxbZhf9GlJkWY2FtLG6-H0x7Lr6wKvGODSk"
+SHEET_NAMES = ("Inventory", "Containers", "Cards") #the tables the apps use, copied when seeding a SQLite database
+
+
+class MissingTableError(LookupError):
+    """Raised when writing to a table the backend doesn't have. Retrying won't help, so the write queue gives up."""
+
+    def __init__(self, sheet_name):
+        self.sheet_name = sheet_name
+        super().__init__(f"no table named {sheet_name}; seed it with `python storage_backend.py`")
+
+
+def column_letter(number):
+    """Convert a 1-based column number to its A1 letters, e.g. 1 -> A, 28 -> AB."""
+    letters = ""
+    while number > 0:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def build_write_requests(sheet_name, rows):
+    """
+    Turn changed rows into the "data" list for a values.batchUpdate call, merging adjacent
+    rows into one block range.
+
+    Args:
+        sheet_name: Name of the sheet to write to.
+        rows: Dictionary where keys are row indices (0-based) and values are lists of cell values.
+    """
+    blocks = []
+    for index in sorted(rows):
+        if blocks and index == blocks[-1][-1] + 1:
+            blocks[-1].append(index)
+        else:
+            blocks.append([index])
+
+    data = []
+    for block in blocks:
+        values = [rows[index] for index in block]
+        width = max(len(row) for row in values) or 1
+        # 1-based indexing in Sheets, +2 for header
+        data.append({
+            "range": f"{sheet_name}!A{block[0] + 2}:{column_letter(width)}{block[-1] + 2}",
+            "values": values
+        })
+    return data
+
+
+def table_from_values(values):
+    """Build a DataFrame from rows shaped like the Sheets API returns them, header row first."""
+    if not values:
+        return pd.DataFrame()
+    columns = [str(value).lower() for value in values[0]]
+    return pd.DataFrame([normalize_row(row, len(columns)) for row in values[1:]], columns=columns)
+
+
+class StorageBackend:
+    """Where the inventory tables live. Row indexes are 0-based and don't count the header row.
+
+    fetch_values returns a table as a list of rows, header first, the way the Sheets API does.
+    revision returns something that changes whenever any table changes, or None if unknown.
+    is_remote is False for backends that are already on local disk, where a snapshot doesn't help.
+    """
+
+    is_remote = True
+
+    def revision(self):
+        return None
+
+    def fetch_values(self, sheet_name):
+        raise NotImplementedError
+
+    def read_table(self, sheet_name):
+        return table_from_values(self.fetch_values(sheet_name))
+
+    def write_rows(self, sheet_name, rows):
+        """Overwrite rows, where rows maps row index -> list of cell values."""
+        raise NotImplementedError
+
+    def append_rows(self, sheet_name, rows):
+        """
+        Add a list of rows after the last row of the table. Returns the row index the first one
+        landed at, which is past the rows we know about if someone else appended first.
+        """
+        raise NotImplementedError
+
+
+class GoogleSheetsBackend(StorageBackend):
+    """Tables are sheets of one spreadsheet. The Drive client is optional and only used for the version."""
+
+    def __init__(self, service, spreadsheet_id, drive_service=None):
+        self.service = service
+        self.spreadsheet_id = spreadsheet_id
+        self.drive_service = drive_service
+
+    def revision(self):
+        if self.drive_service is None:
+            return None
+        result = self.drive_service.files().get(fileId=self.spreadsheet_id, fields="version").execute()
+        return result.get("version")
+
+    def fetch_values(self, sheet_name):
+        result = self.service.spreadsheets().values().get(spreadsheetId=self.spreadsheet_id, range=sheet_name).execute()
+        return result.get("values", [])
+
+    def write_rows(self, sheet_name, rows):
+        body = {
+            "valueInputOption": "RAW",
+            "data": build_write_requests(sheet_name, rows)
+        }
+        self.service.spreadsheets().values().batchUpdate(spreadsheetId=self.spreadsheet_id, body=body).execute()
+
+    def append_rows(self, sheet_name, rows):
+        result = self.service.spreadsheets().values().append(
+            spreadsheetId=self.spreadsheet_id,
+            range=f"{sheet_name}!A1",
+            valueInputOption="RAW",
+            insertDataOption="INSERT_ROWS",
+            body={"values": rows}
+        ).execute()
+        # e.g. "Containers!A101:G103"; sheet row 101 is row index 99 after the header
+        updated_range = result.get("updates", {}).get("updatedRange", "")
+        found = re.search(r"![A-Z]+(\d+)", updated_range)
+        return int(found.group(1)) - 2 if found else None
+
+
+class SQLiteBackend(StorageBackend):
+    """Tables kept in a local SQLite file, for scanner stations that shouldn't wait on the network.
+
+    Each sheet is a table keyed by row index with one TEXT column per sheet column. The revision
+    is a counter bumped by every write, so other stations sharing the file see when to refresh. Connections are per thread.
+    """
+
+    is_remote = False
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self.local = threading.local()
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS tables (sheet_name TEXT PRIMARY KEY, table_name TEXT, columns TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES ('revision', 0)")
+
+    def _connect(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _table(self, conn, sheet_name):
+        """Return (table name, header) for a sheet, or (None, []) if it hasn't been created."""
+        found = conn.execute("SELECT table_name, columns FROM tables WHERE sheet_name = ?", (sheet_name,)).fetchone()
+        if found is None:
+            return None, []
+        return found[0], json.loads(found[1])
+
+    def _bump_revision(self, conn):
+        conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'revision'")
+
+    def has_table(self, sheet_name):
+        return self._table(self._connect(), sheet_name)[0] is not None
+
+    def revision(self):
+        return str(self._connect().execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0])
+
+    def replace_table(self, sheet_name, values):
+        """Create or overwrite a table from rows shaped like fetch_values returns, header first."""
+        header = [str(value) for value in values[0]] if values else []
+        table = "sheet_" + "".join(c if c.isalnum() else "_" for c in sheet_name)
+        columns = ", ".join(f"c{i} TEXT" for i in range(len(header)))
+        with self._connect() as conn:
+            conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+            conn.execute(f'CREATE TABLE "{table}" (row_index INTEGER PRIMARY KEY{", " + columns if columns else ""})')
+            conn.execute("INSERT OR REPLACE INTO tables VALUES (?, ?, ?)", (sheet_name, table, json.dumps(header)))
+            self._insert(conn, table, len(header), {index: row for index, row in enumerate(values[1:])})
+            self._bump_revision(conn)
+
+    def _insert(self, conn, table, width, rows):
+        if not rows or not width:
+            return
+        placeholders = ", ".join("?" * (width + 1))
+        conn.executemany(
+            f'INSERT OR REPLACE INTO "{table}" VALUES ({placeholders})',
+            [[int(index)] + normalize_row(list(row), width) for index, row in rows.items()]
+        )
+
+    def fetch_values(self, sheet_name):
+        conn = self._connect()
+        table, header = self._table(conn, sheet_name)
+        if table is None:
+            return []
+        values = [header]
+        for row in conn.execute(f'SELECT * FROM "{table}" ORDER BY row_index'):
+            while len(values) - 1 < row[0]:
+                values.append([]) #blank rows, like gaps in a sheet
+            values.append(list(row[1:]))
+        return values
+
+    def write_rows(self, sheet_name, rows):
+        with self._connect() as conn:
+            table, header = self._table(conn, sheet_name)
+            if table is None:
+                raise MissingTableError(sheet_name)
+            self._insert(conn, table, len(header), rows)
+            self._bump_revision(conn)
+
+    def append_rows(self, sheet_name, rows):
+        with self._connect() as conn:
+            table, header = self._table(conn, sheet_name)
+            if table is None:
+                raise MissingTableError(sheet_name)
+            start = conn.execute(f'SELECT COALESCE(MAX(row_index) + 1, 0) FROM "{table}"').fetchone()[0]
+            self._insert(conn, table, len(header), {start + offset: row for offset, row in enumerate(rows)})
+            self._bump_revision(conn)
+        return start
+
+
+def copy_tables(source, target, sheet_names):
+    """Copy whole tables between backends, e.g. to seed a SQLiteBackend from the Google Sheet."""
+    for sheet_name in sheet_names:
+        target.replace_table(sheet_name, source.fetch_values(sheet_name))
+
+
+if __name__ == "__main__":
+    # Seed a SQLite database from the Google Sheet, e.g. before switching a station to
+    # [storage] backend = "sqlite": python storage_backend.py [path] [secrets.toml]
+    import sys
+    import tomllib
+    from google.oauth2 import service_account
+    from googleapiclient.discovery import build
+
+    path = sys.argv[1] if len(sys.argv) > 1 else SQLITE_PATH
+    secrets_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(".streamlit", "secrets.toml")
+    with open(secrets_path, "rb") as f:
+        credentials_dict = json.loads(tomllib.load(f)["google_service_account"]["json"])
+    credentials = service_account.Credentials.from_service_account_info(
+        credentials_dict, scopes=["https://www.googleapis.com/auth/spreadsheets"]
+    )
+    sheets = GoogleSheetsBackend(build("sheets", "v4", credentials=credentials), SPREADSHEET_ID)
+    target = SQLiteBackend(path)
+    for sheet_name in SHEET_NAMES:
+        try:
+            copy_tables(sheets, target, [sheet_name])
+        except Exception as e:
+            print(f"Skipped {sheet_name}: {e}")
+        else:
+            print(f"Copied {sheet_name} into {path}")
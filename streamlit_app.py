@@ -5,8 +5,15 @@ from googleapiclient.discovery import build
 import json
 import random
 import string
+import uuid
 import card_inventory
 import barcode_generator
+import filter_cache
+import results_view
+import shared_store
+import table_schema
+import storage_backend
+import print_queue
 
 st.set_page_config(layout="wide")
 st.title("Inventory Management System")
@@ -26,7 +33,6 @@ def reset_all_states():
     st.session_state.new_item_like = None
     st.session_state.current_new_item = None
     st.session_state.current_new_categories = []
-    st.session_state.barcode_print_list = [] #stored as list of [int: quantity to print, str: barcode text]
     st.session_state.print_barcodes_in_viewing = False
     st.session_state.barcode_pages = []
     st.session_state.click_history = []
@@ -70,6 +76,17 @@ elif inventory_type == "**Machine Parts Database**":
     if "changes" not in st.session_state:
         st.session_state.changes = {} #changes to push when we send batch data
 
+    if "filter_cache" not in st.session_state:
+        st.session_state.filter_cache = filter_cache.FilterCache() #filter_data results for the current store_version and edits
+
+    if "results_page" not in st.session_state:
+        st.session_state.results_page = 1 #page of filtered results shown, back to 1 when the filters change
+        st.session_state.results_for = None #filters and page size the page number belongs to
+        st.session_state.results_table_id = 0 #part of the results table key, bumped to clear its selection
+
+    if "store_version" not in st.session_state:
+        st.session_state.store_version = 0 #version of the shared table st.session_state.data was taken from
+
     if "rerun_action" not in st.session_state:
         st.session_state.rerun_action = True
 
@@ -88,9 +105,6 @@ elif inventory_type == "**Machine Parts Database**":
     if "current_new_categories" not in st.session_state:
         st.session_state.current_new_categories = []
 
-    if "barcode_print_list" not in st.session_state:
-        st.session_state.barcode_print_list = [] #stored as list of [int: quantity to print, str: barcode text]
-
     if "print_barcodes_in_viewing" not in st.session_state:
         st.session_state.print_barcodes_in_viewing = False
 
@@ -112,57 +126,96 @@ elif inventory_type == "**Machine Parts Database**":
         service = build("sheets", "v4", credentials=credentials)
         return service
 
-    # Function to fetch data from Google Sheets (do not cache the 'service' argument)
-    def fetch_sheet_data(_service, spreadsheet_id, sheet_name):
-        """Fetches data from the Google Sheet and returns it as a Pandas DataFrame."""
-        sheet = _service.spreadsheets()
-        result = sheet.values().get(spreadsheetId=spreadsheet_id, range=sheet_name).execute()
-        values = result.get("values", [])
-        
-        if values:
-            columns = []
-            for value in values[0]:
-                columns.append(str(value).lower())
-            df = pd.DataFrame(values[1:], columns=columns)  # First row as column names
-        else:
-            df = pd.DataFrame()  # Empty DataFrame if no data
-        return df
+    # Drive API client, only used to read the spreadsheet's version so we know when the sheet changed
+    @st.cache_data
+    def authenticate_drive_with_service_account(credentials_dict):
+        """Authenticate with Google Drive API using service account credentials."""
+        credentials = service_account.Credentials.from_service_account_info(
+            credentials_dict, scopes=["https://www.googleapis.com/auth/drive.metadata.readonly"]
+        )
+        drive_service = build("drive", "v3", credentials=credentials)
+        return drive_service
 
-    def update_rows(_service, spreadsheet_id, sheet_name, rows_dict):
+    # Only the SQLite backend is worth caching; Sheets clients come from the cached authenticate_* above
+    @st.cache_resource
+    def open_sqlite_backend(path):
+        return storage_backend.SQLiteBackend(path)
+
+    # One SharedInventory per storage backend, shared by every session on this server
+    @st.cache_resource
+    def open_inventory(storage_key, _backend, _make_writer_backend):
+        return shared_store.SharedInventory(_backend, _make_writer_backend())
+
+    # Labels queued for printing are kept on disk, so they outlive sessions and restarts
+    @st.cache_resource
+    def open_print_queue(path, name):
+        return print_queue.PrintQueue(path, name)
+
+    def update_rows(sheet_name, rows_dict):
         """
-        Updates multiple rows in the Google Sheet based on a dictionary where keys are row indices
-        and values are rows from a Pandas DataFrame.
-        
-        Args:
-            _service: Google Sheets API service instance.
-            spreadsheet_id: ID of the Google Sheet.
-            sheet_name: Name of the sheet to update.
-            rows_dict: Dictionary where keys are row indices (0-based) and values are pd.Series (rows from DataFrame).
+        Commits rows to the shared table, so every session sees them on its next rerun, and queues them
+        to be written to the storage backend, where keys are row indices and values are rows from a
+        Pandas DataFrame. The write-behind queue sends them from a background thread, so the scan
+        doesn't wait on the network round trip.
         """
-        # Prepare the batch update data
-        data = []
-        for index, row in rows_dict.items():
-            # Convert the row to a list
-            updated_row = row.tolist()
-            # Calculate the range for this row (1-based indexing in Sheets, +2 for header)
-            range_to_update = f"{sheet_name}!A{index + 2}"
-            # Append this update to the batch data
-            data.append({
-                "range": range_to_update,
-                "values": [updated_row]
-            })
-
-        # Perform batch update to Google Sheets
-        if data:
-            body = {
-                "valueInputOption": "RAW",
-                "data": data
-            }
-            _service.spreadsheets().values().batchUpdate(
-                spreadsheetId=spreadsheet_id,
-                body=body
-            ).execute()
+        if sheet_name != SHEET_NAME:
+            inventory.write_queue.enqueue(sheet_name, rows_dict)
+            st.session_state.changes = {}
+            return
+        old_version = st.session_state.store_version
+        with store.lock: #so moving appended rows (see send_rows) can't fall between the commit and the enqueue
+            rows_dict, moved = store.commit(rows_dict, st.session_state.base_rows, old_version)
+            inventory.write_queue.enqueue(sheet_name, rows_dict)
         st.session_state.changes = {}
+        # Rebase right away, so the session's next write goes to where its rows are in the shared table
+        read_store(lambda index: moved[index] if index in moved else store.rebase_index(index, old_version))
+
+    def move_positions(new_index):
+        """Point the row positions the session holds at where new_index says those rows are now."""
+        st.session_state.selected_index = new_index(st.session_state.selected_index)
+        st.session_state.previous_index = new_index(st.session_state.previous_index)
+
+    def read_store(new_index=None):
+        """
+        Point the session at the latest version of the shared Inventory table. Edits that haven't been
+        pushed yet are laid back on top: edited rows in place, new items after the end of the table.
+        new_index maps the session's row positions to the new view's; by default it follows rows
+        moved since the last view (see SharedTable.rebase_index).
+        """
+        if "view_sheet" not in st.session_state:
+            store.check_in_background() #a new session shouldn't miss edits made outside this server
+        store.poll(protected=inventory.write_queue.pending_rows(SHEET_NAME))
+        # data is None after reset_all_states (the database pill changed), so it has to be read again
+        same_sheet = st.session_state.get("view_sheet") == SHEET_NAME and st.session_state.get("data") is not None
+        if same_sheet and st.session_state.store_version == store.version:
+            return
+
+        changes = st.session_state.changes if same_sheet else {}
+        old_base_rows = st.session_state.get("base_rows", 0)
+        old_version = st.session_state.get("store_version", 0)
+        if new_index is None:
+            def new_index(index):
+                # Rows other stations' appends moved down; our unpushed new items are laid back below anyway
+                return store.rebase_index(index, old_version) if 0 <= index < old_base_rows else index
+        if same_sheet:
+            move_positions(new_index)
+        data, st.session_state.store_version = store.view()
+        st.session_state.base_rows = len(data)
+        kept = [idx for idx in changes if idx < old_base_rows and new_index(idx) in data.index]
+        rebased = {new_index(idx): changes[idx] for idx in kept}
+        new_items = [changes[idx] for idx in sorted(changes) if idx not in kept]
+        table_schema.set_rows(data, rebased)
+        if new_items:
+            data = table_schema.append_rows(data, new_items)
+            rebased.update({len(data) - len(new_items) + offset: row for offset, row in enumerate(new_items)})
+        st.session_state.data = data
+        st.session_state.changes = rebased
+        st.session_state.view_sheet = SHEET_NAME
+
+    def sync_data():
+        """Merge rows other people changed into the shared table, keeping rows we edited but haven't pushed."""
+        store.refresh(protected=inventory.write_queue.pending_rows(SHEET_NAME))
+        read_store()
 
     def get_new_id(key=None):
         existing_ids = st.session_state.data['id'].tolist()
@@ -222,34 +275,37 @@ elif inventory_type == "**Machine Parts Database**":
         </style>
     """, unsafe_allow_html=True)
 
-    # Function to format row data into a button label
-    def format_row(row):
-        def format_field(field, length):
-            """Format a field to a fixed length, truncating or padding as necessary."""
-            content = str(field)[:length-3]  # Truncate if exceeds length
-            content = content.ljust(length, '\u00A0')  # Pad with non-breaking spaces
-            return content
-
-        # Create the formatted fields
-        name_field = format_field(row['name'], 30)
-        id_field = format_field(f"ID: {row['id']}", 30)
-        qty_field = format_field(f"QTY: {row['quantity']}", 20)
-        loc_field = format_field(f"LOC: {row['location']}", 20)
-
-        # Combine fields into a single string for button text
-        return f"`{name_field}{id_field}{qty_field}{loc_field}`"
-
-    # Function to display a row as a button with Streamlit's st.button
-    def display_row(row, index):
-        # Format the button label with the custom function
-        button_label = format_row(row)
-        button_clicked = st.button(button_label, key=f"button_{index}")
-        # Check if the button was clicked
-        if button_clicked:
-            st.session_state.selected = True
-            st.session_state.selected_index = index
+    # Shows how many sheet writes are still queued; reruns on its own so it updates while the queue drains
+    @st.fragment(run_every=2)
+    def show_write_status():
+        status = inventory.write_queue.status()
+        if status["dropped"]:
+            st.error(f"Sheet writes: {status['dropped']} rows could not be saved ({status['last_dropped']})")
+        if status["last_error"]:
+            st.warning(f"Sheet writes: {status['pending']} pending, retrying after error: {status['last_error']}")
+        elif status["pending"]:
+            st.caption(f"Sheet writes: {status['pending']} pending, {status['flushed']} saved")
+        else:
+            st.caption(f"Sheet writes: all {status['flushed']} saved")
+
+    def show_load_time():
+        source, row_count, seconds = store.load_time
+        note = " (checking Google Sheets for changes)" if store.sync.background_pending() else ""
+        st.caption(f"Loaded {row_count} rows from {source} in {seconds:.2f} s{note}")
+        if store.memory is not None:
+            before, after = store.memory.iloc[-1][["before", "after"]]
+            with st.expander(f"Memory: {after / 1e6:.1f} MB typed, {before / 1e6:.1f} MB as text"):
+                st.dataframe(store.memory, hide_index=True)
+
+    # Polls the background check started from a snapshot load and reruns the app once it has finished
+    @st.fragment(run_every=1)
+    def wait_for_background_sync():
+        if not store.sync.background_pending():
             st.rerun()
 
+    # Columns of the results table, as (heading, column)
+    RESULT_COLUMNS = [("NAME", "name"), ("ID", "id"), ("QTY", "quantity"), ("LOC", "location")]
+
     # Function to handle row selection
     def handle_row_selection(index):
         if not st.session_state.previous_index == index: #write the undo version copy if new item selected
@@ -280,11 +336,11 @@ elif inventory_type == "**Machine Parts Database**":
                 st.session_state.viewing_pills_widget = None
                 st.session_state.rerun_action = True
                 if st.session_state.viewing_pills_query == "**Save Table Edits**":
-                    st.session_state.data.loc[index] = edited_df.iloc[0]
+                    table_schema.set_rows(st.session_state.data, {index: edited_df.iloc[0]})
                     st.session_state.changes[index] = edited_df.iloc[0].copy()
                     st.success("Changes saved.")
                 elif st.session_state.viewing_pills_query == "**Cancel Table Edits**":
-                    st.session_state.data.loc[index] = st.session_state.previous_copy
+                    table_schema.set_rows(st.session_state.data, {index: st.session_state.previous_copy})
                     st.session_state.changes[index] = st.session_state.previous_copy
                 elif st.session_state.viewing_pills_query == "**New item like this item**":
                     st.session_state.new_item_like = index
@@ -298,7 +354,7 @@ elif inventory_type == "**Machine Parts Database**":
             if st.session_state.print_barcodes_in_viewing:
                 def save_to_print_queue():
                     st.session_state.print_barcodes_in_viewing = False
-                    st.session_state.barcode_print_list.append([quantity_to_print, edited_df.iloc[0]["barcode"]])
+                    labels_queue.add(edited_df.iloc[0]["barcode"], quantity_to_print)
                 def cancel_print():
                     st.session_state.print_barcodes_in_viewing = False
 
@@ -315,12 +371,12 @@ elif inventory_type == "**Machine Parts Database**":
             with col1:
                 undo = st.button("Undo")
                 if undo:
-                    st.session_state.data.loc[index] = st.session_state.previous_copy
+                    table_schema.set_rows(st.session_state.data, {index: st.session_state.previous_copy})
                     st.session_state.changes[index] = st.session_state.previous_copy
                     st.write("Undone!")
                 else:
                     if st.session_state.rerun_action == True:
-                        st.session_state.data.iloc[index]["quantity"] = int(st.session_state.data.iloc[index]["quantity"]) - 1
+                        table_schema.add_to_cell(st.session_state.data, index, "quantity", -1)
                         st.session_state.changes[index] = st.session_state.data.iloc[index].copy()
             with col2:
                 string = generate_message(["name", "id", "quantity"])
@@ -334,12 +390,12 @@ elif inventory_type == "**Machine Parts Database**":
             with col1:
                 undo = st.button("Undo")
                 if undo:
-                    st.session_state.data.loc[index] = st.session_state.previous_copy
+                    table_schema.set_rows(st.session_state.data, {index: st.session_state.previous_copy})
                     st.session_state.changes[index] = st.session_state.previous_copy
                     st.write("Undone!")
                 else:
                     if st.session_state.rerun_action == True:
-                        st.session_state.data.iloc[index]["quantity"] = int(st.session_state.data.iloc[index]["quantity"]) + 1
+                        table_schema.add_to_cell(st.session_state.data, index, "quantity", 1)
                         st.session_state.changes[index] = st.session_state.data.iloc[index].copy()
             with col2:
                 string = generate_message(["name", "id", "quantity"])
@@ -353,12 +409,12 @@ elif inventory_type == "**Machine Parts Database**":
             with col1:
                 undo = st.button("Undo")
                 if undo:
-                    st.session_state.data.loc[index] = st.session_state.previous_copy
+                    table_schema.set_rows(st.session_state.data, {index: st.session_state.previous_copy})
                     st.session_state.changes[index] = st.session_state.previous_copy
                     st.write("Undone.")
                 else:
                     if st.session_state.rerun_action == True:
-                        st.session_state.data.iloc[index]["owner"] = "none"
+                        table_schema.set_cell(st.session_state.data, index, "owner", "none")
                         st.session_state.changes[index] = st.session_state.data.iloc[index].copy()
             with col2:
                 string = generate_message(["name", "id", "owner"])
@@ -372,7 +428,7 @@ elif inventory_type == "**Machine Parts Database**":
             with col1:
                 undo = st.button("Undo")
                 if undo:
-                    st.session_state.data.loc[index] = st.session_state.previous_copy
+                    table_schema.set_rows(st.session_state.data, {index: st.session_state.previous_copy})
                     st.session_state.changes[index] = st.session_state.previous_copy
                     st.write("Undone.")
             with col2:
@@ -391,7 +447,7 @@ elif inventory_type == "**Machine Parts Database**":
 
             if st.session_state.checked_out:
                 if not undo:
-                    st.session_state.data.iloc[index]["owner"] = owner
+                    table_schema.set_cell(st.session_state.data, index, "owner", owner)
                     st.session_state.changes[index] = st.session_state.data.iloc[index].copy()
                     st.success(
                         f"CHECKING OUT SUCCESS:{string} \u00A0\u00A0\u00A0\u00A0------------> to new owner:\u00A0\u00A0\u00A0\u00A0**{owner}**"
@@ -401,24 +457,55 @@ elif inventory_type == "**Machine Parts Database**":
         st.session_state.rerun_action = True #rerun the action is ok again
 
     # Streamlit app title
-    # Load credentials and authenticate
-    try:
-        credentials_dict = load_credentials_from_toml()
-        service = authenticate_with_service_account(credentials_dict)
-    except Exception as e:
-        st.error(f"Failed to load credentials or authenticate: {e}")
-        st.stop()
+    SPREADSHEET_ID = storage_backend.SPREADSHEET_ID
+
+    # Google Sheets by default; a site can run on a local file instead with
+    # [storage] backend = "sqlite" (and optionally path = "...") in secrets.toml
+    storage_config = st.secrets.get("storage", {})
+    if storage_config.get("backend", "sheets") == "sqlite":
+        backend = open_sqlite_backend(storage_config.get("path", storage_backend.SQLITE_PATH))
+        if not backend.has_table("Inventory"):
+            st.error(f"{backend.path} has no Inventory table yet. Copy the Google Sheet into it with `python storage_backend.py {backend.path}`.")
+            st.stop()
+    else:
+        # Load credentials and authenticate
+        try:
+            credentials_dict = load_credentials_from_toml()
+            service = authenticate_with_service_account(credentials_dict)
+        except Exception as e:
+            st.error(f"Failed to load credentials or authenticate: {e}")
+            st.stop()
+
+        try:
+            drive_service = authenticate_drive_with_service_account(credentials_dict)
+        except Exception:
+            drive_service = None #sync falls back to comparing rows on every pull
+        backend = storage_backend.GoogleSheetsBackend(service, SPREADSHEET_ID, drive_service)
+
+    def make_writer_backend():
+        if not backend.is_remote:
+            return backend #SQLite connections are per thread already
+        # The worker thread gets its own API client instead of sharing the one used by script runs
+        return storage_backend.GoogleSheetsBackend(authenticate_with_service_account(credentials_dict), SPREADSHEET_ID, drive_service)
+
+    storage_key = ("sqlite", backend.path) if not backend.is_remote else ("sheets", SPREADSHEET_ID)
+    inventory = open_inventory(storage_key, backend, make_writer_backend)
 
     # Proceed to the rest of the app
-    SPREADSHEET_ID = "1x5QrksNozxbZhf9GlJkWY2FtLG6-H0x7Lr6wKvGODSk"
     SHEET_NAME = "Inventory"  # Example Sheet Name
 
-    # Load data from Google Sheets
-    #try:
-    if "data" not in st.session_state:
-        st.session_state.data = fetch_sheet_data(service, SPREADSHEET_ID, SHEET_NAME)
-    elif st.session_state.data is None:
-        st.session_state.data = fetch_sheet_data(service, SPREADSHEET_ID, SHEET_NAME)
+    # Each station queues labels under the sheet name and the station= key in its URL, so a download
+    # only takes labels queued at that station. [print_queue] name = "..." in secrets.toml makes every
+    # station share one queue instead, and path = "..." moves the queue file.
+    if "station" not in st.query_params:
+        st.query_params["station"] = uuid.uuid4().hex[:8] #kept in the URL, so a reload or bookmark finds its queue again
+    print_queue_config = st.secrets.get("print_queue", {})
+    queue_name = print_queue_config.get("name", f"{SHEET_NAME}:{st.query_params['station']}")
+    labels_queue = open_print_queue(print_queue_config.get("path", print_queue.PRINT_QUEUE_PATH), queue_name)
+
+    # Load data from the shared table, loading it from Google Sheets if this is the first session
+    store = inventory.table(SHEET_NAME, category_column="categories")
+    read_store()
 
     # Ensure required columns exist
     if not {"categories", "id", "name", "barcode"}.issubset(st.session_state.data.columns):
@@ -434,30 +521,28 @@ elif inventory_type == "**Machine Parts Database**":
                 st.session_state.selected = False
                 st.session_state.rerun_action = True
                 if st.session_state.pills_query == "**Push My Changes**":
-                    update_rows(service, SPREADSHEET_ID, SHEET_NAME, st.session_state.changes)
-                elif st.session_state.pills_query == "**Pull Changes (Delete my Changes)**":
-                    st.session_state.data = fetch_sheet_data(service, SPREADSHEET_ID, SHEET_NAME)
-                    st.session_state.changes = {}
+                    update_rows(SHEET_NAME, st.session_state.changes)
+                elif st.session_state.pills_query == "**Pull Changes (Keep my Changes)**":
+                    sync_data()
                 elif st.session_state.pills_query == "**Download Gathered Barcodes**":
-                    barcode_generator.download_qr_code_pdf(st.session_state.barcode_print_list)
-                    st.session_state.barcode_print_list = [] #clear data
+                    barcode_generator.download_print_queue(labels_queue)
 
 
-        st.pills("Main Actions:", ["**Push My Changes**", "**Pull Changes (Delete my Changes)**", "**Download Gathered Barcodes**"], key="pills_widget", selection_mode="single", default=None, on_change=pills_submit)
+        st.pills("Main Actions:", ["**Push My Changes**", "**Pull Changes (Keep my Changes)**", "**Download Gathered Barcodes**"], key="pills_widget", selection_mode="single", default=None, on_change=pills_submit)
         pills_query = st.session_state.pills_query
+        barcode_generator.show_label_downloads()
+        labels, copies = labels_queue.summary()
+        st.caption(f"Print queue: {copies} labels ({labels} unique)")
+        show_write_status()
+        show_load_time()
+        if store.sync.background_pending():
+            wait_for_background_sync()
 
         st.divider()
         st.subheader("Filter and Search")
 
         # Category filter
-        categories_list = (
-            st.session_state.data["categories"]
-            .str.split(",")
-            .explode()
-            .str.strip()
-            .dropna()
-            .unique()
-        )
+        categories_list = store.categories()
 
         c1, c2, c3, c4 = st.columns([5, 5, 1.5, 1.5])
         with c1:
@@ -518,34 +603,50 @@ elif inventory_type == "**Machine Parts Database**":
         st.button("Input a New Item", on_click=make_new_item)
 
         # Filtering function
+        def cached(key, build):
+            # Reruns from unrelated widgets reuse the last result for the same inputs and data.
+            # Edits aren't in the shared table until "Push My Changes", so they are part of the version.
+            version = (
+                st.session_state.store_version,
+                tuple((idx, tuple(map(str, row))) for idx, row in sorted(st.session_state.changes.items()))
+            )
+            result = st.session_state.filter_cache.get(version, key)
+            if result is None:
+                result = build()
+                st.session_state.filter_cache.put(version, key, result)
+            return result
+
+        def filter_key():
+            return (st.session_state.search_query, tuple(st.session_state.selected_categories), and_or, mode)
+
         def filter_data(df):
-            filtered_df = df.copy()
-            filtered_df["original_index"] = filtered_df.index
+            return cached(filter_key(), lambda: apply_filters(df))
+
+        def apply_filters(df):
+            # Rows edited in this session are checked directly instead of through the shared indexes
+            pending = {idx: df.loc[idx] for idx in st.session_state.changes if idx in df.index}
+
+            # A scanned ID or barcode goes straight to its row, skipping the search and category filters
+            scanned_index = store.find(st.session_state.search_query, df, pending)
+            if scanned_index is not None:
+                filtered_df = df.loc[[scanned_index]].copy()
+                filtered_df["original_index"] = filtered_df.index
+                return filtered_df
 
-            # Search query filter
+            rows = None #row positions left after filtering, None for all of them
+
+            # Search query filter, any cell containing the query
             if st.session_state.search_query:
-                filtered_df = filtered_df[
-                    filtered_df.apply(
-                        lambda row: st.session_state.search_query.lower() in row.drop("original_index").to_string().lower(), axis=1
-                    )
-                ]
+                rows = store.search(st.session_state.search_query, pending)
 
-            # Categories filter (AND/OR logic)
+            # Categories filter, item must be in all (AND) or any (OR) of the selected categories
             if st.session_state.selected_categories:
-                if and_or == "AND":
-                    # Item must be in all selected categories
-                    filtered_df = filtered_df[
-                        filtered_df["categories"].apply(
-                            lambda x: all(cat in map(str.strip, x.split(",")) for cat in st.session_state.selected_categories)
-                        )
-                    ]
-                elif and_or == "OR":
-                    # Item must be in any of the selected categories
-                    filtered_df = filtered_df[
-                        filtered_df["categories"].apply(
-                            lambda x: any(cat in map(str.strip, x.split(",")) for cat in st.session_state.selected_categories)
-                        )
-                    ]
+                rows = store.filter_categories(
+                    range(len(df)) if rows is None else rows, st.session_state.selected_categories, and_or, pending
+                )
+
+            filtered_df = df.copy() if rows is None else df.iloc[rows].copy()
+            filtered_df["original_index"] = filtered_df.index
 
             return filtered_df
 
@@ -575,18 +676,27 @@ elif inventory_type == "**Machine Parts Database**":
             
             #actions
             if not st.session_state.selected and not len(filtered_data) == 0: #list of potential choices
-                st.subheader(f"Filtered Results: Showing of {min(result_limit, len(filtered_data))} of {len(filtered_data)}")
+                if st.session_state.results_for != (filter_key(), result_limit):
+                    st.session_state.results_for = (filter_key(), result_limit)
+                    st.session_state.results_page = 1
+                page, page_count, start, stop = results_view.page_bounds(
+                    len(filtered_data), st.session_state.results_page, result_limit
+                )
+                st.subheader(f"Filtered Results: Showing of {stop - start} of {len(filtered_data)}")
                 search_info_bar()
 
-
-                # Display rows up to the result limit
-                head_filter = filtered_data.head(result_limit)
-                for index, row in head_filter.iterrows():
-                    original_index = row["original_index"]
-                    try:
-                        display_row(row, original_index)
-                    except Exception as e:
-                        st.error(f"Duplicate ID found at row {original_index+1}. Please modify in google sheets.")
+                # One page of rows in a single table; the labels are cached with the filter result
+                labels = cached(
+                    filter_key() + ("labels", start, stop),
+                    lambda: results_view.result_labels(filtered_data.iloc[start:stop], RESULT_COLUMNS)
+                )
+                results_view.pager("results_page", page, page_count, len(filtered_data), start, stop)
+                picked = results_view.results_table(labels, key=f"results_table_{st.session_state.results_table_id}")
+                if picked is not None:
+                    st.session_state.results_table_id += 1
+                    st.session_state.selected = True
+                    st.session_state.selected_index = picked
+                    st.rerun()
 
             elif st.session_state.selected: #select the choice
                 st.subheader(f"Selected Item: {st.session_state.data.iloc[st.session_state.selected_index]['name']}")
@@ -627,8 +737,8 @@ elif inventory_type == "**Machine Parts Database**":
                 # Use the row from the main dataframe as a template
                 template_row = pd.DataFrame([st.session_state.data.loc[st.session_state.new_item_like].copy()])
                 key = template_row.iloc[0]["id"]
-                template_row.iloc[0]["id"] = get_new_id(key=key)
-                template_row.iloc[0]["barcode"] = f"*{template_row.iloc[0]['id']}*"
+                template_row.loc[template_row.index[0], "id"] = get_new_id(key=key)
+                template_row.loc[template_row.index[0], "barcode"] = f"*{template_row.iloc[0]['id']}*"
                 edited_df = st.data_editor(
                     template_row,  # Wrap the row in a DataFrame
                     use_container_width=True,
@@ -638,8 +748,8 @@ elif inventory_type == "**Machine Parts Database**":
                 st.multiselect("Select existing categories to add, or type your own new ones in CSV format in the table.", categories_list, key="select_new_widget", on_change=update_categories)
                 # Create an empty row with the same columns for new input
                 empty_row = pd.DataFrame([{col: "" for col in st.session_state.data.columns}])
-                empty_row.iloc[0]["id"] = get_new_id()
-                empty_row.iloc[0]["barcode"] = f"*{empty_row.iloc[0]['id']}*"
+                empty_row.loc[empty_row.index[0], "id"] = get_new_id()
+                empty_row.loc[empty_row.index[0], "barcode"] = f"*{empty_row.iloc[0]['id']}*"
                 edited_df = st.data_editor(
                     empty_row,  # Use the empty row as the base
                     use_container_width=True,
@@ -651,7 +761,7 @@ elif inventory_type == "**Machine Parts Database**":
                     default = None
                 else:
                     default = st.session_state.new_item_categories
-                    row.iloc[0]["categories"] = ", ".join(default)
+                    row.loc[row.index[0], "categories"] = ", ".join(default)
                 full_categories_list = list(set(list(st.session_state.new_item_categories) + list(categories_list)))
                 st.multiselect("Select existing categories to add, or type your own new ones in CSV format in the table.",full_categories_list, key="select_new_widget", default=default, on_change=update_categories)
                 edited_df = st.data_editor(
@@ -664,11 +774,11 @@ elif inventory_type == "**Machine Parts Database**":
 
             # Function placeholders for button actions
             def save_new_item():
-                edited_df.iloc[0]["categories"] = ", ".join(st.session_state.new_item_categories)
+                edited_df.loc[edited_df.index[0], "categories"] = ", ".join(st.session_state.new_item_categories)
                 new_row = edited_df.iloc[0]  # Extract the row from the editor (first row, as it's single)
-                st.session_state.data = pd.concat([st.session_state.data, edited_df], ignore_index=True)
+                st.session_state.data = table_schema.append_rows(st.session_state.data, edited_df)
                 st.session_state.changes[len(st.session_state.data) - 1] = new_row.copy()  # Track the new row's changes
-                st.session_state.barcode_print_list.append([int(quantity_to_print), edited_df.iloc[0]["barcode"]])
+                labels_queue.add(edited_df.iloc[0]["barcode"], int(quantity_to_print))
                 st.session_state.new_item_like = None  # Reset the new item session key
                 st.session_state.new_item_entry = False  # Reset the new item session key
                 st.session_state.current_new_item = None
@@ -0,0 +1,153 @@
+"""
+Made-up Containers sheets of any size, for benchmarks and for trying the app on a big inventory.
+
+generate_containers fills shelves, carts and machines top-down the way scanning them in would:
+plates on each of them, bins on plates, storage boxes on shelves with location tags for their
+slots, separators in bins and storage boxes, and cards in separators and bins. Every placement
+follows container_graph.VALID_PARENTS. Cards live in the Cards sheet, so they only show up as
+IDs in 'child' cells and don't count towards the rows asked for.
+
+Run `python synthetic_inventory.py 100000 bench.sqlite` to write a SQLite database the app can
+open with [storage] backend = "sqlite" and path = "bench.sqlite" in secrets.
+"""
+import random
+import string
+import sys
+import container_graph
+import storage_backend
+
+COLUMNS = ["id", "name", "type", "parent", "child", "barcode", "location"]
+SIZES = (1000, 10000, 100000, 1000000)
+ROOT_TYPES = ("shelf", "cart", "machine")
+
+# What goes in each container type, and how many
+FAN_OUT = {
+    "shelf": (("plate", 4), ("storage box", 2)),
+    "cart": (("plate", 3),),
+    "machine": (("plate", 2),),
+    "plate": (("bin", 6),),
+    "storage box": (("separator", 8),),
+    "bin": (("separator", 1),),
+}
+LOCATION_SLOTS = 4 #location tags made for each storage box
+LOOSE_CARD_BINS = 3 #every third bin holds its cards directly instead of in a separator
+CARDS_PER_HOLDER = (3, 12)
+
+
+class SyntheticInventory:
+    """Builds the rows of one generated sheet. Same rows and seed give the same sheet."""
+
+    def __init__(self, rows, seed=0):
+        self.limit = rows
+        self.random = random.Random(seed)
+        self.rows = []
+        self.ids = set()
+        self.bins = 0
+
+    def new_id(self, node_type):
+        """Same shape as get_new_id in card_inventory: the first 3 letters of the type and 6 random letters."""
+        while True:
+            node_id = f"{node_type.upper()[:3]}-{''.join(self.random.choices(string.ascii_uppercase, k=6))}"
+            if node_id not in self.ids:
+                self.ids.add(node_id)
+                return node_id
+
+    def card_ids(self):
+        count = self.random.randint(*CARDS_PER_HOLDER)
+        return [f"CAR-{''.join(self.random.choices(string.ascii_uppercase, k=10))}" for _ in range(count)]
+
+    def full(self):
+        return len(self.rows) >= self.limit
+
+    def add(self, node_type, node_id=None, parent=None, name="", location=""):
+        """Append a row and return it, or None once the sheet has all its rows."""
+        if self.full():
+            return None
+        if parent is not None and parent[2] not in container_graph.VALID_PARENTS[node_type]:
+            raise ValueError(f"cannot place {node_type} in {parent[2]}")
+        node_id = node_id or self.new_id(node_type)
+        row = [node_id, name, node_type, parent[0] if parent is not None else "", "", f"*{node_id}*", location]
+        self.rows.append(row)
+        return row
+
+    def fill(self, row):
+        """Add everything that goes in row and set its 'child' cell to the IDs placed in it."""
+        node_type = row[2]
+        children = []
+        if node_type == "storage box":
+            slots = []
+            for i in range(LOCATION_SLOTS):
+                # Location tags have no parent, as save_new_items makes them
+                slot = self.add("location", node_id=f"{row[0]}-{i}", location=f"{i}")
+                if slot is not None:
+                    slots.append(slot)
+            separators = []
+            for n in range(FAN_OUT[node_type][0][1]):
+                slot = slots[n % len(slots)] if slots else None
+                separator = self.add("separator", parent=row, location=slot[6] if slot else "")
+                if separator is None:
+                    break
+                self.fill(separator)
+                separators.append(separator[0])
+                if slot is not None:
+                    slot[4] = ",".join(container_graph.split_ids(slot[4]) + [separator[0]])
+            children = separators
+        elif node_type == "separator":
+            children = self.card_ids()
+            if row[6] == "":
+                row[6] = str(len(children)) #a separator in a bin has its card count in 'location'
+        elif node_type == "bin":
+            self.bins += 1
+            if self.bins % LOOSE_CARD_BINS == 0:
+                children = self.card_ids()
+            else:
+                for child_type, count in FAN_OUT[node_type]:
+                    for _ in range(count):
+                        child = self.add(child_type, parent=row)
+                        if child is None:
+                            break
+                        self.fill(child)
+                        children.append(child[0])
+        else:
+            for child_type, count in FAN_OUT[node_type]:
+                for slot in range(count):
+                    child = self.add(child_type, parent=row, location=str(slot) if child_type != "storage box" else "")
+                    if child is None:
+                        break
+                    self.fill(child)
+                    children.append(child[0])
+        row[4] = ",".join(children)
+
+    def build(self):
+        count = 0
+        while not self.full():
+            node_type = ROOT_TYPES[count % len(ROOT_TYPES)]
+            count += 1
+            row = self.add(node_type, name=f"{node_type.title()} {count}")
+            self.fill(row)
+        return self.rows
+
+
+def generate_containers(rows, seed=0):
+    """
+    A Containers sheet with exactly `rows` rows, shaped like fetch_values returns it (header first).
+
+    Args:
+        rows: Number of rows, not counting the header.
+        seed: Seed for the random IDs and card counts.
+    """
+    return [list(COLUMNS)] + SyntheticInventory(rows, seed).build()
+
+
+def seed_sqlite(path, rows, seed=0, sheet_name="Containers"):
+    """Write a generated sheet into a SQLite database and return its backend."""
+    backend = storage_backend.SQLiteBackend(path)
+    backend.replace_table(sheet_name, generate_containers(rows, seed))
+    return backend
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[1]
+    path = sys.argv[2] if len(sys.argv) > 2 else storage_backend.SQLITE_PATH
+    seed_sqlite(path, rows)
+    print(f"Wrote {rows} container rows to {path}")
@@ -0,0 +1,158 @@
+import importlib.util
+import pandas as pd
+
+# Arrow-backed strings need pyarrow; without it pandas' own string dtype still beats object columns
+TEXT = "string[pyarrow]" if importlib.util.find_spec("pyarrow") else "string"
+
+# Column dtypes per sheet, by lower-cased header. Columns with a handful of distinct values are
+# categoricals, quantity is a nullable integer and everything else is TEXT. Arrow arrays are
+# immutable, so writing one cell copies the whole column: the Containers cells that moving
+# items rewrites one at a time (parent, child and location) stay object columns, which df.at
+# writes in place.
+SCHEMAS = {
+    "Inventory": {"categories": "category", "location": "category", "owner": "category", "quantity": "Int64"},
+    "Containers": {"type": "category", "parent": "object", "child": "object", "location": "object"},
+}
+
+WHOLE_NUMBER = r"-?(?:0|[1-9][0-9]*)"
+
+
+def normalize_row(values, width):
+    """Turn a row from the Sheets API or the DataFrame into a list of `width` strings.
+
+    The API leaves out trailing empty cells, so short rows are padded with "". Blank cells of
+    typed columns (pd.NA) become "" too.
+    """
+    row = ["" if value is None or (not isinstance(value, str) and pd.isna(value)) else str(value) for value in values[:width]]
+    return row + [""] * (width - len(row))
+
+
+def column_dtype(sheet_name, column):
+    return SCHEMAS.get(sheet_name, {}).get(str(column).lower(), TEXT)
+
+
+def to_int(value):
+    """Whole number from a cell, or pd.NA if it's blank. Raises ValueError for anything else."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return pd.NA
+    text = str(value).strip()
+    return int(text) if text else pd.NA
+
+
+def convert_column(values, dtype):
+    """
+    Convert a column of strings to dtype. An Int64 column stays TEXT unless every cell is blank or
+    written exactly like the number it holds, so turning it back into strings gives the sheet back.
+    """
+    if dtype == "Int64":
+        text = values.astype(object).where(values.notna(), "").astype(str)
+        blank = text == ""
+        if not (blank | text.str.fullmatch(WHOLE_NUMBER)).all():
+            return values.astype(TEXT)
+        return pd.to_numeric(text.mask(blank)).astype("Int64")
+    return values.astype(dtype)
+
+
+def apply_schema(df, sheet_name):
+    """Return a copy of a DataFrame of strings (as loaded from the sheet) with each column converted to its dtype."""
+    columns = [convert_column(df.iloc[:, i], column_dtype(sheet_name, name)) for i, name in enumerate(df.columns)]
+    typed = pd.concat(columns, axis=1) if columns else df.copy()
+    typed.columns = df.columns
+    return typed
+
+
+def _cell_values(column, values):
+    """Turn strings (or values read from another row) into values column can hold, widening column if it must.
+
+    Returns (column, values): new categories are added to a categorical, and an Int64 column becomes
+    TEXT if one of the values isn't a whole number.
+    """
+    values = normalize_row(values, len(values))
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        missing = sorted(set(values) - set(column.cat.categories))
+        if missing:
+            column = column.cat.add_categories(missing)
+        return column, values
+    if pd.api.types.is_integer_dtype(column.dtype):
+        try:
+            return column, [to_int(value) for value in values]
+        except ValueError:
+            column = column.astype(TEXT)
+    return column, values
+
+
+def _row_values(row, width):
+    return normalize_row(row.tolist() if hasattr(row, "tolist") else list(row), width)
+
+
+def set_rows(df, rows):
+    """
+    Overwrite rows of df in place, keeping each column's dtype.
+
+    Args:
+        df: Table with a 0-based RangeIndex, typed by apply_schema or plain strings.
+        rows: Dictionary where keys are row indices and values are rows (pd.Series or lists) in column order.
+    """
+    if not rows:
+        return
+    indexes = sorted(rows)
+    positions = df.index.get_indexer(indexes)
+    width = len(df.columns)
+    values = [_row_values(rows[index], width) for index in indexes]
+    for i in range(width):
+        column, cells = _cell_values(df.iloc[:, i], [row[i] for row in values])
+        if column.dtype != df.dtypes.iloc[i]:
+            df.isetitem(i, column)
+        df.iloc[positions, i] = pd.array(cells, dtype=column.dtype)
+
+
+def set_cell(df, index, column, value):
+    """df.loc[index, column] = value, adding a category or widening the column first if it must."""
+    i = df.columns.get_loc(column)
+    series, cells = _cell_values(df.iloc[:, i], [value])
+    if series.dtype != df.dtypes.iloc[i]:
+        df.isetitem(i, series)
+    df.iat[df.index.get_loc(index), i] = cells[0] #iat writes the one cell; iloc and loc copy the whole column
+
+
+def add_to_cell(df, index, column, amount):
+    """Add amount to a whole-number cell, like quantity on an Adding/Deleting scan. A blank cell stays blank."""
+    set_cell(df, index, column, to_int(df.loc[index, column]) + amount)
+
+
+def append_rows(df, rows):
+    """
+    Return df with rows added at the end, with the same dtypes.
+
+    Args:
+        df: Table with a 0-based RangeIndex, typed by apply_schema or plain strings.
+        rows: DataFrame with df's columns, or a list of rows (pd.Series or lists) in column order.
+    """
+    if isinstance(rows, pd.DataFrame):
+        rows = [row for row in rows.reindex(columns=df.columns, fill_value="").itertuples(index=False, name=None)]
+    if not len(rows):
+        return df
+    width = len(df.columns)
+    values = [_row_values(row, width) for row in rows]
+    old_columns = []
+    new_columns = []
+    for i in range(width):
+        column, cells = _cell_values(df.iloc[:, i], [row[i] for row in values])
+        old_columns.append(column)
+        new_columns.append(pd.Series(pd.array(cells, dtype=column.dtype)))
+    head = pd.concat(old_columns, axis=1)
+    tail = pd.concat(new_columns, axis=1)
+    head.columns = tail.columns = df.columns
+    return pd.concat([head, tail], ignore_index=True)
+
+
+def memory_report(before, after):
+    """Bytes used by each column of the table as plain strings (before) and typed (after), with a total row."""
+    report = pd.DataFrame({
+        "column": [str(column) for column in after.columns],
+        "dtype": [str(dtype) for dtype in after.dtypes],
+        "before": before.memory_usage(deep=True, index=False).to_numpy(),
+        "after": after.memory_usage(deep=True, index=False).to_numpy(),
+    })
+    total = pd.DataFrame([{"column": "total", "dtype": "", "before": report["before"].sum(), "after": report["after"].sum()}])
+    return pd.concat([report, total], ignore_index=True)
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# The app's modules sit at the top of the repo rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the local caches the modules pick at import time out of the repo's .cache
+os.environ.setdefault("INVENTORY_SNAPSHOT_PATH", os.path.join(tempfile.mkdtemp(), "snapshots.sqlite"))
+os.environ.setdefault("INVENTORY_PRINT_QUEUE_PATH", os.path.join(tempfile.mkdtemp(), "print_queue.sqlite"))
@@ -0,0 +1,22 @@
+import streamlit as st
+import barcode_generator
+import print_queue
+
+
+def test_download_takes_labels_off_only_its_own_queue(tmp_path):
+    path = str(tmp_path / "print_queue.sqlite")
+    station = print_queue.PrintQueue(path, "Containers:aaaa")
+    other_station = print_queue.PrintQueue(path, "Containers:bbbb")
+    station.add_many([[2, "BIN-AAAAAA"], [1, "SEP-AAAAAA"]])
+    other_station.add("BOX-BBBBBB")
+
+    barcode_generator.download_print_queue(station, label="separator")
+    assert station.items() == [[2, "BIN-AAAAAA"], [1, "SEP-AAAAAA"]] #nothing is taken until a PDF is downloaded
+
+    station.add("BIN-AAAAAA") #queued while the PDFs wait to be downloaded
+    bin_pdf, separator_pdf = st.session_state.label_downloads["files"]
+    assert bin_pdf().startswith(b"%PDF")
+    assert station.items() == [[1, "BIN-AAAAAA"]]
+    separator_pdf() #the job's other PDF doesn't take the labels off twice
+    assert station.items() == [[1, "BIN-AAAAAA"]]
+    assert other_station.items() == [[1, "BOX-BBBBBB"]]
@@ -0,0 +1,75 @@
+import pytest
+import fake_sheets
+import shared_store
+import sheet_sync
+import storage_backend
+
+HEADER = ["id", "name", "type", "parent", "child", "barcode", "location"]
+
+
+@pytest.fixture
+def fake():
+    return fake_sheets.FakeSheetsService({"Containers": [
+        HEADER,
+        ["SHE-AAAAAA", "Shelf A", "shelf", "", "BIN-AAAAAA", "*SHE-AAAAAA*", ""],
+        ["BIN-AAAAAA", "", "bin", "SHE-AAAAAA", "", "*BIN-AAAAAA*", "0"],
+        ["BIN-BBBBBB", "", "bin", "", "", "*BIN-BBBBBB*", ""],
+    ]})
+
+
+@pytest.fixture
+def backend(fake):
+    return storage_backend.GoogleSheetsBackend(fake, "spreadsheet", drive_service=fake)
+
+
+def test_refresh_merges_remote_edit_and_appended_row(fake, backend):
+    sync = sheet_sync.SheetSync(backend, "Containers")
+    df = sync.load()
+
+    fake.edit("Containers", 3, 3, "SHE-AAAAAA") #BIN-BBBBBB put on the shelf elsewhere
+    fake.write("Containers", 5, [["SEP-AAAAAA", "", "separator", "BIN-BBBBBB", "", "*SEP-AAAAAA*", "0"]])
+    df, changed = sync.refresh(df)
+
+    assert changed == [2, 3]
+    assert df.loc[2, "parent"] == "SHE-AAAAAA"
+    assert df.loc[3].tolist() == ["SEP-AAAAAA", "", "separator", "BIN-BBBBBB", "", "*SEP-AAAAAA*", "0"]
+
+
+def test_refresh_skips_download_when_version_unchanged(fake, backend):
+    sync = sheet_sync.SheetSync(backend, "Containers")
+    df = sync.load()
+    fake.calls.clear()
+
+    assert sync.refresh(df) == (df, [])
+    assert [call[0] for call in fake.calls] == ["files.get"]
+
+
+def test_refresh_keeps_protected_rows(fake, backend):
+    sync = sheet_sync.SheetSync(backend, "Containers")
+    df = sync.load()
+    df.loc[1, "location"] = "3" #edited here, not written yet
+
+    fake.edit("Containers", 2, 6, "5")
+    fake.edit("Containers", 3, 1, "Loose bin")
+    df, changed = sync.refresh(df, protected={1})
+
+    assert changed == [2]
+    assert df.loc[1, "location"] == "3"
+    assert df.loc[2, "name"] == "Loose bin"
+
+
+def test_shared_table_refresh_updates_indexes(fake, backend):
+    store = shared_store.SharedTable(backend, "Containers", category_column="type", casefold_categories=True)
+    version = store.version
+
+    fake.edit("Containers", 3, 2, "plate")
+    fake.write("Containers", 5, [["SEP-AAAAAA", "", "separator", "BIN-AAAAAA", "", "*SEP-AAAAAA*", "0"]])
+    assert store.refresh() == [2, 3]
+
+    df, new_version = store.view()
+    assert new_version > version
+    assert store.changed_since(version) == {2, 3}
+    assert store.id_index.get("SEP-AAAAAA") == 3
+    assert store.id_index.find("*sep-aaaaaa*", df) == 3
+    assert store.filter_categories(range(len(df)), ["plate"], "OR") == [2]
+    assert store.search("sep-aaaaaa") == [3]
@@ -0,0 +1,45 @@
+import os
+import pytest
+from streamlit.testing.v1 import AppTest
+import storage_backend
+import synthetic_inventory
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "streamlit_app.py")
+CARD_DATABASE = "**Card Database**"
+MACHINE_DATABASE = "**Machine Parts Database**"
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The app on a SQLite database with a generated Containers sheet and a small Inventory sheet."""
+    path = str(tmp_path / "inventory.sqlite")
+    synthetic_inventory.seed_sqlite(path, 50)
+    storage_backend.SQLiteBackend(path).replace_table("Inventory", [
+        ["id", "name", "categories", "barcode", "quantity", "location", "owner"],
+        ["AAA-0", "Bolt", "hardware, small", "*AAA-0*", "5", "A1", "none"],
+        ["BBB-0", "Motor", "electrical", "*BBB-0*", "2", "B2", "none"],
+    ])
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    at.secrets["storage"] = {"backend": "sqlite", "path": path}
+    at.secrets["print_queue"] = {"path": str(tmp_path / "print_queue.sqlite")}
+    return at.run()
+
+
+def pick_database(at, database):
+    """Set the Inventory Database pill and rerun the app."""
+    pills = next(group for group in at.button_group if group.label == "Inventory Database:")
+    return pills.set_value(database).run()
+
+
+@pytest.mark.parametrize("database", [CARD_DATABASE, MACHINE_DATABASE])
+def test_reselecting_database_reloads_data(app, database):
+    pick_database(app, database)
+    assert not app.exception
+
+    # Clearing the pill resets the session's data; picking the database again has to load it back
+    pick_database(app, None)
+    assert not app.exception
+    pick_database(app, database)
+    assert not app.exception
+    assert app.session_state.data is not None
+    assert len(app.session_state.data) > 0
@@ -0,0 +1,173 @@
+import threading
+import time
+
+
+class WriteBehindQueue:
+    """Buffers row writes for Google Sheets and sends them from a background thread.
+
+    Rows are keyed by (sheet name, row index), so writing the same row twice before a flush
+    only sends the latest values. A flush starts once max_pending rows are waiting or the oldest
+    pending row is flush_interval seconds old. A failed flush puts back the sheets it hadn't sent
+    yet (newer writes win) and is retried with exponential backoff, starting at backoff seconds
+    and capped at max_backoff.
+
+    send(sheet_name, rows) does the actual API call, where rows maps row index -> list of values.
+    It runs on the worker thread, so it must not touch st.session_state. Exceptions of the types
+    in permanent_errors mean retrying can't help (e.g. the table doesn't exist), so that sheet's
+    rows are dropped and counted in dropped_rows instead.
+    """
+
+    def __init__(self, send, max_pending=50, flush_interval=2.0, backoff=1.0, max_backoff=60.0, idle_timeout=60.0,
+                 permanent_errors=()):
+        self.send = send
+        self.permanent_errors = tuple(permanent_errors)
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.idle_timeout = idle_timeout
+
+        self.condition = threading.Condition()
+        self.pending = {} #sheet name -> {row index: values}
+        self.in_flight = {}
+        self.oldest_pending = None
+        self.flush_requested = False
+        self.worker = None
+
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.retries = 0
+        self.last_error = None
+        self.last_flush = None
+        self.dropped_rows = 0
+        self.last_dropped = None
+
+    def enqueue(self, sheet_name, rows_dict):
+        """Queue rows for writing. rows_dict maps row index -> pd.Series or list, copied right away."""
+        if not rows_dict:
+            return
+        with self.condition:
+            sheet_rows = self.pending.setdefault(sheet_name, {})
+            for index, row in rows_dict.items():
+                sheet_rows[int(index)] = row.tolist() if hasattr(row, "tolist") else list(row)
+            if self.oldest_pending is None:
+                self.oldest_pending = time.monotonic()
+            self._ensure_worker()
+            self.condition.notify()
+
+    def pending_rows(self, sheet_name):
+        """Row indexes of sheet_name that are queued or being sent right now."""
+        with self.condition:
+            return set(self.pending.get(sheet_name, {})) | set(self.in_flight.get(sheet_name, {}))
+
+    def shift_rows(self, sheet_name, start, count):
+        """Move queued rows of sheet_name at or past start down by count, after rows were inserted above them."""
+        with self.condition:
+            sheet_rows = self.pending.get(sheet_name)
+            if sheet_rows:
+                self.pending[sheet_name] = {
+                    index + count if index >= start else index: row for index, row in sheet_rows.items()
+                }
+
+    def pending_count(self):
+        with self.condition:
+            return sum(len(rows) for rows in self.pending.values()) + sum(len(rows) for rows in self.in_flight.values())
+
+    def status(self):
+        """Counters for showing write progress in the UI."""
+        return {
+            "pending": self.pending_count(),
+            "flushed": self.flushed_rows,
+            "flushes": self.flushes,
+            "retries": self.retries,
+            "last_error": self.last_error,
+            "last_flush": self.last_flush,
+            "dropped": self.dropped_rows,
+            "last_dropped": self.last_dropped,
+        }
+
+    def flush(self, timeout=None):
+        """Ask the worker to send everything now and wait until nothing is pending. Returns False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            self.flush_requested = True
+            self._ensure_worker()
+            self.condition.notify_all()
+            while self.pending or self.in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def _ensure_worker(self):
+        if self.worker is None or not self.worker.is_alive():
+            self.worker = threading.Thread(target=self._run, name="sheets-write-behind", daemon=True)
+            self.worker.start()
+
+    def _take_batch(self):
+        """Wait for a batch that is due, or return None once the queue has been idle for idle_timeout."""
+        with self.condition:
+            idle_since = time.monotonic()
+            while True:
+                now = time.monotonic()
+                if self.pending:
+                    count = sum(len(rows) for rows in self.pending.values())
+                    due_at = self.oldest_pending + self.flush_interval
+                    if count >= self.max_pending or now >= due_at or self.flush_requested:
+                        batch = self.pending
+                        self.pending = {}
+                        self.in_flight = batch
+                        self.oldest_pending = None
+                        return batch
+                    self.condition.wait(due_at - now)
+                else:
+                    self.flush_requested = False
+                    if now - idle_since >= self.idle_timeout:
+                        self.worker = None
+                        return None
+                    self.condition.wait(self.idle_timeout - (now - idle_since))
+
+    def _run(self):
+        delay = self.backoff
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+
+            try:
+                for sheet_name in list(batch):
+                    try:
+                        self.send(sheet_name, batch[sheet_name])
+                    except self.permanent_errors as e:
+                        with self.condition:
+                            self.dropped_rows += len(batch.pop(sheet_name))
+                            self.in_flight.pop(sheet_name, None)
+                            self.last_dropped = f"{sheet_name}: {type(e).__name__}: {e}"
+                        continue
+                    with self.condition:
+                        # Sent, so a later failure in this batch doesn't send it again
+                        self.flushed_rows += len(batch.pop(sheet_name))
+                        self.in_flight.pop(sheet_name, None)
+            except Exception as e:
+                with self.condition:
+                    # Put the unsent sheets back underneath anything written since they were taken
+                    for sheet_name, rows in batch.items():
+                        newer = self.pending.get(sheet_name, {})
+                        self.pending[sheet_name] = {**rows, **newer}
+                    self.in_flight = {}
+                    self.oldest_pending = 0.0
+                    self.retries += 1
+                    self.last_error = f"{type(e).__name__}: {e}"
+                    self.condition.notify_all()
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_backoff)
+                continue
+
+            with self.condition:
+                self.in_flight = {}
+                self.flushes += 1
+                self.last_error = None
+                self.last_flush = time.time()
+                self.condition.notify_all()
+            delay = self.backoff